@@ -0,0 +1,24 @@
+"""Offline benchmarks on synthetic HLS granules and a local HTTP stand-in of the HLS server.
+
+Run with ``python -m pytest benchmarks --benchmark-autosave`` and compare with a previous run
+with ``--benchmark-compare``, see ``docs/developer-area.rst``.
+"""
+import pytest
+
+from tests.conftest import fake_hdfs  # noqa: F401
+from tests.hls_server import HLSServer
+
+
+@pytest.fixture
+def hls_server_factory():
+    """Start ``HLSServer`` instances (``HLSServer(files, latency, bandwidth)``) stopped afterwards."""
+    servers = []
+
+    def _start(**kwargs):
+        servers.append(HLSServer(**kwargs).start())
+        return servers[-1]
+
+    yield _start
+    for server in servers:
+        server.stop()
+
@@ -0,0 +1,56 @@
+"""Synthetic HLS scene ids and granules at several scales for the benchmarks."""
+import numpy as np
+
+from nasa_hls.names import QA_BITS
+from tests.hls_fixtures import write_fake_hdf
+from tests.hls_fixtures import write_geotiff
+
+# the size of the HLS tiles in pixels
+TILE_SHAPE = (3660, 3660)
+
+
+def sceneids(n, tiles=("32UNU", "32UPU"), year=2017):
+    """Get ``n`` scene ids alternating between L30 and S30, spread over the tiles and the year."""
+    ids = []
+    for i in range(n):
+        tile = tiles[i % len(tiles)]
+        product = ("L30", "S30")[(i // len(tiles)) % 2]
+        doy = 1 + (i // (2 * len(tiles))) % 365
+        ids.append(f"HLS.{product}.T{tile}.{year + i // (730 * len(tiles))}{doy:03d}.v1.4")
+    return ids
+
+
+def write_fake_hdfs(directory, n, shape=(256, 256), **kwargs):
+    """Write ``n`` fake granules (see ``tests.hls_fixtures.write_fake_hdf``) and get their paths."""
+    return [write_fake_hdf(directory, sceneid, shape=shape, seed=i, **kwargs)
+            for i, sceneid in enumerate(sceneids(n))]
+
+
+def realistic_qa(shape=TILE_SHAPE, cloud_fraction=0.3, seed=0):
+    """Get a QA layer with clustered clouds, adjacent clouds around them, shadows next to them,
+    some water and a no-data (255) stripe, i.e. with long runs of equal values as in real scenes.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = shape
+    cell = 61
+    coarse = rng.random((height // cell + 2, width // cell + 2))
+    field = np.repeat(np.repeat(coarse, cell, axis=0), cell, axis=1)[:height, :width]
+    cloud = field > 1 - cloud_fraction
+    adjacent = np.zeros_like(cloud)
+    for shift in (-3, 3):
+        adjacent |= np.roll(cloud, shift, axis=0) | np.roll(cloud, shift, axis=1)
+    adjacent &= ~cloud
+    shadow = np.roll(cloud, (cell // 2, cell // 3), axis=(0, 1)) & ~cloud & ~adjacent
+    qa = np.full(shape, QA_BITS["a_low"][1], dtype="uint8")
+    qa[rng.random(shape) < 0.02] = QA_BITS["a_avg"][1]
+    qa[(field < 0.05)] |= QA_BITS["water"][1]
+    qa[cloud] |= QA_BITS["cloud"][1]
+    qa[adjacent] |= QA_BITS["adj_cloud"][1]
+    qa[shadow] |= QA_BITS["cloud_shadow"][1]
+    qa[:, :width // 20] = 255
+    return qa
+
+
+def write_realistic_qa(path, shape=TILE_SHAPE, cloud_fraction=0.3, seed=0, **profile):
+    """Write ``realistic_qa`` as GeoTIFF, ``profile`` is passed to ``write_geotiff``."""
+    return write_geotiff(path, realistic_qa(shape, cloud_fraction, seed), **profile)
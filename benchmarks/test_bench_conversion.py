@@ -0,0 +1,32 @@
+import pytest
+
+from nasa_hls import hdf2tiff_conversion
+
+from .synthetic import write_fake_hdfs
+
+pytest.importorskip("pytest_benchmark")
+
+N_GRANULES = 4
+
+
+@pytest.fixture(scope="module", params=[(512, 512), (1024, 1024)], ids=lambda shape: str(shape[0]))
+def hdf_paths(request, tmp_path_factory):
+    directory = tmp_path_factory.mktemp("conversion")
+    return write_fake_hdfs(directory, N_GRANULES, shape=request.param, tiled=True,
+                           blockxsize=256, blockysize=256)
+
+
+@pytest.mark.parametrize("stack", [False, True])
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_convert_hdf2tiffs_batch(benchmark, fake_hdfs, tmp_path, hdf_paths, max_workers, stack):
+    rounds = iter(range(100))
+
+    def _setup():
+        return ((hdf_paths, tmp_path / str(next(rounds))),
+                dict(bands=["Blue", "Green", "Red", "QA"], max_workers=max_workers, stack=stack,
+                     creation_options={"TILED": "YES", "COMPRESS": "DEFLATE"}))
+
+    benchmark.group = f"convert_hdf2tiffs_batch stack={stack}"
+    results = benchmark.pedantic(hdf2tiff_conversion.convert_hdf2tiffs_batch, setup=_setup,
+                                 rounds=3)
+    assert (results["status"] == "converted").all()
@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+from nasa_hls import download_hls_dataset
+
+from .synthetic import sceneids
+
+pytest.importorskip("pytest_benchmark")
+
+GRANULE_SIZE = 2 ** 20
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+@pytest.mark.parametrize("n_granules", [4, 16])
+def test_download_batch(benchmark, hls_server_factory, tmp_path, n_granules, max_workers):
+    server = hls_server_factory(latency=0.01, bandwidth=50 * 2 ** 20)
+    ids = sceneids(n_granules)
+    for sceneid in ids:
+        server.add_granule(sceneid, content=b"x" * GRANULE_SIZE)
+    datasets = pd.DataFrame({"date": pd.to_datetime([sceneid.split(".")[3] for sceneid in ids],
+                                                    format="%Y%j"),
+                             "tile": [sceneid.split(".")[2][1:] for sceneid in ids],
+                             "product": [sceneid.split(".")[1] for sceneid in ids]})
+    rounds = iter(range(100))
+
+    def _setup():
+        # a new destination directory per round, existing files are skipped
+        return ((tmp_path / str(next(rounds)), datasets),
+                dict(max_workers=max_workers, base_url=server.base_url))
+
+    benchmark.group = f"download_batch n={n_granules}"
+    benchmark.extra_info["bytes"] = n_granules * GRANULE_SIZE
+    results = benchmark.pedantic(download_hls_dataset.download_batch, setup=_setup, rounds=3)
+    assert (results["status"] == "downloaded").all()
+
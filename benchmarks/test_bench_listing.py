@@ -0,0 +1,21 @@
+import pytest
+
+from nasa_hls import utils
+
+from .synthetic import sceneids
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.mark.parametrize("latency", [0, 0.005])
+@pytest.mark.parametrize("n_granules", [100, 1000])
+def test_get_available_datasets(benchmark, hls_server_factory, n_granules, latency):
+    server = hls_server_factory(latency=latency)
+    for sceneid in sceneids(n_granules):
+        server.add_granule(sceneid)
+    benchmark.group = f"get_available_datasets latency={latency}"
+    datasets = benchmark.pedantic(utils.get_available_datasets,
+                                  args=(["L30", "S30"], [2017], ["32UNU", "32UPU"]),
+                                  kwargs=dict(return_list=False, base_url=server.base_url),
+                                  rounds=3)
+    assert len(datasets) == n_granules
@@ -0,0 +1,27 @@
+import pytest
+
+from nasa_hls import metadata
+from nasa_hls import utils
+
+from .synthetic import write_fake_hdfs
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture(scope="module")
+def hdf_paths(tmp_path_factory):
+    return write_fake_hdfs(tmp_path_factory.mktemp("metadata"), 64, shape=(16, 16))
+
+
+def test_get_metadata_from_hdf(benchmark, fake_hdfs, hdf_paths):
+    benchmark.group = "metadata"
+    result = benchmark(utils.get_metadata_from_hdf, hdf_paths[0])
+    assert result == {"cloud_cover": 10, "spatial_coverage": 100}
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_read_metadata_batch(benchmark, fake_hdfs, hdf_paths, max_workers):
+    benchmark.group = "metadata batch"
+    result = benchmark.pedantic(metadata.read_metadata_batch, args=(hdf_paths, ),
+                                kwargs=dict(max_workers=max_workers), rounds=3)
+    assert result["error"].isna().all()
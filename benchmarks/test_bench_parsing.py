@@ -0,0 +1,19 @@
+import pytest
+
+from nasa_hls import utils
+from nasa_hls.names import parse_url
+
+from .synthetic import sceneids
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.mark.parametrize("n_granules", [10000, 300000])
+def test_dataframe_from_urls(benchmark, n_granules):
+    urls = []
+    for sceneid in sceneids(n_granules, tiles=[f"32U{c}U" for c in "MNPQ"]):
+        _, product, tile, date_yj, version = sceneid.split(".", 4)
+        urls.append(parse_url(date_yj, tile=tile[1:], product=product, version=version))
+    benchmark.group = f"dataframe_from_urls n={n_granules}"
+    datasets = benchmark.pedantic(utils.dataframe_from_urls, args=(urls, ), rounds=3)
+    assert len(datasets) == n_granules
@@ -0,0 +1,31 @@
+import pytest
+
+from nasa_hls import utils
+
+from .synthetic import TILE_SHAPE
+from .synthetic import write_realistic_qa
+
+pytest.importorskip("pytest_benchmark")
+
+QA_VALID = "no_cloud & no_adj_cloud & no_cloud_shadow"
+
+
+@pytest.fixture(scope="module", params=[(512, 512), TILE_SHAPE], ids=lambda shape: str(shape[0]))
+def qa_path(request, tmp_path_factory):
+    return write_realistic_qa(tmp_path_factory.mktemp("qa") / "QA.tif", shape=request.param,
+                              tiled=True, blockxsize=512, blockysize=512)
+
+
+@pytest.mark.parametrize("qa_valid", [QA_VALID, utils.qa_expression_to_values(QA_VALID)],
+                         ids=["expression", "values"])
+def test_hls_qa_layer_to_mask(benchmark, qa_path, qa_valid):
+    benchmark.group = "hls_qa_layer_to_mask"
+    mask = benchmark(utils.hls_qa_layer_to_mask, qa_path, qa_valid)
+    assert mask.dtype.kind == "u"
+
+
+def test_hls_qa_layer_to_mask_blockwise(benchmark, tmp_path, qa_path):
+    benchmark.group = "hls_qa_layer_to_mask to file"
+    benchmark(utils.hls_qa_layer_to_mask, qa_path, QA_VALID, mask_path=tmp_path / "mask.tif",
+              overwrite=True, blockwise=True)
+    assert (tmp_path / "mask.tif").exists()
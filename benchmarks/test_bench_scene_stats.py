@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nasa_hls import scene_stats
+
+from .synthetic import TILE_SHAPE
+from .synthetic import write_realistic_qa
+
+pytest.importorskip("pytest_benchmark")
+
+SCENEID = "HLS.S30.T32UNU.2017001.v1.4"
+
+
+@pytest.fixture(scope="module")
+def qa_path(tmp_path_factory):
+    return write_realistic_qa(tmp_path_factory.mktemp("qa") / f"{SCENEID}__QA.tif", shape=TILE_SHAPE,
+                              tiled=True, blockxsize=512, blockysize=512)
+
+
+@pytest.mark.parametrize("decimation", [1, 8, 32])
+def test_qa_statistics(benchmark, qa_path, decimation):
+    benchmark.group = "qa_statistics"
+    stats = benchmark(scene_stats.qa_statistics, qa_path, decimation=decimation)
+    assert 0 < stats["clear"] < 1
+
+
+@pytest.fixture(scope="module")
+def archive_index(tmp_path_factory):
+    """Scene index of 10 years of 50 tiles with a scene every other day."""
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2013-01-01", "2022-12-31", freq="2D")
+    tiles = [f"32U{column}{row}" for column in "MNPQU" for row in "ABCDEFGHJK"]
+    stats = pd.DataFrame([{"sceneid": f"HLS.S30.T{tile}.{date:%Y%j}.v1.4", "product": "S30",
+                           "tile": tile, "date": date, "path": "", "decimation": 8}
+                          for tile in tiles for date in dates])
+    for key in scene_stats.STATISTICS:
+        stats[key] = rng.random(len(stats))
+    index = scene_stats.SceneIndex(tmp_path_factory.mktemp("index"))
+    index.put(stats)
+    yield index
+    index.close()
+
+
+def test_scene_index_clearest(benchmark, archive_index):
+    benchmark.group = "SceneIndex.clearest"
+    clearest = benchmark(archive_index.clearest, "32UNA", n=3)
+    assert len(clearest) == 10 * 12 * 3
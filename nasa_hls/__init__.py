@@ -1,19 +1,89 @@
+"""Download and process Harmonized Landsat and Sentinel-2 (HLS) data.
+
+The public functions are imported lazily on first access (PEP 562), i.e. ``import nasa_hls``
+does not load pandas, numpy, rasterio (GDAL) or requests. Only the submodule providing an
+attribute is imported, e.g. ``nasa_hls.parse_url`` only imports ``nasa_hls.names``.
+The submodules are imported on first access too, e.g. ``nasa_hls.utils``.
+"""
+import importlib
+import pkgutil
+
 __version__ = "0.1.1"
 
-from . import scripts
-from .utils import parse_url
-from .utils import get_available_tiles_from_url
-from .utils import get_available_datasets
-from .utils import dataframe_from_urls
-from .utils import dataframe_from_hdf_paths
-from .utils import get_metadata_from_hdf
-from .utils import get_cloud_coverage_from_hdf
-from .utils import get_qa_look_up_table
-from .utils import hls_qa_layer_to_mask
-from .utils import BAND_NAMES
-from .utils import QA_ATTRIBUTES_SHORT
-from .utils import QA_ATTRIBUTES_SHORT
-from .hdf2tiff_conversion import convert_hdf2tiffs
-from .hdf2tiff_conversion import convert_hdf2tiffs_batch
-from .download_hls_dataset import download
-from .download_hls_dataset import download_batch
+# public attribute -> submodule defining it
+_LAZY_ATTRIBUTES = {
+    "BASE_URL": "names",
+    "BAND_NAMES": "names",
+    "BAND_ALIASES": "names",
+    "QA_BITS": "names",
+    "QA_ATTRIBUTES_SHORT": "names",
+    "parse_url": "names",
+    "parse_granule_id": "names",
+    "convert_date_to_Yj": "names",
+    "resolve_band_name": "names",
+    "get_available_tiles_from_url": "utils",
+    "get_available_datasets": "utils",
+    "dataframe_from_urls": "utils",
+    "dataframe_from_hdf_paths": "utils",
+    "parse_granule_ids": "utils",
+    "read_datasets": "utils",
+    "write_datasets": "utils",
+    "files_exist": "utils",
+    "get_coverages_from_hdfs": "utils",
+    "get_metadata_from_hdf": "utils",
+    "get_cloud_coverage_from_hdf": "utils",
+    "get_qa_look_up_table": "utils",
+    "compile_qa_expression": "utils",
+    "qa_expression_to_mask": "utils",
+    "qa_expression_to_values": "utils",
+    "hls_qa_layer_to_mask": "utils",
+    "hls_qa_layer_to_mask_batch": "utils",
+    "tiles_from_aoi": "tiles",
+    "tile_bounds": "tiles",
+    "read_metadata": "metadata",
+    "read_metadata_batch": "metadata",
+    "MetadataCache": "metadata",
+    "convert_hdf2tiffs": "hdf2tiff_conversion",
+    "convert_hdf2tiffs_batch": "hdf2tiff_conversion",
+    "read_stack": "hdf2tiff_conversion",
+    "clip_window": "hdf2tiff_conversion",
+    "read_cube": "cube",
+    "TimeSeriesStore": "store",
+    "write_composite": "composite",
+    "SPECTRAL_INDICES": "indices",
+    "compute_indices": "indices",
+    "compute_indices_batch": "indices",
+    "write_scene_vrt": "vrt",
+    "write_timeseries_vrts": "vrt",
+    "write_vrt_catalog": "vrt",
+    "download": "download_hls_dataset",
+    "download_batch": "download_hls_dataset",
+    "run_pipeline": "pipeline",
+    "qa_statistics": "scene_stats",
+    "qa_statistics_batch": "scene_stats",
+    "SceneIndex": "scene_stats",
+    "METRICS": "metrics",
+    "write_metrics": "metrics",
+}
+
+__all__ = ["__version__"] + list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__), name)
+        # cache it, __getattr__ is only called for missing attributes
+        globals()[name] = value
+        return value
+    if name in _submodules():
+        # binds the submodule as attribute, i.e. __getattr__ is not called for it again
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | set(_submodules()))
+
+
+def _submodules():
+    return [module.name for module in pkgutil.iter_modules(__path__)]
@@ -0,0 +1,153 @@
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import logging
+import numpy as np
+import os
+from pathlib import Path
+import rasterio
+import rasterio.shutil
+from rasterio.windows import Window
+import warnings
+
+from .cube import FILL_VALUE
+from .cube import band_source
+from .cube import read_cube
+from .cube import select_scenes
+
+
+log = logging.getLogger(__name__)
+
+COMPOSITE_METHODS = ("median", "mean", "max_ndvi")
+DEFAULT_QA_VALID = "no_cloud & no_adj_cloud & no_cloud_shadow"
+DEFAULT_BLOCK_SIZE = 512
+
+
+def write_composite(src, dst, bands, start_date=None, end_date=None, method="median",
+                    qa_valid=DEFAULT_QA_VALID, block_size=DEFAULT_BLOCK_SIZE, max_workers=None,
+                    fill_value=FILL_VALUE, creation_options=None):
+    """Write a cloud-free composite of the scenes of a tile within a period as COG.
+
+    The tile is processed block by block on a process pool, i.e. the memory needed
+    depends on the block size and the number of scenes but not on the size of the tile.
+    For each block the bands of all scenes are read (see ``cube.read_cube``),
+    pixels with an invalid QA value or the fill value are masked and the valid
+    observations are composited per pixel:
+
+    * ``'median'``: Median of each band.
+    * ``'mean'``: Mean of each band.
+    * ``'max_ndvi'``: All bands of the observation with the maximum NDVI (best pixel).
+
+    The output has one band per composited band and an additional band ``count`` with
+    the number of valid observations. Pixels without a valid observation are ``fill_value``.
+
+    Arguments:
+        src {dataframe or str} -- Scenes of one tile as returned by ``dataframe_from_hdf_paths``
+            or the destination directory of ``convert_hdf2tiffs_batch``.
+        dst {str} -- Path of the output COG.
+        bands {list} -- Long band names or aliases, e.g. ``['Blue', 'Green', 'Red', 'NIR']``.
+
+    Keyword Arguments:
+        start_date {str} -- First date of the period (inclusive). (default: {None})
+        end_date {str} -- Last date of the period (inclusive). (default: {None})
+        method {str} -- ``'median'``, ``'mean'`` or ``'max_ndvi'``. (default: {"median"})
+        qa_valid {list or str} -- Valid QA values or a QA expression, see
+            ``hls_qa_layer_to_mask``. QA value 255 (fill) is invalid.
+            (default: {"no_cloud & no_adj_cloud & no_cloud_shadow"})
+        block_size {int} -- Width and height of the blocks. (default: {512})
+        max_workers {int} -- Number of processes. With ``1`` the blocks are processed in the
+            current process. ``None`` uses the number of CPUs. (default: {None})
+        fill_value {int} -- Fill value of the input and the output. (default: {-1000})
+        creation_options {dict} -- GDAL creation options of the COG. (default: {None})
+
+    Returns:
+        Path -- Path of the composite.
+    """
+    if method not in COMPOSITE_METHODS:
+        raise ValueError(f"'method' must be one of {COMPOSITE_METHODS}. Got {method}.")
+    scenes = select_scenes(src, start_date=start_date, end_date=end_date)
+    bands = [band for band in bands if band != "QA"]
+    name, _ = band_source(scenes.iloc[0], bands[0])
+    with rasterio.open(name) as ref:
+        profile = ref.profile
+    dst = Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.parent / (dst.name + ".tmp.tif")
+    profile.update(driver="GTiff", count=len(bands) + 1, dtype="int16", nodata=fill_value,
+                   tiled=True, blockxsize=256, blockysize=256, compress="deflate")
+    windows = [Window(col_off, row_off,
+                      min(block_size, profile["width"] - col_off),
+                      min(block_size, profile["height"] - row_off))
+               for row_off in range(0, profile["height"], block_size)
+               for col_off in range(0, profile["width"], block_size)]
+    args = (scenes, bands, method, qa_valid, fill_value)
+
+    with rasterio.open(tmp, "w", **profile) as out:
+        for i, description in enumerate(bands + ["count"], start=1):
+            out.set_band_description(i, description)
+        if max_workers == 1:
+            for window in windows:
+                out.write(composite_block(window, *args), window=window)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                # keep a bounded number of blocks in flight
+                n_in_flight = 2 * (max_workers or os.cpu_count() or 1)
+                pending = {}
+                for window in windows:
+                    if len(pending) >= n_in_flight:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            out.write(future.result(), window=pending.pop(future))
+                    pending[executor.submit(composite_block, window, *args)] = window
+                for future in list(pending):
+                    out.write(future.result(), window=pending.pop(future))
+    copy_to_cog(tmp, dst, creation_options=creation_options, remove=True)
+    log.debug(f"COMPOSITE COMPLETE: {dst} FROM {len(scenes)} SCENES")
+    return dst
+
+
+def composite_block(window, scenes, bands, method="median", qa_valid=DEFAULT_QA_VALID,
+                    fill_value=FILL_VALUE):
+    """Get the composite of a window. See ``write_composite``.
+
+    Returns:
+        array -- int16 array with the shape (bands + 1, rows, columns), the last band is the count.
+    """
+    read_bands = list(bands)
+    if method == "max_ndvi":
+        read_bands += [band for band in ["Red", "NIR"] if band not in read_bands]
+    data, _ = read_cube(scenes, read_bands, window=window, qa_valid=qa_valid, keep_255=False,
+                        fill_value=fill_value, max_workers=1)
+    data = data.astype("float32")
+    data[data == fill_value] = np.nan
+    valid = ~np.isnan(data).any(axis=1)
+    count = valid.sum(axis=0)
+
+    if method == "max_ndvi":
+        red, nir = data[:, read_bands.index("Red")], data[:, read_bands.index("NIR")]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ndvi = (nir - red) / (nir + red)
+        ndvi[~valid | np.isnan(ndvi)] = -np.inf
+        best = np.argmax(ndvi, axis=0)[np.newaxis, np.newaxis]
+        result = np.take_along_axis(data[:, :len(bands)], best, axis=0)[0]
+    else:
+        data = data[:, :len(bands)]
+        data[~np.broadcast_to(valid[:, np.newaxis], data.shape)] = np.nan
+        with warnings.catch_warnings():
+            # all-NaN pixels are filled below
+            warnings.simplefilter("ignore", RuntimeWarning)
+            result = np.nanmedian(data, axis=0) if method == "median" else np.nanmean(data, axis=0)
+    result = np.where(count > 0, np.round(result), fill_value).astype("int16")
+    return np.concatenate([result, count[np.newaxis].astype("int16")])
+
+
+def copy_to_cog(src, dst, creation_options=None, remove=False):
+    """Copy a raster file to a COG (``COMPRESS=DEFLATE`` unless given in ``creation_options``).
+
+    With ``remove=True`` the source file is deleted afterwards, also if the copy failed.
+    """
+    try:
+        with rasterio.open(src) as ds:
+            rasterio.shutil.copy(ds, str(dst), driver="COG",
+                                 **dict({"COMPRESS": "DEFLATE"}, **(creation_options or {})))
+    finally:
+        if remove:
+            Path(src).unlink()
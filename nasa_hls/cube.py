@@ -0,0 +1,165 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import rasterio
+from rasterio.windows import Window
+from rasterio.windows import from_bounds
+
+from .hdf2tiff_conversion import stack_band_indexes
+from .metadata import hdf_subdataset_name
+from .session import DEFAULT_MAX_WORKERS
+from .utils import BAND_NAMES
+from .utils import _apply_lut
+from .utils import dataframe_from_hdf_paths
+from .utils import qa_valid_to_lut
+from .utils import resolve_band_name
+
+
+FILL_VALUE = -1000
+
+
+def read_cube(src, bands, start_date=None, end_date=None, window=None, bounds=None,
+              qa_valid=None, keep_255=True, fill_value=FILL_VALUE, dtype="int16", out=None,
+              max_workers=DEFAULT_MAX_WORKERS):
+    """Read a (time, band, y, x) time series cube of the scenes of one tile.
+
+    The scenes are read in parallel, each scene only within the window.
+    The bands are taken from the hdf files, the single band files written by
+    ``convert_hdf2tiffs`` or the multi-band files (``stack=True``) or VRTs,
+    see ``band_source``.
+
+    Arguments:
+        src {dataframe or str} -- Scenes as returned by ``dataframe_from_hdf_paths`` or the
+            destination directory of ``convert_hdf2tiffs_batch``.
+        bands {list} -- Long band names or aliases, e.g. ``['Red', 'NIR', 'QA']``.
+
+    Keyword Arguments:
+        start_date {str} -- First date (inclusive), e.g. ``'2018-01-01'``. (default: {None})
+        end_date {str} -- Last date (inclusive), e.g. ``'2018-12-31'``. (default: {None})
+        window {Window or tuple} -- Pixel window, a ``rasterio.windows.Window`` or
+            ``(col_off, row_off, width, height)``. ``None`` reads the whole tile. (default: {None})
+        bounds {tuple} -- Window in the coordinates of the tile as
+            ``(left, bottom, right, top)``. Ignored if ``window`` is given. (default: {None})
+        qa_valid {list or str} -- Valid QA values or a QA expression, see
+            ``hls_qa_layer_to_mask``. Pixels with an invalid QA value are set to ``fill_value``
+            in all bands but the QA band. ``None`` does not mask. (default: {None})
+        keep_255 {bool} -- See ``hls_qa_layer_to_mask``. (default: {True})
+        fill_value {int} -- Value of masked pixels. (default: {-1000}, the HLS fill value)
+        dtype {str} -- Data type of the cube. (default: {"int16"})
+        out {array or str} -- Array to read into, e.g. a ``numpy.memmap`` for cubes larger
+            than the memory, or the path of a ``.npy`` file created as memory-mapped array.
+            ``None`` allocates a new array. (default: {None})
+        max_workers {int} -- Number of scenes read concurrently. (default: {8})
+
+    Returns:
+        tuple -- The cube and the scenes along its time axis as dataframe
+            (sorted by date and product).
+    """
+    scenes = select_scenes(src, start_date=start_date, end_date=end_date)
+    name, _ = band_source(scenes.iloc[0], bands[0])
+    with rasterio.open(name) as ref:
+        if window is None and bounds is not None:
+            window = from_bounds(*bounds, transform=ref.transform)
+        if window is None:
+            window = Window(0, 0, ref.width, ref.height)
+    if not isinstance(window, Window):
+        window = Window(*window)
+    window = window.round_offsets().round_lengths()
+
+    shape = (len(scenes), len(bands), int(window.height), int(window.width))
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif isinstance(out, (str, Path)):
+        out = np.lib.format.open_memmap(str(out), mode="w+", dtype=dtype, shape=shape)
+    elif out.shape != shape:
+        raise ValueError(f"'out' must have the shape {shape}. Got {out.shape}.")
+    lut = qa_valid_to_lut(qa_valid, keep_255=keep_255) if qa_valid is not None else None
+
+    def _read_scene(t):
+        scene = scenes.iloc[t]
+        for b, band in enumerate(bands):
+            name, index = band_source(scene, band)
+            with rasterio.open(name) as ds:
+                out[t, b] = ds.read(index, window=window)
+        if lut is not None:
+            if "QA" in bands:
+                qa = out[t, bands.index("QA")]
+            else:
+                name, index = band_source(scene, "QA")
+                with rasterio.open(name) as ds:
+                    qa = ds.read(index, window=window)
+            invalid = _apply_lut(lut, qa) == 0
+            for b, band in enumerate(bands):
+                if band != "QA":
+                    out[t, b][invalid] = fill_value
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(_read_scene, range(len(scenes))))
+    return out, scenes
+
+
+def select_scenes(src, start_date=None, end_date=None):
+    """Get the scenes of one tile within a date range sorted by date and product.
+
+    Arguments:
+        src {dataframe or str} -- See ``read_cube``.
+
+    Keyword Arguments:
+        start_date {str} -- First date (inclusive). (default: {None})
+        end_date {str} -- Last date (inclusive). (default: {None})
+
+    Returns:
+        dataframe -- The scenes.
+    """
+    scenes = src if isinstance(src, pd.DataFrame) else scenes_from_directory(src)
+    if start_date is not None:
+        scenes = scenes[scenes["date"] >= pd.Timestamp(start_date)]
+    if end_date is not None:
+        scenes = scenes[scenes["date"] <= pd.Timestamp(end_date)]
+    if scenes.empty:
+        raise ValueError("No scenes in the given date range.")
+    scenes = scenes.sort_values(["date", "product"]).reset_index(drop=True)
+    if scenes["tile"].nunique() > 1:
+        raise ValueError(f"Scenes of one tile expected. Got {sorted(scenes['tile'].unique())}.")
+    return scenes
+
+
+def band_source(scene, band):
+    """Get the dataset name and band index of a band of a scene.
+
+    Arguments:
+        scene {Series or dict} -- Scene with the fields ``path``, ``sceneid`` and ``product``.
+            ``path`` is a hdf file or a scene directory written by ``convert_hdf2tiffs``.
+        band {str} -- Long band name or alias (see ``utils.resolve_band_name``), e.g. ``'Red'``.
+
+    Returns:
+        tuple -- Dataset name and (1-based) band index. In order of preference: the subdataset of
+            the hdf file, ``<sceneid>__<band>.tif``, ``<sceneid>.tif`` or ``<sceneid>.vrt``.
+    """
+    band = resolve_band_name(scene["product"], band)
+    path = Path(scene["path"])
+    if path.suffix == ".hdf":
+        return hdf_subdataset_name(str(path), BAND_NAMES[scene["product"]][band]), 1
+    single = path / f"{scene['sceneid']}__{band}.tif"
+    if single.exists():
+        return str(single), 1
+    for stack in [path / f"{scene['sceneid']}.tif", path / f"{scene['sceneid']}.vrt"]:
+        if stack.exists():
+            with rasterio.open(stack) as src:
+                return str(stack), stack_band_indexes(src, [band])[0]
+    raise FileNotFoundError(f"Band {band} of {scene['sceneid']} not found in {path}.")
+
+
+def scenes_from_directory(dstdir):
+    """Get the scenes in the destination directory of ``convert_hdf2tiffs_batch``.
+
+    Returns:
+        dataframe -- Like ``dataframe_from_hdf_paths`` with the scene directories as ``path``.
+    """
+    directories = sorted(p for p in Path(dstdir).glob("HLS.*") if p.is_dir())
+    if not directories:
+        raise ValueError(f"No scene directories in {dstdir}.")
+    scenes = dataframe_from_hdf_paths([str(p.parent / (p.name + ".hdf")) for p in directories])
+    scenes["path"] = [str(p) for p in directories]
+    return scenes
@@ -1,42 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import pandas as pd
 from pathlib import Path
+import time
 from tqdm import tqdm
-import urllib
 
+from .metrics import METRICS
+from .session import get_session
+from .utils import BASE_URL
+from .utils import get_metadata_from_hdr
+from .utils import parse_metadata_text
 from .utils import parse_url
 
 
 log = logging.getLogger(__name__)
 
+DEFAULT_DOWNLOAD_WORKERS = 4
+CHUNK_SIZE = 1024 * 1024
+METADATA_BYTES = 1024 * 1024
 
-def download_batch(dstdir, datasets, version="v1.4", overwrite=False):
+
+def download_batch(dstdir, datasets, version="v1.4", overwrite=False,
+                   max_cloud_coverage=None, min_spatial_coverage=None, metadata_bytes=METADATA_BYTES,
+                   max_workers=DEFAULT_DOWNLOAD_WORKERS, session=None, chunk_size=CHUNK_SIZE,
+                   base_url=BASE_URL):
     """Download the datasets given by a dataframe as returned by ``utils.get_available_datasets``.
+
+    The datasets are downloaded on a thread pool sharing one connection-pooled session.
+    A single progress bar shows the total transfer rate.
+
+    Arguments:
+        dstdir {str} -- Destination directory.
+        datasets {dataframe} -- Dataframe with the columns ``date``, ``tile`` and ``product``.
+
+    Keyword Arguments:
+        version {str} -- Product version. (default: {"v1.4"})
+        overwrite {bool} -- Download datasets even if they exist. (default: {False})
+        max_cloud_coverage {float} -- Skip datasets with a higher cloud cover without downloading
+            the hdf file (see ``download``). (default: {None})
+        min_spatial_coverage {float} -- Skip datasets with a lower spatial coverage without
+            downloading the hdf file (see ``download``). (default: {None})
+        metadata_bytes {int} -- See ``download``. (default: {1 MiB})
+        max_workers {int} -- Number of concurrent downloads. (default: {4})
+        session {requests.Session} -- Session to be used, e.g. as returned by
+            ``session.get_session``. If ``None`` a new one is created. (default: {None})
+        chunk_size {int} -- Number of bytes read and written at once. (default: {1 MiB})
+        base_url {str} -- Root of the HLS data directory tree. (default: {BASE_URL})
+
+    Returns:
+        dataframe -- One row per dataset (same index as ``datasets``) with the columns
+            ``path``, ``status`` (``'downloaded'``, ``'skipped'``, ``'filtered'`` or ``'failed'``),
+            ``bytes``, ``duration`` (seconds), ``error``, ``cloud_cover`` and ``spatial_coverage``.
     """
-    for i, row in tqdm(datasets.iterrows(), total=datasets.shape[0]):
-        download(dstdir, row["date"].strftime("%Y-%m-%d"), row["tile"], row["product"],
-                 version=version, overwrite=overwrite)
+    if session is None:
+        session = get_session(max_connections=max_workers)
+
+    def _download_row(row):
+        return download(dstdir, row["date"].strftime("%Y-%m-%d"), row["tile"], row["product"],
+                        version=version, overwrite=overwrite,
+                        max_cloud_coverage=max_cloud_coverage,
+                        min_spatial_coverage=min_spatial_coverage,
+                        metadata_bytes=metadata_bytes, session=session,
+                        progress=progress, chunk_size=chunk_size, base_url=base_url)
 
+    with tqdm(unit="B", unit_scale=True, unit_divisor=1024) as progress, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_download_row, [row for _, row in datasets.iterrows()]))
+    return pd.DataFrame(results,
+                        index=datasets.index,
+                        columns=["path", "status", "bytes", "duration", "error",
+                                 "cloud_cover", "spatial_coverage"])
 
-def download(dstdir, date, tile, product, version="v1.4", overwrite=False):
+
+def download(dstdir, date, tile, product, version="v1.4", overwrite=False,
+             max_cloud_coverage=None, min_spatial_coverage=None, metadata_bytes=METADATA_BYTES,
+             session=None, progress=None, chunk_size=CHUNK_SIZE, base_url=BASE_URL):
     """Download a HRL dataset into directory 'dstdir' given the dataset specifications.
+
+    The .hdf and the .hdf.hdr file of the dataset are downloaded.
+    Each file is streamed into a ``.part`` file which is renamed once its size has been
+    verified. An interrupted download is resumed from the ``.part`` file by the next call.
+
+    With ``max_cloud_coverage`` or ``min_spatial_coverage`` the datasets are prefiltered:
+    The cloud cover and spatial coverage are taken from the .hdf.hdr file, or if not
+    available there, from the first ``metadata_bytes`` of the hdf file (HTTP Range request).
+    The hdf file is only downloaded if it passes the thresholds or if its metadata can
+    not be found. A missing .hdf.hdr file does not fail the download.
+
+    Keyword Arguments:
+        max_cloud_coverage {float} -- Skip datasets with a higher cloud cover. (default: {None})
+        min_spatial_coverage {float} -- Skip datasets with a lower spatial coverage.
+            (default: {None})
+        metadata_bytes {int} -- Number of bytes at the start of the hdf file searched for the
+            metadata if it is not in the .hdf.hdr file. ``0`` disables the search. (default: {1 MiB})
+        session {requests.Session} -- Session to be used. If ``None`` a new one is created.
+            (default: {None})
+        progress {tqdm} -- Progress bar to be updated with the number of transferred bytes.
+            (default: {None})
+        chunk_size {int} -- Number of bytes read and written at once. (default: {1 MiB})
+
+    Returns:
+        dict -- With the keys ``path``, ``status`` (``'downloaded'``, ``'skipped'``,
+            ``'filtered'`` or ``'failed'``), ``bytes``, ``duration`` (seconds), ``error``,
+            ``cloud_cover`` and ``spatial_coverage`` (only set when prefiltering).
     """
     def _download(src, dst, overwrite):
-        if not Path(dst).exists() or overwrite:
-            try:
-                urllib.request.urlretrieve(src, dst)
-            except Exception:
-                log.exception(f"ERROR DURING DOWNLOAD: {dst} FROM {src}.")
-                return 1
-            if not Path(dst).exists():
-                log.debug(f"DOWNLOAD COMPLETE: {dst} FROM {src}")
-            else:
-                log.debug(f"DOWNLOAD COMPLETE (EXISTING FILE OVERWRITTEN): {dst} FROM {src}")
-        else:
+        existed = Path(dst).exists()
+        if existed and not overwrite:
             log.debug(f"DOWNLOAD SKIPPED (FILE EXISTS): {src} TO {dst}")
+            return "skipped", 0
+        n_bytes = _download_file(src, dst, session, chunk_size=chunk_size, progress=progress)
+        if not existed:
+            log.debug(f"DOWNLOAD COMPLETE: {dst} FROM {src}")
+        else:
+            log.debug(f"DOWNLOAD COMPLETE (EXISTING FILE OVERWRITTEN): {dst} FROM {src}")
+        return "downloaded", n_bytes
 
     if len(tile) != 5:
         raise ValueError(f"Tilename must follow the pattern of e.g. 32TPT. Got {tile}.")
-    url_hdf = parse_url(date, tile=tile, product=product, version=version)
+    url_hdf = parse_url(date, tile=tile, product=product, version=version, base_url=base_url)
     url_hdf_hdr = url_hdf + ".hdr"
 
     dstdir = Path(dstdir)
@@ -45,7 +127,148 @@ def download(dstdir, date, tile, product, version="v1.4", overwrite=False):
     dstpath_hdf = dstdir / url_hdf.split("/")[-1]
     dstpath_hdf_hdr = dstdir / url_hdf_hdr.split("/")[-1]
 
-    _download(url_hdf, dstpath_hdf, overwrite)
-    _download(url_hdf_hdr, dstpath_hdf_hdr, overwrite)
+    if session is None:
+        session = get_session()
 
-    return 0
+    prefilter = max_cloud_coverage is not None or min_spatial_coverage is not None
+    result = {"path": str(dstpath_hdf), "status": "skipped", "bytes": 0,
+              "duration": 0.0, "error": None, "cloud_cover": None, "spatial_coverage": None}
+    start = time.perf_counter()
+
+    def _fetch(src, dst):
+        # the error or None, a missing .hdr file does not fail the download of the hdf file
+        try:
+            status, n_bytes = _download(src, dst, overwrite)
+        except Exception as exc:
+            log.exception(f"ERROR DURING DOWNLOAD: {dst} FROM {src}.")
+            return f"{src}: {exc}"
+        result["bytes"] += n_bytes
+        if status == "downloaded":
+            result["status"] = "downloaded"
+        return None
+
+    error = None
+    if not prefilter:
+        error = _fetch(url_hdf, dstpath_hdf)
+        _fetch(url_hdf_hdr, dstpath_hdf_hdr)
+    else:
+        # the small .hdr file first, it might be all we need for prefiltering
+        _fetch(url_hdf_hdr, dstpath_hdf_hdr)
+        passed = True
+        if overwrite or not dstpath_hdf.exists():
+            try:
+                with METRICS.timer("prefilter"):
+                    metadata = _get_prefilter_metadata(dstpath_hdf_hdr, url_hdf, session,
+                                                       metadata_bytes)
+            except Exception as exc:
+                log.exception(f"ERROR DURING PREFILTERING: {url_hdf}.")
+                error = f"{url_hdf}: {exc}"
+            else:
+                result.update(metadata)
+                passed = _passes_prefilter(metadata, max_cloud_coverage, min_spatial_coverage)
+                if not passed:
+                    log.debug(f"DOWNLOAD SKIPPED (PREFILTER {metadata}): {url_hdf} TO {dstpath_hdf}")
+                    result["status"] = "filtered"
+        if passed and error is None:
+            error = _fetch(url_hdf, dstpath_hdf)
+    if error is not None:
+        result["status"] = "failed"
+        result["error"] = error
+    result["duration"] = time.perf_counter() - start
+    METRICS.increment(f"download_{result['status']}")
+    METRICS.increment("download_bytes", result["bytes"])
+    METRICS.record_time("download", result["duration"])
+    return result
+
+
+def _get_prefilter_metadata(path_hdr, url_hdf, session, metadata_bytes):
+    """Get cloud cover and spatial coverage from the .hdr file (if any) or the first bytes of the hdf."""
+    fields = ["cloud_cover", "spatial_coverage"]
+    metadata = get_metadata_from_hdr(path_hdr, fields=fields) if Path(path_hdr).exists() else {}
+    if len(metadata) < len(fields) and metadata_bytes:
+        with session.get(url_hdf, headers={"Range": f"bytes=0-{metadata_bytes - 1}"},
+                         stream=True) as response:
+            response.raise_for_status()
+            head = response.raw.read(metadata_bytes, decode_content=True)
+        metadata = dict(parse_metadata_text(head, fields=fields), **metadata)
+    return metadata
+
+
+def _passes_prefilter(metadata, max_cloud_coverage, min_spatial_coverage):
+    """Check the metadata against the thresholds. Missing metadata passes."""
+    cloud_cover = metadata.get("cloud_cover")
+    if max_cloud_coverage is not None and isinstance(cloud_cover, float) \
+            and cloud_cover > max_cloud_coverage:
+        return False
+    spatial_coverage = metadata.get("spatial_coverage")
+    if min_spatial_coverage is not None and isinstance(spatial_coverage, float) \
+            and spatial_coverage < min_spatial_coverage:
+        return False
+    return True
+
+
+def _download_file(src, dst, session, chunk_size=CHUNK_SIZE, progress=None):
+    """Stream ``src`` into ``<dst>.part`` and rename it to ``dst`` once it is complete.
+
+    An existing ``.part`` file, e.g. from an interrupted download, is resumed with a
+    HTTP Range request. The validator of the remote file (``ETag`` or ``Last-Modified``)
+    is kept in ``<dst>.part.validator`` and sent as ``If-Range``, i.e. if the remote file
+    changed in the meantime the server sends all of it and the download starts over.
+    Without a validator the download starts over too. A ``.part`` file the server answers
+    with 416 (Range Not Satisfiable) is renamed if it has the size of the remote file
+    (``Content-Range: bytes */<size>``) and the download starts over otherwise.
+    The size of the completed file is verified against the size announced by the server.
+
+    Returns:
+        int -- Number of bytes transferred.
+    """
+    dst = Path(dst)
+    dst_part = dst.parent / (dst.name + ".part")
+    dst_validator = dst.parent / (dst.name + ".part.validator")
+    offset = dst_part.stat().st_size if dst_part.exists() else 0
+    headers = {}
+    if offset and dst_validator.exists():
+        headers = {"Range": f"bytes={offset}-", "If-Range": dst_validator.read_text()}
+    n_bytes = 0
+    with session.get(src, headers=headers, stream=True) as response:
+        if response.status_code == 416:
+            # the .part file is complete if it has the size of the remote file, e.g. if the
+            # download was interrupted before the rename, otherwise start over
+            total_size = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if total_size.isdigit() and int(total_size) == offset:
+                log.debug(f"DOWNLOAD ALREADY COMPLETE: {src} TO {dst_part}")
+                dst_part.replace(dst)
+                dst_validator.unlink()
+                return 0
+            log.debug(f"DOWNLOAD RESTARTED (RANGE NOT SATISFIABLE): {src} TO {dst_part}")
+            dst_part.unlink()
+            return _download_file(src, dst, session, chunk_size=chunk_size, progress=progress)
+        response.raise_for_status()
+        if response.status_code == 206:
+            total_size = int(response.headers["Content-Range"].split("/")[-1])
+            mode = "ab"
+            log.debug(f"DOWNLOAD RESUMED AT BYTE {offset}: {src} TO {dst_part}")
+        else:
+            if headers:
+                log.debug(f"DOWNLOAD RESTARTED (REMOTE FILE CHANGED): {src} TO {dst_part}")
+            content_length = response.headers.get("Content-Length")
+            total_size = int(content_length) if content_length is not None else None
+            mode = "wb"
+            validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+            if validator is not None:
+                dst_validator.write_text(validator)
+            elif dst_validator.exists():
+                dst_validator.unlink()
+        with open(dst_part, mode) as fh:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                fh.write(chunk)
+                n_bytes += len(chunk)
+                if progress is not None:
+                    progress.update(len(chunk))
+    size = dst_part.stat().st_size
+    if total_size is not None and size != total_size:
+        raise IOError(f"Incomplete download of {src}: Got {size} of {total_size} bytes.")
+    dst_part.replace(dst)
+    if dst_validator.exists():
+        dst_validator.unlink()
+    return n_bytes
@@ -1,88 +1,483 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import logging
+import math
+import numpy as np
+import os
+import pandas as pd
 from pathlib import Path
+import rasterio
+from rasterio.io import MemoryFile
+import rasterio.shutil
+from rasterio.errors import RasterioIOError
+from rasterio.errors import WindowError
+from rasterio.transform import array_bounds
+from rasterio.warp import transform
+from rasterio.windows import Window
+from rasterio.windows import from_bounds
+import shlex
 from tqdm import tqdm
 import subprocess
+import time
 
+from .metadata import get_metadata_cache
+from .metadata import hdf_subdataset_name
+from .metrics import METRICS
+from .names import parse_granule_id
+from .store import get_store
 from .utils import BAND_NAMES
 from .utils import get_cloud_coverage_from_hdf
+from .tiles import polygon_intersects_rectangle
+from .tiles import read_aoi
+from .utils import get_coverages_from_hdfs
+from .vrt import vrt_xml
 
 
 log = logging.getLogger(__name__)
 
 
 def convert_hdf2tiffs_batch(hdf_paths, dstdir, bands=None, max_cloud_coverage=100,
-                            gdal_translate_options=None):
-    """Convert a batch of nasa-hls hdf files to single layer file GeoTiffs."""
-
-    converted = []
-    for hdf_path in tqdm(hdf_paths, total=len(hdf_paths)):
-        dir_tiffs = convert_hdf2tiffs(hdf_path=hdf_path, dstdir=dstdir, bands=bands,
-                                      max_cloud_coverage=max_cloud_coverage,
-                                      gdal_translate_options=gdal_translate_options)
-        if dir_tiffs is not None:
-            converted.append(dir_tiffs)
-    return converted
+                            gdal_translate_options=None, metadata_cache=None,
+                            driver="GTiff", creation_options=None, stack=False, interleave="band",
+                            max_workers=1, gdal_cache_max=None, gdal_num_threads=None, store=False,
+                            window=None, bounds=None, aoi=None):
+    """Convert a batch of nasa-hls hdf files to single layer file GeoTiffs.
+
+    The files are converted on a process pool with ``max_workers`` processes.
+    See ``convert_hdf2tiffs`` for the other arguments.
+
+    With ``store=True`` the bands are not written to GeoTiffs but appended to one chunked time
+    series store per tile (``<dstdir>/<tile>``, see ``store.TimeSeriesStore``) instead.
+    The files are appended one after the other in the current process in the order of their
+    dates. Files already in the store are not appended again (status ``'exists'``), i.e. new
+    scenes can be added incrementally.
+
+    Keyword Arguments:
+        max_workers {int} -- Number of processes. With ``1`` the files are converted
+            in the current process, ``None`` uses the number of CPUs. (default: {1})
+        gdal_cache_max {int} -- GDAL block cache size in MB per process (``GDAL_CACHEMAX``).
+            ``None`` keeps the GDAL default. (default: {None})
+        gdal_num_threads {int or str} -- Number of threads GDAL may use per process, e.g.
+            for compression (``GDAL_NUM_THREADS``). ``None`` distributes the CPUs over the
+            processes. (default: {None})
+        store {bool} -- Append to time series stores. (default: {False})
+
+    Returns:
+        dataframe -- One row per file with the columns ``path``, ``dstdir`` (or the store),
+            ``status`` (``'converted'``, ``'skipped'`` due to the cloud cover or as not
+            intersecting the window, bounds or AOI, ``'exists'`` if already in the store,
+            or ``'failed'``),
+            ``duration`` (seconds) and ``error``.
+    """
+    metadata_cache = get_metadata_cache(metadata_cache)
+    hdf_paths = [str(hdf_path) for hdf_path in hdf_paths]
+    max_workers = max_workers or os.cpu_count() or 1
+    if gdal_num_threads is None:
+        gdal_num_threads = max(1, (os.cpu_count() or 1) // max_workers)
+    gdal_config = {"GDAL_NUM_THREADS": gdal_num_threads}
+    if gdal_cache_max is not None:
+        gdal_config["GDAL_CACHEMAX"] = gdal_cache_max
+
+    if store and (window is not None or bounds is not None or aoi is not None):
+        raise ValueError("'window', 'bounds' and 'aoi' are not supported with 'store=True'.")
+
+    results = {}
+    if max_cloud_coverage < 100 and (store or metadata_cache is not None):
+        # check the cloud cover of all files at once, the workers do not need the cache
+        results.update(_prefilter(hdf_paths, max_cloud_coverage, metadata_cache))
+        max_cloud_coverage = 100
+
+    if store:
+        to_append = sorted((hdf_path for hdf_path in hdf_paths if hdf_path not in results),
+                           key=lambda hdf_path: parse_granule_id(hdf_path)["date_Yj"])
+        with rasterio.Env(**gdal_config):
+            for hdf_path in tqdm(to_append):
+                results[hdf_path] = _append_to_store(hdf_path, dstdir, bands)
+        return pd.DataFrame([results[hdf_path] for hdf_path in hdf_paths],
+                            columns=["path", "dstdir", "status", "duration", "error"])
+
+    kwargs = dict(dstdir=dstdir, bands=bands, max_cloud_coverage=max_cloud_coverage,
+                  gdal_translate_options=gdal_translate_options,
+                  driver=driver, creation_options=creation_options,
+                  stack=stack, interleave=interleave, window=window, bounds=bounds, aoi=aoi)
+    to_convert = [hdf_path for hdf_path in hdf_paths if hdf_path not in results]
+    with tqdm(total=len(hdf_paths), initial=len(results)) as progress:
+        if max_workers == 1:
+            for hdf_path in to_convert:
+                results[hdf_path] = _convert_hdf2tiffs_task(hdf_path, kwargs, gdal_config)
+                results[hdf_path].pop("metrics")
+                progress.update(1)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(_convert_hdf2tiffs_task, hdf_path, kwargs, gdal_config): hdf_path
+                           for hdf_path in to_convert}
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+                    # recorded in the worker process
+                    METRICS.merge(results[futures[future]].pop("metrics"))
+                    progress.update(1)
+    return pd.DataFrame([results[hdf_path] for hdf_path in hdf_paths],
+                        columns=["path", "dstdir", "status", "duration", "error"])
+
+
+def _prefilter(hdf_paths, max_cloud_coverage, metadata_cache):
+    """Get the results of the files with a cloud cover above ``max_cloud_coverage``.
+
+    Files with an unknown cloud cover pass.
+    """
+    skipped = {}
+    coverages = get_coverages_from_hdfs(hdf_paths, metadata_cache=metadata_cache)
+    for hdf_path, cc in zip(hdf_paths, coverages["cloud_cover"]):
+        if cc is not None and not pd.isna(cc) and cc > max_cloud_coverage:
+            log.debug(f"SKIPPING CONVERSION - TOO HIGH CLOUD COVER: {cc}")
+            skipped[hdf_path] = {"path": hdf_path, "dstdir": None, "status": "skipped",
+                                 "duration": 0.0, "error": None}
+    return skipped
+
+
+def _convert_hdf2tiffs_task(hdf_path, kwargs, gdal_config):
+    before = METRICS.snapshot()
+    start = time.perf_counter()
+    try:
+        with rasterio.Env(**gdal_config):
+            dstdir_scene, errors = _convert_hdf2tiffs(hdf_path, gdal_config=gdal_config, **kwargs)
+        if dstdir_scene is None:
+            status, error = "skipped", None
+        elif errors:
+            status, error = "failed", "; ".join(errors)
+        else:
+            status, error = "converted", None
+    except Exception as exc:
+        log.exception(f"ERROR DURING CONVERSION OF {hdf_path}.")
+        dstdir_scene, status, error = None, "failed", str(exc)
+    duration = time.perf_counter() - start
+    METRICS.increment(f"convert_{status}")
+    METRICS.record_time("convert", duration)
+    return {"path": hdf_path, "dstdir": dstdir_scene, "status": status,
+            "duration": duration, "error": error, "metrics": METRICS.since(before)}
+
+
+def _append_to_store(hdf_path, dstdir, bands):
+    start = time.perf_counter()
+    tile_store = get_store(dstdir, "T" + parse_granule_id(hdf_path)["tile"], bands=bands)
+    if Path(hdf_path).stem in tile_store:
+        status, error = "exists", None
+    else:
+        try:
+            tile_store.append_hdf(hdf_path)
+            status, error = "converted", None
+        except Exception as exc:
+            log.exception(f"ERROR DURING APPENDING {hdf_path} TO {tile_store.path}.")
+            status, error = "failed", str(exc)
+    duration = time.perf_counter() - start
+    METRICS.increment(f"convert_{status}")
+    METRICS.record_time("convert", duration)
+    return {"path": hdf_path, "dstdir": tile_store.path, "status": status,
+            "duration": duration, "error": error}
+
 
 def convert_hdf2tiffs(hdf_path, dstdir, bands=None, max_cloud_coverage=100,
-                      gdal_translate_options=None):
+                      gdal_translate_options=None, metadata_cache=None,
+                      driver="GTiff", creation_options=None, stack=False, interleave="band",
+                      window=None, bounds=None, aoi=None):
     """Convert (a subset of) hdf-file layers to single layer file GeoTiffs.
-    
-    Starting with GDAL 3.1 a Cloud Optimized GeoTIFF generator is available.
-    It can be used to generate COGs instead of normal GeoTIFFs.
-    For building a COG with default options simply use 
-    `gdal_translate_options='-of COG'`.
-    For more information and options see https://gdal.org/drivers/raster/cog.html.
+
+    The cloud cover is checked once and the bands are written in-process with
+    rasterio/GDAL. The output format is defined by ``driver`` and ``creation_options``,
+    e.g. for Cloud Optimized GeoTIFFs (GDAL >= 3.1) use ``driver='COG'`` and
+    ``creation_options={'COMPRESS': 'DEFLATE'}``.
+    For more information and options see https://gdal.org/drivers/raster/cog.html
+    and https://gdal.org/drivers/raster/gtiff.html.
+
+    For compatibility the bands are converted with one ``gdal_translate`` call per band
+    if ``gdal_translate_options`` are given, e.g. ``gdal_translate_options='-of COG'``.
+
+    With a ``metadata_cache`` (a ``metadata.MetadataCache`` or the path of its database)
+    the cloud cover is served from or stored in the cache.
+
+    With ``stack=True`` the bands are written to one multi-band file
+    ``<dstdir>/<sceneid>/<sceneid>.tif`` instead of one file per band.
+    The band descriptions are the long band names, see ``read_stack``.
+    All bands are stored with a common data type, i.e. the QA band as int16.
+
+    With ``window``, ``bounds`` or ``aoi`` only the intersecting window, extended to the
+    block boundaries of the hdf file, is read and written (see ``clip_window``).
+    Scenes not intersecting are skipped without reading pixels.
+    Existing output files are kept if they cover the same window (or the whole tile
+    without clipping) and written again otherwise. The output grid of ``gdal_translate_options``
+    is not known, i.e. with these options existing files are always kept without clipping and
+    compared by their bounds with clipping.
+
+    Keyword Arguments:
+        driver {str} -- GDAL driver of the output files. (default: {"GTiff"})
+        creation_options {dict} -- GDAL creation options of the output files, e.g.
+            ``{'TILED': 'YES', 'COMPRESS': 'LZW'}``. (default: {None})
+        stack {bool} -- Write one multi-band file. (default: {False})
+        interleave {str} -- Interleaving of the multi-band file, ``'band'`` or ``'pixel'``.
+            Only applies if ``stack=True``. (default: {"band"})
+        window {Window or tuple} -- Pixel window, see ``clip_window``. (default: {None})
+        bounds {tuple} -- Bounds in the CRS of the tile, see ``clip_window``. (default: {None})
+        aoi {str or tuple or dict} -- Area of interest in longitude/latitude, see
+            ``clip_window``. (default: {None})
+
+    Returns:
+        Path -- The directory with the GeoTiffs or ``None`` if the cloud cover is too high
+            or the scene does not intersect the window, bounds or AOI.
     """
+    dstdir_scene, _ = _convert_hdf2tiffs(hdf_path, dstdir, bands=bands,
+                                         max_cloud_coverage=max_cloud_coverage,
+                                         gdal_translate_options=gdal_translate_options,
+                                         metadata_cache=metadata_cache,
+                                         driver=driver, creation_options=creation_options,
+                                         stack=stack, interleave=interleave,
+                                         window=window, bounds=bounds, aoi=aoi)
+    return dstdir_scene
 
-    if ".L30." in str(hdf_path):
-        product = "L30"
-    elif ".S30." in str(hdf_path):
-        product = "S30"
-    else:
-        log.exception(f"FATAL ERROR : COULD NOT DERIVE PRODUCT.")
+
+def _convert_hdf2tiffs(hdf_path, dstdir, bands=None, max_cloud_coverage=100,
+                       gdal_translate_options=None, metadata_cache=None,
+                       driver="GTiff", creation_options=None, stack=False, interleave="band",
+                       window=None, bounds=None, aoi=None, gdal_config=None):
+    """Like ``convert_hdf2tiffs`` but also return the errors of the bands that failed."""
+    metadata_cache = get_metadata_cache(metadata_cache)
+    if stack and gdal_translate_options:
+        raise ValueError("'gdal_translate_options' are not supported with 'stack=True'.")
+
+    product = parse_granule_id(hdf_path)["product"]
+    if product not in BAND_NAMES:
         raise ValueError(f"Could not derive the product ('L30' or 'S30') from the {hdf_path}.")
 
     if bands is None:
         bands = list(BAND_NAMES[product].keys())
 
-    return_none = False
-    for long_band_name in bands:
-        if long_band_name not in BAND_NAMES[product].keys():
-            continue
-        else:
-            band = BAND_NAMES[product][long_band_name]
+    hdf_path = Path(hdf_path)
+    hdf_path_str = str(hdf_path.resolve())
+    dstdir_scene = Path(dstdir) / hdf_path.stem
 
-        if not isinstance(hdf_path, str):
-            hdf_path_str = str(hdf_path.resolve())
-        else:
-            hdf_path = Path(hdf_path)
-            hdf_path_str = hdf_path
-
-        if max_cloud_coverage < 100:
-            try:
+    if max_cloud_coverage < 100:
+        try:
+            if metadata_cache is not None:
+                cc = float(metadata_cache.read_metadata(hdf_path_str)["cloud_coverage"])
+            else:
                 cc = get_cloud_coverage_from_hdf(hdf_path_str)
-                log.debug(f"DERIVED CLOUD COVER: {cc}")
-            except:
-                log.exception(f"COULD NOT DERIVE CLOUD COVER => PROCESSING ANYWAY: {hdf_path_str}")
-                cc = 0
+            log.debug(f"DERIVED CLOUD COVER: {cc}")
+        except:
+            log.exception(f"COULD NOT DERIVE CLOUD COVER => PROCESSING ANYWAY: {hdf_path_str}")
+            cc = 0
+
+        if cc > max_cloud_coverage:
+            log.debug(f"SKIPPING CONVERSION - TOO HIGH CLOUD COVER: {cc}")
+            return None, []
 
-            if cc > max_cloud_coverage:
-                log.debug(f"SKIPPING CONVERSION - TOO HIGH CLOUD COVER: {cc}")
-                return_none = True
-                break
+    clip = None
+    if window is not None or bounds is not None or aoi is not None:
+        clip = clip_window(hdf_subdataset_name(hdf_path_str, "QA"), window=window, bounds=bounds,
+                           aoi=aoi)
+        if clip is None:
+            log.debug(f"SKIPPING CONVERSION - NO INTERSECTION: {hdf_path_str}")
+            return None, []
 
-        dst = (dstdir / hdf_path.stem).resolve() / f"{hdf_path.stem}__{long_band_name}.tif"
+    extent = {}
+
+    def _exists(dst):
+        # an existing output of another window (or of the whole tile) is written again,
+        # the grid of outputs of gdal_translate_options is unknown, only clipped ones are checked
         if not dst.exists():
-            cmd = f"gdal_translate HDF4_EOS:EOS_GRID:'{hdf_path_str}':Grid:{band} {dst}"
-            if gdal_translate_options:
-                cmd += f" {gdal_translate_options}"
-            log.debug(f"CMD: {cmd}")
+            return False
+        if gdal_translate_options and clip is None:
+            return True
+        if not extent:
+            extent.update(_output_extent(hdf_subdataset_name(hdf_path_str, "QA"), clip))
+        if _has_extent(dst, resampled=bool(gdal_translate_options), **extent):
+            return True
+        log.debug(f"CONVERTING AGAIN - EXISTING FILE HAS ANOTHER EXTENT: {dst}")
+        dst.unlink()
+        return False
+
+    errors = []
+    if stack:
+        long_band_names = [name for name in bands if name in BAND_NAMES[product].keys()]
+        dst = dstdir_scene.resolve() / f"{hdf_path.stem}.tif"
+        if not _exists(dst):
             dst.parent.mkdir(exist_ok=True, parents=True)
             try:
-                subprocess.check_call(cmd, shell=True)
-            except Exception:
-                log.exception(f"ERROR DURING CONVERSION WITH CMD: {cmd}.")
-    if return_none:
+                with METRICS.timer("convert_stack"):
+                    _write_stack(hdf_path_str, product, long_band_names, dst, driver=driver,
+                                 creation_options=creation_options, interleave=interleave,
+                                 window=clip)
+                _count_written(dst)
+            except Exception as exc:
+                log.exception(f"ERROR DURING CONVERSION OF {hdf_path_str} TO {dst}.")
+                errors.append(f"stack: {exc}")
+        return dstdir_scene, errors
+
+    for long_band_name in bands:
+        if long_band_name not in BAND_NAMES[product].keys():
+            continue
+        band = BAND_NAMES[product][long_band_name]
+
+        dst = dstdir_scene.resolve() / f"{hdf_path.stem}__{long_band_name}.tif"
+        if _exists(dst):
+            continue
+        dst.parent.mkdir(exist_ok=True, parents=True)
+        src = hdf_subdataset_name(hdf_path_str, band)
+        try:
+            if gdal_translate_options:
+                options = gdal_translate_options
+                if clip is not None:
+                    options = (f"-srcwin {int(clip.col_off)} {int(clip.row_off)} "
+                               f"{int(clip.width)} {int(clip.height)} {options}")
+                with METRICS.timer("gdal_translate"):
+                    _gdal_translate(src, dst, options, gdal_config)
+            elif clip is not None:
+                with METRICS.timer("convert_band"):
+                    _copy_window(src, dst, clip, driver=driver, creation_options=creation_options)
+            else:
+                with METRICS.timer("convert_band"):
+                    rasterio.shutil.copy(src, str(dst), driver=driver, **(creation_options or {}))
+            _count_written(dst)
+        except Exception as exc:
+            log.exception(f"ERROR DURING CONVERSION OF {src} TO {dst}.")
+            errors.append(f"{long_band_name}: {exc}")
+    return dstdir_scene, errors
+
+
+def _output_extent(src, window=None):
+    """Get the transform and shape of the output of ``src`` clipped to ``window`` (if any)."""
+    with rasterio.open(src) as ds:
+        window = window if window is not None else Window(0, 0, ds.width, ds.height)
+        return {"transform": ds.window_transform(window),
+                "shape": (int(window.height), int(window.width))}
+
+
+def _has_extent(path, transform, shape, resampled=False):
+    """Check the grid of ``path``, or with ``resampled=True`` its bounds within one of its pixels."""
+    try:
+        with rasterio.open(path) as ds:
+            if resampled:
+                tolerance = max(abs(res) for res in ds.res)
+                return all(abs(actual - expected) <= tolerance for actual, expected
+                           in zip(ds.bounds, array_bounds(*shape, transform)))
+            return ds.shape == shape and ds.transform.almost_equals(transform)
+    except RasterioIOError:
+        # e.g. a partially written file
+        return False
+
+
+def _count_written(dst):
+    METRICS.increment("convert_files_written")
+    METRICS.increment("convert_bytes_written", Path(dst).stat().st_size)
+
+
+def _write_stack(hdf_path, product, long_band_names, dst, driver="GTiff",
+                 creation_options=None, interleave="band", window=None):
+    sources = [hdf_subdataset_name(hdf_path, BAND_NAMES[product][name])
+               for name in long_band_names]
+    dtypes, nodata = [], []
+    for src in sources:
+        with rasterio.open(src) as ds:
+            dtypes.append(ds.dtypes[0])
+            nodata.append(ds.nodata)
+            tags = ds.tags()
+    dtype = np.result_type(*dtypes).name
+    # GeoTIFFs have one nodata value for all bands
+    nodata = nodata if len(set(nodata)) == 1 else [None] * len(nodata)
+    xml = vrt_xml(sources, descriptions=long_band_names, dtype=dtype, nodata=nodata, metadata=tags,
+                  window=window)
+    with MemoryFile(xml.encode(), ext=".vrt") as memfile, memfile.open() as src:
+        rasterio.shutil.copy(src, str(dst), driver=driver, INTERLEAVE=interleave.upper(),
+                             **(creation_options or {}))
+
+
+def _copy_window(src, dst, window, driver="GTiff", creation_options=None):
+    with rasterio.open(src) as ds:
+        nodata, tags = ds.nodata, ds.tags()
+    xml = vrt_xml([src], nodata=[nodata], metadata=tags, window=window)
+    with MemoryFile(xml.encode(), ext=".vrt") as memfile, memfile.open() as vrt:
+        rasterio.shutil.copy(vrt, str(dst), driver=driver, **(creation_options or {}))
+
+
+def clip_window(src, window=None, bounds=None, aoi=None):
+    """Get the window of a raster intersecting a window, bounds or AOI aligned to its blocks.
+
+    The window is extended to the block boundaries of the raster and clipped to its extent.
+    Only the header of the raster is read.
+
+    Arguments:
+        src {str} -- Path or GDAL dataset name of the raster.
+
+    Keyword Arguments:
+        window {Window or tuple} -- Pixel window, a ``rasterio.windows.Window`` or
+            ``(col_off, row_off, width, height)``. (default: {None})
+        bounds {tuple} -- ``(left, bottom, right, top)`` in the CRS of the raster.
+            Ignored if ``window`` is given. (default: {None})
+        aoi {str or tuple or dict} -- Area of interest in longitude/latitude, e.g. the path of
+            a GeoJSON file (see ``tiles.read_aoi``). Ignored if ``window`` or ``bounds`` is given.
+            (default: {None})
+
+    Returns:
+        Window -- The window or ``None`` if the raster does not intersect.
+    """
+    with rasterio.open(src) as ds:
+        extent = Window(0, 0, ds.width, ds.height)
+        if window is None and bounds is None and aoi is not None:
+            polygons = []
+            for polygon in read_aoi(aoi):
+                polygons.append([list(zip(*transform("EPSG:4326", ds.crs, *zip(*ring))))
+                                 for ring in polygon])
+            polygons = [polygon for polygon in polygons
+                        if polygon_intersects_rectangle(polygon, ds.bounds)]
+            if not polygons:
+                return None
+            xs = [x for polygon in polygons for x, _ in polygon[0]]
+            ys = [y for polygon in polygons for _, y in polygon[0]]
+            bounds = (min(xs), min(ys), max(xs), max(ys))
+        if window is None:
+            window = from_bounds(*bounds, transform=ds.transform)
+        elif not isinstance(window, Window):
+            window = Window(*window)
+        block_height, block_width = ds.block_shapes[0]
+    col_start = math.floor(window.col_off / block_width) * block_width
+    row_start = math.floor(window.row_off / block_height) * block_height
+    col_stop = math.ceil((window.col_off + window.width) / block_width) * block_width
+    row_stop = math.ceil((window.row_off + window.height) / block_height) * block_height
+    try:
+        return Window(col_start, row_start, col_stop - col_start,
+                      row_stop - row_start).intersection(extent)
+    except WindowError:
         return None
-    else:
-        return dstdir / hdf_path.stem
+
+
+def read_stack(path, bands=None, window=None):
+    """Read bands by their long band names from a multi-band file written with ``stack=True``.
+
+    Arguments:
+        path {str} -- Path of the multi-band file.
+
+    Keyword Arguments:
+        bands {list} -- Long band names, e.g. ``['Red', 'NIR', 'QA']``. ``None`` reads all bands.
+            (default: {None})
+        window {Window} -- Window to read, e.g. ``rasterio.windows.Window(0, 0, 512, 512)``.
+            (default: {None})
+
+    Returns:
+        array -- Array with the shape (bands, rows, columns) and the bands in the given order.
+    """
+    with rasterio.open(path) as src:
+        return src.read(stack_band_indexes(src, bands), window=window)
+
+
+def stack_band_indexes(src, bands=None):
+    """Get the (1-based) indexes of bands given by their long band names in a multi-band file."""
+    descriptions = list(src.descriptions)
+    if bands is None:
+        return list(range(1, src.count + 1))
+    missing = [band for band in bands if band not in descriptions]
+    if missing:
+        raise ValueError(f"Bands {missing} not in {src.name}. Available: {descriptions}.")
+    return [descriptions.index(band) + 1 for band in bands]
+
+
+def _gdal_translate(src, dst, gdal_translate_options, gdal_config=None):
+    cmd = f"gdal_translate {shlex.quote(src)} {shlex.quote(str(dst))} {gdal_translate_options}"
+    log.debug(f"CMD: {cmd}")
+    subprocess.check_call(cmd, shell=True, env=dict(os.environ, **{key: str(value) for key, value in (gdal_config or {}).items()}))
@@ -0,0 +1,154 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import rasterio
+from rasterio.windows import Window
+import time
+from tqdm import tqdm
+
+from .composite import DEFAULT_QA_VALID
+from .composite import copy_to_cog
+from .cube import FILL_VALUE
+from .cube import band_source
+from .names import parse_granule_id
+from .utils import _apply_lut
+from .utils import qa_valid_to_lut
+
+
+log = logging.getLogger(__name__)
+
+# normalized differences (a - b) / (a + b) of two bands given by long band names or aliases
+SPECTRAL_INDICES = {"NDVI": ("NIR", "Red"),
+                    "NDWI": ("Green", "NIR"),
+                    "NDMI": ("NIR", "SWIR1"),
+                    "NBR": ("NIR", "SWIR2")}
+INDEX_SCALE = 10000
+INDEX_NODATA = -32768
+DEFAULT_BLOCK_SIZE = 512
+
+
+def compute_indices(src, dstdir, indices=("NDVI", ), qa_valid=DEFAULT_QA_VALID,
+                    block_size=DEFAULT_BLOCK_SIZE, creation_options=None, overwrite=False):
+    """Compute spectral indices of a scene and write them as scaled int16 COGs.
+
+    Only the bands needed are read, window by window, from the hdf file or the output of
+    ``convert_hdf2tiffs`` (see ``cube.band_source``). The indices are computed in float32,
+    scaled by 10000 and written to ``<dstdir>/<sceneid>/<sceneid>__<index>.tif``.
+    Pixels with an invalid QA value or the fill value in one of the bands are -32768 (nodata).
+
+    Arguments:
+        src {str} -- Path of a hdf file or of a scene directory written by ``convert_hdf2tiffs``.
+        dstdir {str} -- Destination directory.
+
+    Keyword Arguments:
+        indices {list} -- Names of indices in ``SPECTRAL_INDICES``. (default: {("NDVI", )})
+        qa_valid {list or str} -- Valid QA values or a QA expression, see
+            ``hls_qa_layer_to_mask``. QA value 255 (fill) is invalid. ``None`` does not mask.
+            (default: {"no_cloud & no_adj_cloud & no_cloud_shadow"})
+        block_size {int} -- Width and height of the windows read at once. (default: {512})
+        creation_options {dict} -- GDAL creation options of the COGs. (default: {None})
+        overwrite {bool} -- Overwrite existing files. (default: {False})
+
+    Returns:
+        list -- Paths of the index files.
+    """
+    unknown = [index for index in indices if index not in SPECTRAL_INDICES]
+    if unknown:
+        raise ValueError(f"Unknown indices {unknown}. Available: {list(SPECTRAL_INDICES)}.")
+    src = Path(src)
+    granule = parse_granule_id(src.name)
+    sceneid = granule["sceneid"]
+    scene = {"path": str(src), "sceneid": sceneid, "product": granule["product"]}
+    dstdir_scene = Path(dstdir) / sceneid
+    dsts = {index: dstdir_scene / f"{sceneid}__{index}.tif" for index in indices}
+    indices = [index for index in indices if overwrite or not dsts[index].exists()]
+    if not indices:
+        return list(dsts.values())
+    dstdir_scene.mkdir(parents=True, exist_ok=True)
+
+    bands = list(dict.fromkeys(band for index in indices for band in SPECTRAL_INDICES[index]))
+    lut = qa_valid_to_lut(qa_valid, keep_255=False) if qa_valid is not None else None
+    sources = {band: band_source(scene, band) for band in bands + (["QA"] if lut is not None else [])}
+    with rasterio.open(sources[bands[0]][0]) as ref:
+        profile = ref.profile
+    profile.update(driver="GTiff", count=1, dtype="int16", nodata=INDEX_NODATA,
+                   tiled=True, blockxsize=256, blockysize=256, compress="deflate")
+    tmps = {index: dstdir_scene / (dsts[index].name + ".tmp.tif") for index in indices}
+
+    datasets = {}
+    outs = {}
+    try:
+        for band, (name, _) in sources.items():
+            if name not in datasets:
+                datasets[name] = rasterio.open(name)
+        for index in indices:
+            outs[index] = rasterio.open(tmps[index], "w", **profile)
+            outs[index].set_band_description(1, index)
+            outs[index].update_tags(scale_factor=1 / INDEX_SCALE)
+        for row_off in range(0, profile["height"], block_size):
+            for col_off in range(0, profile["width"], block_size):
+                window = Window(col_off, row_off, min(block_size, profile["width"] - col_off),
+                                min(block_size, profile["height"] - row_off))
+                data = {}
+                invalid = np.zeros((int(window.height), int(window.width)), dtype=bool)
+                for band in bands:
+                    name, band_index = sources[band]
+                    data[band] = datasets[name].read(band_index, window=window).astype("float32")
+                    invalid |= data[band] == FILL_VALUE
+                if lut is not None:
+                    name, band_index = sources["QA"]
+                    invalid |= _apply_lut(lut, datasets[name].read(band_index, window=window)) == 0
+                for index in indices:
+                    band_a, band_b = (data[band] for band in SPECTRAL_INDICES[index])
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        values = (band_a - band_b) / (band_a + band_b)
+                    values = np.where(invalid | ~np.isfinite(values), INDEX_NODATA,
+                                      np.round(np.clip(values, -1, 1) * INDEX_SCALE))
+                    outs[index].write(values.astype("int16"), 1, window=window)
+    finally:
+        for ds in list(datasets.values()) + list(outs.values()):
+            ds.close()
+    for index in indices:
+        copy_to_cog(tmps[index], dsts[index], creation_options=creation_options, remove=True)
+        log.debug(f"INDEX COMPLETE: {dsts[index]}")
+    return list(dsts.values())
+
+
+def compute_indices_batch(srcs, dstdir, indices=("NDVI", ), qa_valid=DEFAULT_QA_VALID,
+                          block_size=DEFAULT_BLOCK_SIZE, creation_options=None, overwrite=False,
+                          max_workers=None):
+    """Compute spectral indices of many scenes on a process pool. See ``compute_indices``.
+
+    Keyword Arguments:
+        max_workers {int} -- Number of processes. ``None`` uses the number of CPUs. (default: {None})
+
+    Returns:
+        dataframe -- One row per scene with the columns ``path``, ``status`` (``'computed'``
+            or ``'failed'``), ``duration`` (seconds) and ``error``.
+    """
+    srcs = [str(src) for src in srcs]
+    kwargs = dict(dstdir=dstdir, indices=indices, qa_valid=qa_valid, block_size=block_size,
+                  creation_options=creation_options, overwrite=overwrite)
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor, \
+            tqdm(total=len(srcs)) as progress:
+        futures = {executor.submit(_compute_indices_task, src, kwargs): src for src in srcs}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            progress.update(1)
+    return pd.DataFrame([results[src] for src in srcs],
+                        columns=["path", "status", "duration", "error"])
+
+
+def _compute_indices_task(src, kwargs):
+    start = time.perf_counter()
+    try:
+        compute_indices(src, **kwargs)
+        status, error = "computed", None
+    except Exception as exc:
+        log.exception(f"ERROR DURING INDEX COMPUTATION OF {src}.")
+        status, error = "failed", str(exc)
+    return {"path": src, "status": status, "duration": time.perf_counter() - start,
+            "error": error}
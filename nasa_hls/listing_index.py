@@ -0,0 +1,99 @@
+import calendar
+import datetime
+import json
+from pathlib import Path
+import re
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_TTL = 24 * 3600
+DEFAULT_CLOSED_YEAR_GRACE = 30 * 24 * 3600
+
+# e.g. .../v1.4/L30/2017/32/U/N/U/
+_YEAR_DIRECTORY = re.compile(r"/v[\d.]+/[LS]30/(\d{4})/\d{2}/\w/\w/\w/$")
+
+
+class ListingIndex(object):
+    """Persistent SQLite index of HLS directory listings keyed by the directory URL.
+
+    For each directory the hrefs of the listing are stored together with the
+    ``ETag`` and ``Last-Modified`` response headers and the time of the last fetch.
+
+    An entry is *fresh* if it was fetched less than ``ttl`` seconds ago.
+    Stale entries are revalidated with conditional GET requests.
+    An entry of a year directory is *closed*, i.e. it is never revalidated again,
+    if it was fetched more than ``closed_year_grace`` seconds after the end of the year.
+
+    Arguments:
+        path {str} -- Path of the SQLite database. It is created if it does not exist.
+
+    Keyword Arguments:
+        ttl {float} -- Time in seconds an entry is considered up-to-date. (default: {one day})
+        closed_year_grace {float} -- Time in seconds after the end of a year after which
+            no new datasets are expected in the directories of that year. (default: {30 days})
+    """
+    def __init__(self, path, ttl=DEFAULT_TTL, closed_year_grace=DEFAULT_CLOSED_YEAR_GRACE):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.closed_year_grace = closed_year_grace
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS listings ("
+                "url TEXT PRIMARY KEY, "
+                "hrefs TEXT NOT NULL, "
+                "etag TEXT, "
+                "last_modified TEXT, "
+                "fetched_at REAL NOT NULL)")
+
+    def close(self):
+        self._connection.close()
+
+    def get(self, url):
+        """Get the entry of a directory as a dictionary or ``None`` if it is not indexed."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT hrefs, etag, last_modified, fetched_at FROM listings WHERE url = ?",
+                (url, )).fetchone()
+        if row is None:
+            return None
+        return {"url": url,
+                "hrefs": json.loads(row[0]),
+                "etag": row[1],
+                "last_modified": row[2],
+                "fetched_at": row[3]}
+
+    def put(self, url, hrefs, etag=None, last_modified=None, fetched_at=None):
+        """Store the listing of a directory."""
+        if fetched_at is None:
+            fetched_at = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?)",
+                (url, json.dumps(list(hrefs)), etag, last_modified, fetched_at))
+
+    def touch(self, url, fetched_at=None):
+        """Mark the entry of a directory as fetched, e.g. after a ``304 Not Modified``."""
+        if fetched_at is None:
+            fetched_at = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE listings SET fetched_at = ? WHERE url = ?", (fetched_at, url))
+
+    def is_closed(self, entry):
+        """Check if the entry belongs to a year directory that can not change anymore."""
+        match = _YEAR_DIRECTORY.search(entry["url"])
+        if match is None:
+            return False
+        end_of_year = calendar.timegm(datetime.date(int(match.group(1)) + 1, 1, 1).timetuple())
+        return entry["fetched_at"] >= end_of_year + self.closed_year_grace
+
+    def is_fresh(self, entry, now=None):
+        """Check if the entry can be used without revalidation."""
+        if now is None:
+            now = time.time()
+        return self.is_closed(entry) or now - entry["fetched_at"] < self.ttl
@@ -0,0 +1,192 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+import pandas as pd
+from pathlib import Path
+import rasterio
+import sqlite3
+import threading
+import time
+
+from .metrics import METRICS
+
+
+METADATA_CACHE_NAME = "nasa_hls_metadata.sqlite"
+
+
+def hdf_subdataset_name(src, band="QA"):
+    """Get the GDAL name of a band (subdataset) of a nasa-hls hdf file.
+
+    Arguments:
+        src {str} -- Path of the hdf file.
+
+    Keyword Arguments:
+        band {str} -- Short band name, e.g. ``'B04'``, ``'band04'`` or ``'QA'`` (default: {"QA"})
+    """
+    return f'HDF4_EOS:EOS_GRID:"{src}":Grid:{band}'
+
+
+def read_metadata(src, band="QA"):
+    """Read all metadata fields of a nasa-hls hdf file in-process.
+
+    Numeric values are returned as ``int`` or ``float``, all other values as ``str``.
+    See Section 6.6 of the HLS User Guide for the available fields.
+
+    Arguments:
+        src {str} -- Path of a hdf file. Other paths, e.g. of GeoTIFFs converted from a hdf file,
+            are opened as they are.
+
+    Keyword Arguments:
+        band {str} -- Band (subdataset) of the hdf file to read the metadata from. (default: {"QA"})
+
+    Returns:
+        dict -- The metadata.
+    """
+    name = hdf_subdataset_name(src, band) if str(src).endswith(".hdf") else str(src)
+    with METRICS.timer("metadata_read"), rasterio.open(name) as ds:
+        tags = ds.tags()
+    return {key: _to_typed(value) for key, value in tags.items()}
+
+
+def read_metadata_batch(srcs, band="QA", max_workers=None):
+    """Read all metadata fields of many nasa-hls hdf files on a process pool.
+
+    Arguments:
+        srcs {list} -- Paths of hdf files.
+
+    Keyword Arguments:
+        band {str} -- See ``read_metadata``. (default: {"QA"})
+        max_workers {int} -- Number of processes. ``None`` uses the number of CPUs. (default: {None})
+
+    Returns:
+        dataframe -- One row per file with a ``path`` and an ``error`` column
+            (``None`` if the metadata could be read) and one column per metadata field.
+    """
+    return pd.DataFrame(_read_metadata_rows([str(src) for src in srcs], band, max_workers))
+
+
+class MetadataCache(object):
+    """Persistent SQLite cache of the metadata of nasa-hls hdf files.
+
+    Entries are keyed by the resolved path, the size and the modification time of a file,
+    i.e. an entry is invalid once the file changes. The cache is filled lazily.
+
+    Arguments:
+        path {str} -- Path of the SQLite database or of a directory. In case of a directory
+            the database ``nasa_hls_metadata.sqlite`` in that directory is used.
+            It is created if it does not exist.
+    """
+    def __init__(self, path):
+        path = Path(path)
+        if path.is_dir():
+            path = path / METADATA_CACHE_NAME
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                "path TEXT, "
+                "band TEXT, "
+                "size INTEGER, "
+                "mtime_ns INTEGER, "
+                "metadata TEXT NOT NULL, "
+                "PRIMARY KEY (path, band))")
+
+    def close(self):
+        self._connection.close()
+
+    def get(self, src, band="QA"):
+        """Get the cached metadata of a file or ``None`` if it is not cached or outdated."""
+        key = _cache_key(src)
+        if key is None:
+            return None
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT metadata FROM metadata WHERE path = ? AND band = ? "
+                "AND size = ? AND mtime_ns = ?", (key[0], band, key[1], key[2])).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, src, metadata, band="QA"):
+        """Cache the metadata of a file."""
+        key = _cache_key(src)
+        if key is None:
+            return
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?)",
+                (key[0], band, key[1], key[2], json.dumps(metadata)))
+
+    def read_metadata(self, src, band="QA"):
+        """Like ``read_metadata`` but served from or stored in the cache."""
+        metadata = self.get(src, band=band)
+        METRICS.increment("metadata_cache_hits" if metadata is not None else "metadata_cache_misses")
+        if metadata is None:
+            metadata = read_metadata(src, band=band)
+            self.put(src, metadata, band=band)
+        return metadata
+
+    def read_metadata_batch(self, srcs, band="QA", max_workers=None):
+        """Like ``read_metadata_batch`` but only files missing in the cache are read."""
+        srcs = [str(src) for src in srcs]
+        rows = {}
+        for src in srcs:
+            metadata = self.get(src, band=band)
+            if metadata is not None:
+                rows[src] = dict({"path": src, "error": None}, **metadata)
+        missing = [src for src in srcs if src not in rows]
+        METRICS.increment("metadata_cache_hits", len(srcs) - len(missing))
+        METRICS.increment("metadata_cache_misses", len(missing))
+        if missing:
+            for row in _read_metadata_rows(missing, band, max_workers):
+                if row["error"] is None:
+                    self.put(row["path"], {key: value for key, value in row.items()
+                                           if key not in ("path", "error")}, band=band)
+                rows[row["path"]] = row
+        return pd.DataFrame([rows[src] for src in srcs])
+
+
+def get_metadata_cache(cache):
+    """Get a ``MetadataCache`` from ``None``, a path or a ``MetadataCache``."""
+    if cache is None or isinstance(cache, MetadataCache):
+        return cache
+    return MetadataCache(cache)
+
+
+def _cache_key(src):
+    try:
+        path = Path(src).resolve()
+        stat = path.stat()
+    except OSError:
+        return None
+    return str(path), stat.st_size, stat.st_mtime_ns
+
+
+def _read_metadata_rows(srcs, band, max_workers):
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_read_metadata_row, srcs, [band] * len(srcs),
+                                    chunksize=max(1, len(srcs) // 64)))
+    # the workers' timers are lost, record the durations here
+    for _, duration in results:
+        METRICS.record_time("metadata_read", duration)
+    return [row for row, _ in results]
+
+
+def _read_metadata_row(src, band):
+    start = time.perf_counter()
+    try:
+        row = {"path": src, "error": None}
+        row.update(read_metadata(src, band=band))
+    except Exception as exc:
+        row = {"path": src, "error": str(exc)}
+    return row, time.perf_counter() - start
+
+
+def _to_typed(value):
+    value = value.strip()
+    for dtype in (int, float):
+        try:
+            return dtype(value)
+        except ValueError:
+            pass
+    return value
@@ -0,0 +1,209 @@
+"""Lightweight timers and counters of the processing steps.
+
+The steps record into the process-wide registry ``METRICS``, e.g. the number of HTTP requests,
+the bytes downloaded or the time spent in GDAL. Work done in the processes of a pool is
+recorded in the worker and merged into the registry of the main process by the batch functions.
+The registry is written with ``write_metrics`` to a JSON lines or a Prometheus text file.
+
+Only depends on the standard library.
+"""
+import collections
+import contextlib
+import datetime
+import json
+import os
+from pathlib import Path
+import threading
+import time
+
+
+PROMETHEUS_PREFIX = "nasa_hls_"
+
+
+class Metrics(object):
+    """Thread-safe registry of counters and timers.
+
+    A counter is a number incremented by ``increment``. A timer aggregates the durations of an
+    operation, i.e. its ``count``, ``total`` and ``max`` seconds.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = collections.Counter()
+        self.timers = {}
+
+    def increment(self, name, value=1):
+        """Increment the counter ``name`` by ``value``."""
+        with self._lock:
+            self.counters[name] += value
+
+    def record_time(self, name, seconds):
+        """Add a duration to the timer ``name``."""
+        with self._lock:
+            timer = self.timers.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            timer["count"] += 1
+            timer["total"] += seconds
+            timer["max"] = max(timer["max"], seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """Context manager recording the duration of its block, also if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_time(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        """Get a copy of the counters and timers as ``{"counters": ..., "timers": ...}``."""
+        with self._lock:
+            return {"counters": dict(self.counters),
+                    "timers": {name: dict(timer) for name, timer in self.timers.items()}}
+
+    def since(self, snapshot):
+        """Get what was recorded after ``snapshot`` (the ``max`` of a timer is the overall max)."""
+        current = self.snapshot()
+        counters = {name: value - snapshot["counters"].get(name, 0)
+                    for name, value in current["counters"].items()}
+        timers = {}
+        for name, timer in current["timers"].items():
+            before = snapshot["timers"].get(name, {"count": 0, "total": 0.0})
+            if timer["count"] > before["count"]:
+                timers[name] = {"count": timer["count"] - before["count"],
+                                "total": timer["total"] - before["total"], "max": timer["max"]}
+        return {"counters": {name: value for name, value in counters.items() if value},
+                "timers": timers}
+
+    def merge(self, snapshot):
+        """Add the counters and timers of a snapshot, e.g. recorded in another process."""
+        with self._lock:
+            self.counters.update(snapshot["counters"])
+            for name, other in snapshot["timers"].items():
+                timer = self.timers.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+                timer["count"] += other["count"]
+                timer["total"] += other["total"]
+                timer["max"] = max(timer["max"], other["max"])
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.timers.clear()
+
+
+METRICS = Metrics()
+
+
+def increment(name, value=1):
+    """Increment a counter of ``METRICS``."""
+    METRICS.increment(name, value)
+
+
+def timer(name):
+    """Time a block with a timer of ``METRICS``, e.g. ``with timer("download"): ...``."""
+    return METRICS.timer(name)
+
+
+def write_metrics(dst, metrics=None, labels=None):
+    """Write the counters and timers.
+
+    Arguments:
+        dst {str or callable} -- A path or a sink, i.e. a callable taking a snapshot (see
+            ``Metrics.snapshot``) and the labels. Paths ending with ``.prom`` are (over)written
+            in the Prometheus text format (e.g. for the textfile collector of the node exporter),
+            other paths get one JSON line appended per call.
+
+    Keyword Arguments:
+        metrics {Metrics} -- The registry. ``None`` writes ``METRICS``. (default: {None})
+        labels {dict} -- Labels of the run, e.g. ``{"command": "hls_download"}``. (default: {None})
+    """
+    snapshot = (metrics or METRICS).snapshot()
+    labels = labels or {}
+    if callable(dst):
+        dst(snapshot, labels)
+    elif str(dst).endswith(".prom"):
+        write_prometheus(snapshot, labels, dst)
+    else:
+        write_json_lines(snapshot, labels, dst)
+
+
+def write_json_lines(snapshot, labels, path):
+    """Append a snapshot as one JSON line with the time, the labels, counters and timers."""
+    record = dict({"time": datetime.datetime.now().isoformat(timespec="seconds")}, **labels)
+    record.update(snapshot)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as dst:
+        dst.write(json.dumps(record) + "\n")
+
+
+def write_prometheus(snapshot, labels, path):
+    """Write a snapshot in the Prometheus text format, counters as ``*_total``, timers as summaries."""
+    label_text = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    label_text = "{" + label_text + "}" if label_text else ""
+    lines = []
+    for name, value in sorted(snapshot["counters"].items()):
+        metric = f"{PROMETHEUS_PREFIX}{name}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric}{label_text} {value}"]
+    for name, timer in sorted(snapshot["timers"].items()):
+        metric = f"{PROMETHEUS_PREFIX}{name}_seconds"
+        lines += [f"# TYPE {metric} summary",
+                  f"{metric}_count{label_text} {timer['count']}",
+                  f"{metric}_sum{label_text} {timer['total']}",
+                  f"# TYPE {metric}_max gauge",
+                  f"{metric}_max{label_text} {timer['max']}"]
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # replace atomically, a collector must not read a partial file
+    tmp = path.parent / (path.name + ".tmp")
+    tmp.write_text("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+@contextlib.contextmanager
+def profile(path):
+    """Profile the block and write the result to ``path``.
+
+    Paths ending with ``.html`` or ``.txt`` are written by pyinstrument (needs to be installed),
+    other paths get the cProfile statistics (see ``pstats``, e.g. for snakeviz).
+    """
+    path = str(path)
+    if path.endswith((".html", ".txt")):
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(path, "w") as dst:
+                dst.write(profiler.output_html() if path.endswith(".html")
+                          else profiler.output_text())
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+
+
+@contextlib.contextmanager
+def instrument(metrics_path=None, profile_path=None, **labels):
+    """Time a whole run (timer ``run``), optionally profile it and write the metrics afterwards.
+
+    Used by the command line interfaces for ``--metrics`` and ``--profile``.
+
+    Keyword Arguments:
+        metrics_path {str} -- See ``write_metrics``. ``None`` writes nothing. (default: {None})
+        profile_path {str} -- See ``profile``. ``None`` does not profile. (default: {None})
+        labels -- Labels of the run, e.g. ``command="hls_query"``.
+    """
+    with contextlib.ExitStack() as stack:
+        if profile_path is not None:
+            stack.enter_context(profile(profile_path))
+        try:
+            with timer("run"):
+                yield
+        finally:
+            if metrics_path is not None:
+                write_metrics(metrics_path, labels=labels)
@@ -0,0 +1,198 @@
+"""Names of the HLS products, bands, QA attributes and datasets.
+
+Only depends on the standard library, i.e. it is cheap to import, e.g. in short-lived workers.
+"""
+import datetime
+import re
+
+
+BASE_URL = "https://hls.gsfc.nasa.gov/data"
+
+# granule ids, e.g. 'HLS.L30.T32UNU.2017007.v1.4', anywhere in a file name, path or URL
+# the fields before the version have a fixed width
+GRANULE_ID_PATTERN = r"(HLS\.[A-Z]\d{2}\.T\d{2}[A-Z]{3}\.\d{7}\.v\d+\.\d+)"
+# field -> its characters in a granule id, the tile without the leading 'T'
+GRANULE_ID_FIELDS = {"product": slice(4, 7),
+                     "tile": slice(9, 14),
+                     "date_Yj": slice(15, 22),
+                     "version": slice(23, None)}
+
+BAND_NAMES = {'S30': {'Coastal_Aerosol': 'B01',
+                      'Blue': 'B02',
+                      'Green': 'B03',
+                      'Red': 'B04',
+                      'Red_Edge1': 'B05',
+                      'Red_Edge2': 'B06',
+                      'Red_Edge3': 'B07',
+                      'NIR_Broad': 'B08',
+                      'NIR_Narrow': 'B8A',
+                      'Water_Vapor' : 'B09',
+                      'Cirrus': 'B10',
+                      'SWIR1': 'B11',
+                      'SWIR2': 'B12',
+                      'QA': 'QA'},
+              'L30': {'Coastal_Aerosol': 'band01',
+                      'Blue': 'band02',
+                      'Green': 'band03',
+                      'Red': 'band04',
+                      'NIR': 'band05',
+                      'SWIR1': 'band06',
+                      'SWIR2': 'band07',
+                      'Cirrus': 'band09',
+                      'TIRS1': 'band10',
+                      'TIRS2': 'band11',
+                      'QA': 'QA'}}
+
+# aliases of long band names, e.g. to use 'NIR' for the L30 and S30 band closest to it
+BAND_ALIASES = {'S30': {'NIR': 'NIR_Narrow'},
+                'L30': {}}
+
+QA_ATTRIBUTES_SHORT = ['a_clima',
+                       'a_low',
+                       'a_avg',
+                       'a_high',
+                       'water',
+                       'snow',
+                       'cloud_shadow',
+                       'adj_cloud',
+                       'cloud',
+                       'cirrus',
+                       'no_water',
+                       'no_snow',
+                       'no_cloud_shadow',
+                       'no_adj_cloud',
+                       'no_cloud',
+                       'no_cirrus']
+
+QA_ATTRIBUTES_SHORT = ['Aerosol Quality Climatology',
+                       'Aerosol Quality Low',
+                       'Aerosol Quality Average',
+                       'Aerosol Quality  High',
+                       'Water',
+                       'Snow/ice',
+                       'Cloud shadow',
+                       'Adjacent cloud',
+                       'Cloud',
+                       'Cirrus',
+                       'No water',
+                       'No snow/ice',
+                       'No cloud shadow',
+                       'No adjacent cloud',
+                       'No cloud',
+                       'No cirrus']
+
+
+# QA attributes as (bit mask, value) pairs, i.e. the attribute is true if ``qa & mask == value``
+# see Table 9 of the HLS User Guide
+QA_BITS = {"a_clima": (0b11000000, 0b00000000),
+           "a_low": (0b11000000, 0b01000000),
+           "a_avg": (0b11000000, 0b10000000),
+           "a_high": (0b11000000, 0b11000000),
+           "water": (0b00100000, 0b00100000),
+           "snow": (0b00010000, 0b00010000),
+           "cloud_shadow": (0b00001000, 0b00001000),
+           "adj_cloud": (0b00000100, 0b00000100),
+           "cloud": (0b00000010, 0b00000010),
+           "cirrus": (0b00000001, 0b00000001),
+           "no_water": (0b00100000, 0b00000000),
+           "no_snow": (0b00010000, 0b00000000),
+           "no_cloud_shadow": (0b00001000, 0b00000000),
+           "no_adj_cloud": (0b00000100, 0b00000000),
+           "no_cloud": (0b00000010, 0b00000000),
+           "no_cirrus": (0b00000001, 0b00000000)}
+
+
+def resolve_band_name(product, band):
+    """Get the long band name of a band of a product given by its long band name or an alias.
+
+    Arguments:
+        product {str} -- ``'L30'`` or ``'S30'``.
+        band {str} -- Long band name (see ``BAND_NAMES``) or alias (see ``BAND_ALIASES``),
+            e.g. ``'NIR'`` resolves to ``'NIR_Narrow'`` for S30.
+
+    Returns:
+        str -- The long band name.
+    """
+    band = BAND_ALIASES[product].get(band, band)
+    if band not in BAND_NAMES[product]:
+        raise ValueError(f"Band {band} not in {product}. Available: {list(BAND_NAMES[product])}.")
+    return band
+
+
+def parse_granule_id(value):
+    """Parse a HLS granule id, e.g. ``'HLS.L30.T32UNU.2017007.v1.4'``, out of an id, file name, path or URL.
+
+    See ``utils.parse_granule_ids`` for parsing many values at once.
+
+    Arguments:
+        value {str} -- Granule id, path or URL.
+
+    Returns:
+        dict -- With the keys ``sceneid``, ``product``, ``tile`` (without the leading ``'T'``),
+            ``date_Yj``, ``date`` (datetime) and ``version``.
+    """
+    match = re.search(GRANULE_ID_PATTERN, str(value))
+    if match is None:
+        raise ValueError(f"No HLS granule id in {value}.")
+    sceneid = match.group(1)
+    granule = {"sceneid": sceneid}
+    granule.update({field: sceneid[chars] for field, chars in GRANULE_ID_FIELDS.items()})
+    granule["date"] = datetime.datetime.strptime(granule["date_Yj"], "%Y%j")
+    return granule
+
+
+def parse_url(date,
+              tile="33UUU",
+              product="S30",
+              version="v1.4",
+              base_url=BASE_URL):
+    """Download a HLS dataset from https://hls.gsfc.nasa.gov/data/.
+
+    :param date: A date in one of the following supported formats: '%Y-%m-%d', '%Y%m%d', %Y%j'.
+    :param tile: Tile name of the HLS = Sentinel2 tiling system
+        (see https://hls.gsfc.nasa.gov/products-description/tiling-system/).
+    :param product: Download Landsat (use 'L30') or Sentinel-2 (use 'S30') data.
+    :param version: Product version, at the time writing there was only 'v1.4' available.
+    :param base_url: Root of the HLS data directory tree.
+    :return: The dataset URL.
+    """
+
+    if len(tile) != 5:
+        raise ValueError(f"Tilename must follow the pattern of e.g. 32TPT. Got {tile}.")
+
+    date_yyyydoy = convert_date_to_Yj(date)
+    year = date_yyyydoy[:4]
+    doy = date_yyyydoy[4::]
+
+    file_name = f"HLS.{product}.T{tile}.{year}{doy}.{version}.hdf"
+    hls_dataset_url = f"{base_url}/{version}/{product}/{year}/{tile[:2]}/{tile[2]}/{tile[3]}/{tile[4]}/{file_name}"
+
+    return hls_dataset_url
+
+def convert_date_to_Yj(date: str) -> str:
+    """Convert a date to the format '%Y%j'.
+
+    :param date: A date in one of the following supported formats: '%Y-%m-%d', '%Y%m%d', %Y%j'.
+    :return: Date as string in the format '%Y%j.
+    """
+
+    date_recognizers = [
+        lambda date: datetime.datetime.strptime(date, "%Y%j"),
+        lambda date: datetime.datetime.strptime(date, "%Y-%m-%d"),
+        lambda date: datetime.datetime.strptime(date, "%Y%m%d")
+    ]
+    # convert the user given date in the required %Y%j format
+    date_yyydoy = None
+    for date_recognizer in date_recognizers:
+        try:
+            dt = date_recognizer(date)
+            date_yyydoy = datetime.datetime.strftime(dt, "%Y%j")
+            # exit the loop on success
+            break
+        except ValueError:
+            # repeat the loop on failure
+            continue
+    if date_yyydoy is None:
+        raise ValueError(
+            f"Date {date} did not match any supported format '%Y-%m-%d', '%Y%m%d', %Y%j'.")
+    return date_yyydoy
@@ -0,0 +1,306 @@
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import json
+import logging
+import os
+import pandas as pd
+from pathlib import Path
+import queue
+import threading
+
+from .download_hls_dataset import DEFAULT_DOWNLOAD_WORKERS
+from .download_hls_dataset import download
+from .hdf2tiff_conversion import _convert_hdf2tiffs_task
+from .metadata import MetadataCache
+from .metrics import METRICS
+from .names import parse_granule_id
+from .session import DEFAULT_MAX_WORKERS
+from .session import get_session
+from .utils import BASE_URL
+from .utils import get_available_datasets
+
+
+log = logging.getLogger(__name__)
+
+MANIFEST_NAME = "pipeline_manifest.jsonl"
+DEFAULT_QUEUE_SIZE = 16
+
+# a granule with one of these (stage, status) records is not processed again
+_FINAL = {("download", "filtered"), ("filter", "filtered"),
+          ("convert", "converted"), ("convert", "skipped")}
+_DONE = object()
+
+
+class Manifest(object):
+    """Per-granule checkpoint manifest of a pipeline run as a JSON lines file.
+
+    Each line records the outcome of one stage for one granule, e.g.
+    ``{"sceneid": "HLS.L30.T32UNU.2017007.v1.4", "stage": "download", "status": "downloaded", ...}``.
+    Lines are appended and flushed immediately, i.e. an interrupted run loses no records.
+    The last record of a granule is its current state.
+
+    Arguments:
+        path {str} -- Path of the manifest. It is created if it does not exist.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.states = {}
+        if self.path.exists():
+            with open(self.path) as src:
+                for line in src:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a partially written last line of an interrupted run
+                        continue
+                    self.states[record["sceneid"]] = record
+
+    def record(self, sceneid, stage, status, **fields):
+        """Append the outcome of a stage of a granule."""
+        record = dict({"sceneid": sceneid, "stage": stage, "status": status,
+                       "time": datetime.datetime.now().isoformat(timespec="seconds")}, **fields)
+        with self._lock:
+            with open(self.path, "a") as dst:
+                dst.write(json.dumps(record, default=str) + "\n")
+            self.states[sceneid] = record
+        return record
+
+    def is_done(self, sceneid):
+        """Check if a granule has been filtered or converted in a previous run."""
+        state = self.states.get(sceneid)
+        return state is not None and (state["stage"], state["status"]) in _FINAL
+
+
+def run_pipeline(dstdir, products, years, tiles, start_date=None, end_date=None,
+                 version="v1.4", bands=None, max_cloud_coverage=100, min_spatial_coverage=None,
+                 driver="GTiff", creation_options=None, stack=False, interleave="band",
+                 overwrite=False, manifest=None, queue_size=DEFAULT_QUEUE_SIZE,
+                 listing_workers=DEFAULT_MAX_WORKERS, download_workers=DEFAULT_DOWNLOAD_WORKERS,
+                 filter_workers=2, convert_workers=1, gdal_cache_max=None, gdal_num_threads=None,
+                 requests_per_second=None, index=None, session=None, base_url=BASE_URL, aoi=None):
+    """Query, download, filter and convert HLS datasets in one streaming pipeline.
+
+    The stages run concurrently and are connected by bounded queues, i.e. a granule is
+    converted as soon as it is downloaded while other granules are still being listed
+    or downloaded:
+
+    * *listing*: The product/year/tile directories are listed (one product and year at a time).
+    * *download*: ``download_workers`` threads download the .hdf and .hdf.hdr files into
+      ``dstdir``, prefiltered with ``max_cloud_coverage`` and ``min_spatial_coverage``
+      (see ``download_hls_dataset.download``).
+    * *filter*: ``filter_workers`` threads check the cloud cover and spatial coverage in the
+      metadata of the hdf files, cached in ``dstdir`` (see ``metadata.MetadataCache``).
+    * *convert*: ``convert_workers`` processes convert the hdf files into ``dstdir``
+      (see ``hdf2tiff_conversion.convert_hdf2tiffs``).
+
+    The outcome of each stage is recorded per granule in a manifest (see ``Manifest``).
+    Granules filtered or converted in a previous run with the same manifest are not processed
+    again, i.e. an interrupted run is resumed by running it again. Failed granules are retried.
+
+    Arguments:
+        dstdir {str} -- Destination directory of the downloaded and converted data.
+        products {list} -- Products, e.g. ``["L30", "S30"]``.
+        years {list} -- Years, e.g. ``[2018, 2019]``.
+        tiles {list} -- Tiles, e.g. ``["32UNU", "32UPU"]``. ``None`` means all tiles
+            intersecting ``aoi``.
+
+    Keyword Arguments:
+        aoi {str or tuple or dict} -- Area of interest, see ``utils.get_available_datasets``.
+            (default: {None})
+        start_date {str} -- Skip granules before this date, e.g. ``'2019-03-01'``. (default: {None})
+        end_date {str} -- Skip granules after this date (inclusive). (default: {None})
+        max_cloud_coverage {float} -- Maximum cloud cover. (default: {100})
+        min_spatial_coverage {float} -- Minimum spatial coverage. (default: {None})
+        manifest {str} -- Path of the manifest. ``None`` uses ``pipeline_manifest.jsonl``
+            in ``dstdir``. (default: {None})
+        queue_size {int} -- Maximum number of granules waiting between two stages. (default: {16})
+        listing_workers {int} -- Number of concurrent directory requests. (default: {8})
+        download_workers {int} -- Number of concurrent downloads. (default: {4})
+        filter_workers {int} -- Number of threads reading metadata. (default: {2})
+        convert_workers {int} -- Number of conversion processes. With ``1`` the files are
+            converted in a thread of the current process. (default: {1})
+        requests_per_second {float} -- See ``utils.get_available_datasets``. (default: {None})
+        index {str or ListingIndex} -- See ``utils.get_available_datasets``. (default: {None})
+        session {requests.Session} -- Session to be used for listing and downloading.
+            If ``None`` a new one is created. (default: {None})
+
+        See ``hdf2tiff_conversion.convert_hdf2tiffs_batch`` for the other conversion arguments.
+
+    Returns:
+        dataframe -- One row per granule of this run with the columns ``sceneid``, ``path``,
+            ``stage`` (the last stage reached), ``status`` and ``error``.
+    """
+    dstdir = Path(dstdir)
+    dstdir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(manifest if manifest is not None else dstdir / MANIFEST_NAME)
+    metadata_cache = MetadataCache(dstdir)
+    if session is None:
+        session = get_session(max_connections=max(listing_workers, download_workers),
+                              requests_per_second=requests_per_second)
+    if gdal_num_threads is None:
+        gdal_num_threads = max(1, (os.cpu_count() or 1) // convert_workers)
+    gdal_config = {"GDAL_NUM_THREADS": gdal_num_threads}
+    if gdal_cache_max is not None:
+        gdal_config["GDAL_CACHEMAX"] = gdal_cache_max
+    convert_kwargs = dict(dstdir=dstdir, bands=bands, max_cloud_coverage=100,
+                          gdal_translate_options=None, driver=driver,
+                          creation_options=creation_options, stack=stack, interleave=interleave)
+
+    q_download = queue.Queue(maxsize=queue_size)
+    q_filter = queue.Queue(maxsize=queue_size)
+    q_convert = queue.Queue(maxsize=queue_size)
+    sceneids = []
+    errors = []
+
+    def _listing():
+        try:
+            for product in products:
+                for year in years:
+                    urls = get_available_datasets([product], [year], tiles,
+                                                  max_workers=listing_workers,
+                                                  session=session, index=index, base_url=base_url,
+                                                  aoi=aoi)
+                    for url in urls:
+                        granule = _granule_from_url(url)
+                        if start_date is not None and granule["date"] < pd.Timestamp(start_date):
+                            continue
+                        if end_date is not None and granule["date"] > pd.Timestamp(end_date):
+                            continue
+                        sceneids.append(granule["sceneid"])
+                        if manifest.is_done(granule["sceneid"]):
+                            log.debug(f"PIPELINE SKIPPED (DONE IN PREVIOUS RUN): {granule['sceneid']}")
+                            continue
+                        q_download.put(granule)
+        except Exception as exc:
+            log.exception("ERROR DURING LISTING.")
+            errors.append(exc)
+
+    def _failed(granule, stage, exc):
+        # an unexpected error, the stage goes on draining its queue and the run raises it at the end
+        log.exception(f"ERROR DURING {stage.upper()} OF {granule['sceneid']}.")
+        errors.append(exc)
+        try:
+            manifest.record(granule["sceneid"], stage, "failed", path=granule.get("path"),
+                            error=str(exc))
+        except Exception:
+            log.exception(f"ERROR RECORDING THE FAILURE OF {granule['sceneid']}.")
+
+    def _download():
+        for granule in iter(q_download.get, _DONE):
+            try:
+                result = download(dstdir, granule["date"].strftime("%Y-%m-%d"), granule["tile"],
+                                  granule["product"], version=version, overwrite=overwrite,
+                                  max_cloud_coverage=max_cloud_coverage if max_cloud_coverage < 100 else None,
+                                  min_spatial_coverage=min_spatial_coverage,
+                                  session=session, base_url=base_url)
+                manifest.record(granule["sceneid"], "download", result["status"],
+                                path=result["path"], error=result["error"],
+                                duration=result["duration"], bytes=result["bytes"])
+            except Exception as exc:
+                _failed(granule, "download", exc)
+                continue
+            if result["status"] in ("downloaded", "skipped"):
+                q_filter.put(dict(granule, path=result["path"]))
+
+    def _filter():
+        for granule in iter(q_filter.get, _DONE):
+            try:
+                metadata = metadata_cache.read_metadata(granule["path"])
+                status = "passed" if _passes_filter(metadata, max_cloud_coverage,
+                                                    min_spatial_coverage) else "filtered"
+                error = None
+            except Exception as exc:
+                log.exception(f"ERROR DURING FILTERING OF {granule['path']}.")
+                status, error = "failed", str(exc)
+            try:
+                manifest.record(granule["sceneid"], "filter", status, path=granule["path"],
+                                error=error)
+            except Exception as exc:
+                _failed(granule, "filter", exc)
+                continue
+            if status == "passed":
+                q_convert.put(granule)
+
+    def _record_conversion(granule, result, in_worker=False):
+        metrics = result.pop("metrics")
+        if in_worker:
+            METRICS.merge(metrics)
+        manifest.record(granule["sceneid"], "convert", result["status"], path=granule["path"],
+                        error=result["error"], duration=result["duration"],
+                        dstdir=result["dstdir"])
+
+    def _convert():
+        if convert_workers == 1:
+            for granule in iter(q_convert.get, _DONE):
+                try:
+                    _record_conversion(granule, _convert_hdf2tiffs_task(granule["path"],
+                                                                        convert_kwargs, gdal_config))
+                except Exception as exc:
+                    _failed(granule, "convert", exc)
+            return
+        # bound the number of submitted conversions to keep the queue in front effective
+        slots = threading.BoundedSemaphore(convert_workers * 2)
+
+        def _converted(future, granule):
+            try:
+                # raises e.g. BrokenProcessPool if a worker was killed
+                _record_conversion(granule, future.result(), True)
+            except Exception as exc:
+                _failed(granule, "convert", exc)
+            finally:
+                slots.release()
+
+        with ProcessPoolExecutor(max_workers=convert_workers) as executor:
+            for granule in iter(q_convert.get, _DONE):
+                slots.acquire()
+                try:
+                    future = executor.submit(_convert_hdf2tiffs_task, granule["path"],
+                                             convert_kwargs, gdal_config)
+                except Exception as exc:
+                    slots.release()
+                    _failed(granule, "convert", exc)
+                    continue
+                future.add_done_callback(lambda future, granule=granule: _converted(future, granule))
+
+    stages = [(_listing, 1, q_download),
+              (_download, download_workers, q_filter),
+              (_filter, filter_workers, q_convert),
+              (_convert, 1, None)]
+    threads = [[threading.Thread(target=target, daemon=True) for _ in range(n_workers)]
+               for target, n_workers, _ in stages]
+    for stage_threads in threads:
+        for thread in stage_threads:
+            thread.start()
+    # shut the stages down one after the other, each once the stage in front has finished
+    for (_, _, q_next), stage_threads, next_threads in zip(stages, threads, threads[1:] + [[]]):
+        for thread in stage_threads:
+            thread.join()
+        for _ in next_threads:
+            q_next.put(_DONE)
+    metadata_cache.close()
+    if errors:
+        raise errors[0]
+
+    results = [manifest.states.get(sceneid, {"sceneid": sceneid}) for sceneid in sceneids]
+    return pd.DataFrame(results, columns=["sceneid", "path", "stage", "status", "error"])
+
+
+def _granule_from_url(url):
+    """Get sceneid, product, tile and date from the URL of a hdf file."""
+    granule = parse_granule_id(url)
+    return {"sceneid": granule["sceneid"], "url": url, "product": granule["product"],
+            "tile": granule["tile"], "date": pd.Timestamp(granule["date"])}
+
+
+def _passes_filter(metadata, max_cloud_coverage, min_spatial_coverage):
+    cloud_cover = metadata.get("cloud_coverage")
+    if max_cloud_coverage is not None and cloud_cover is not None \
+            and float(cloud_cover) > max_cloud_coverage:
+        return False
+    spatial_coverage = metadata.get("spatial_coverage")
+    if min_spatial_coverage is not None and spatial_coverage is not None \
+            and float(spatial_coverage) < min_spatial_coverage:
+        return False
+    return True
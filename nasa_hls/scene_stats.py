@@ -0,0 +1,317 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import json
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.features import geometry_mask
+from rasterio.warp import transform_geom
+import sqlite3
+import threading
+import time
+from tqdm import tqdm
+
+from .composite import DEFAULT_QA_VALID
+from .cube import band_source
+from .metrics import METRICS
+from .names import QA_BITS
+from .names import parse_granule_id
+from .tiles import read_aoi
+from .utils import parse_granule_ids
+from .utils import qa_expression_to_values
+
+
+log = logging.getLogger(__name__)
+
+SCENE_INDEX_NAME = "nasa_hls_scenes.sqlite"
+DEFAULT_DECIMATION = 8
+# fraction name -> QA attribute, see utils.QA_BITS
+QA_FRACTIONS = {"cloud": "cloud",
+                "adj_cloud": "adj_cloud",
+                "shadow": "cloud_shadow",
+                "snow": "snow",
+                "water": "water",
+                "cirrus": "cirrus"}
+STATISTICS = ["clear"] + list(QA_FRACTIONS) + ["nodata", "pixels"]
+SCENE_COLUMNS = ["sceneid", "product", "tile", "date", "path", "decimation"]
+
+
+def qa_statistics(src, aoi=None, decimation=DEFAULT_DECIMATION):
+    """Get the clear, cloud, shadow, snow, water and no-data fractions of a scene from its QA layer.
+
+    The QA layer is read at a reduced resolution, every ``decimation``-th pixel in both
+    directions (nearest neighbour, from overviews if the file has some), and decoded with
+    a histogram of the 256 QA values.
+
+    ``nodata`` is the fraction of not sensed pixels (QA value 255) and ``pixels`` the number of
+    pixels read. All other fractions are relative to the sensed pixels (``NaN`` if there are none):
+    ``clear`` are pixels without cloud, adjacent cloud or cloud shadow, the others are the
+    fractions of pixels with the respective QA attribute.
+
+    Arguments:
+        src {str} -- Path of a hdf file, a scene directory written by ``convert_hdf2tiffs``
+            or a QA GeoTiff with the scene id in its name.
+
+    Keyword Arguments:
+        aoi {str or tuple or dict} -- Area of interest in longitude/latitude (see
+            ``tiles.read_aoi``). The statistics within it are added with the prefix ``aoi_``.
+            (default: {None})
+        decimation {int} -- Read every n-th pixel. ``1`` reads the full resolution. (default: {8})
+
+    Returns:
+        dict -- The scene (``sceneid``, ``product``, ``tile``, ``date``) and its statistics.
+    """
+    src = str(src)
+    granule = parse_granule_id(src)
+    scene = {"path": src, "sceneid": granule["sceneid"], "product": granule["product"]}
+    if Path(src).suffix in (".hdf", "") or Path(src).is_dir():
+        name, index = band_source(scene, "QA")
+    else:
+        name, index = src, 1
+    with rasterio.open(name) as ds:
+        out_shape = (max(1, ds.height // decimation), max(1, ds.width // decimation))
+        qa = ds.read(index, out_shape=out_shape, resampling=Resampling.nearest)
+        aoi_mask = None
+        if aoi is not None:
+            transform = ds.transform * ds.transform.scale(ds.width / out_shape[1],
+                                                          ds.height / out_shape[0])
+            geometries = [transform_geom("EPSG:4326", ds.crs, {"type": "Polygon",
+                                                               "coordinates": polygon})
+                          for polygon in read_aoi(aoi)]
+            aoi_mask = geometry_mask(geometries, out_shape, transform, invert=True)
+
+    result = {"sceneid": granule["sceneid"], "product": granule["product"],
+              "tile": granule["tile"], "date": pd.Timestamp(granule["date"]), "path": src,
+              "decimation": decimation}
+    result.update(_fractions(np.bincount(qa.ravel(), minlength=256)))
+    if aoi_mask is not None:
+        histogram = np.bincount(qa[aoi_mask].ravel(), minlength=256)
+        result.update({f"aoi_{key}": value for key, value in _fractions(histogram).items()})
+    return result
+
+
+def _fractions(histogram):
+    values = np.arange(256)
+    sensed = values != 255
+    n_pixels = int(histogram.sum())
+    n_sensed = int(histogram[sensed].sum())
+    fractions = {"nodata": histogram[255] / n_pixels if n_pixels else np.nan,
+                 "pixels": n_pixels}
+    clear = np.isin(values, qa_expression_to_values(DEFAULT_QA_VALID)) & sensed
+    fractions["clear"] = histogram[clear].sum() / n_sensed if n_sensed else np.nan
+    for name, attribute in QA_FRACTIONS.items():
+        mask, value = QA_BITS[attribute]
+        selected = ((values & mask) == value) & sensed
+        fractions[name] = histogram[selected].sum() / n_sensed if n_sensed else np.nan
+    return {key: fractions[key] for key in STATISTICS}
+
+
+def qa_statistics_batch(srcs, aoi=None, decimation=DEFAULT_DECIMATION, max_workers=None,
+                        index=None, aoi_name="aoi", overwrite=False):
+    """Get the QA statistics (see ``qa_statistics``) of many scenes on a process pool.
+
+    With an ``index`` the statistics are stored in the scene index and scenes already
+    in the index with the same ``decimation`` (and the same AOI geometry, see ``aoi_hash``)
+    are not read again (unless ``overwrite=True``).
+
+    Keyword Arguments:
+        max_workers {int} -- Number of processes. ``None`` uses the number of CPUs. (default: {None})
+        index {str or SceneIndex} -- Scene index or path of its SQLite database. (default: {None})
+        aoi_name {str} -- Name of the AOI in the scene index. The statistics of another AOI
+            stored under the same name are replaced. (default: {"aoi"})
+        overwrite {bool} -- Read scenes already in the index again. (default: {False})
+
+    Returns:
+        dataframe -- One row per scene with the statistics, the AOI statistics and ``error``.
+    """
+    srcs = [str(src) for src in srcs]
+    index = get_scene_index(index)
+    columns = SCENE_COLUMNS + STATISTICS + \
+        ([f"aoi_{key}" for key in STATISTICS] if aoi is not None else []) + ["error"]
+    results = {}
+    if index is not None and not overwrite and srcs:
+        sceneids = parse_granule_ids(srcs)["sceneid"]
+        indexed = index.get(list(sceneids), region="")
+        indexed = indexed[indexed["decimation"] == decimation]
+        if aoi is not None:
+            indexed_aoi = index.get(list(sceneids), region=aoi_name)
+            indexed_aoi = indexed_aoi[(indexed_aoi["decimation"] == decimation) &
+                                      (indexed_aoi["aoi_hash"] == aoi_hash(aoi))]
+            indexed_aoi = indexed_aoi.set_index("sceneid")
+            indexed = indexed[indexed["sceneid"].isin(indexed_aoi.index)]
+        for src, sceneid in zip(srcs, sceneids):
+            row = indexed[indexed["sceneid"] == sceneid]
+            if row.empty:
+                continue
+            result = dict(row.iloc[0].drop(["region", "aoi_hash"]), path=src, error=None)
+            if aoi is not None:
+                result.update({f"aoi_{key}": indexed_aoi.loc[sceneid, key] for key in STATISTICS})
+            results[src] = result
+        METRICS.increment("qa_statistics_index_hits", len(results))
+
+    to_read = [src for src in srcs if src not in results]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor, \
+            tqdm(total=len(srcs), initial=len(results)) as progress:
+        futures = {executor.submit(_qa_statistics_task, src, aoi, decimation): src
+                   for src in to_read}
+        for future in as_completed(futures):
+            result, duration = future.result()
+            METRICS.record_time("qa_statistics", duration)
+            METRICS.increment("qa_statistics_failed" if result["error"] else "qa_statistics_read")
+            results[futures[future]] = result
+            progress.update(1)
+
+    stats = pd.DataFrame([results[src] for src in srcs], columns=columns)
+    read = stats[stats["path"].isin(to_read) & stats["error"].isna()]
+    if index is not None and len(read):
+        index.put(read)
+        if aoi is not None:
+            index.put(read.drop(columns=STATISTICS).rename(
+                columns={f"aoi_{key}": key for key in STATISTICS}), region=aoi_name,
+                aoi_hash=aoi_hash(aoi))
+    return stats
+
+
+def aoi_hash(aoi):
+    """Get a hash of the geometry of an AOI (see ``tiles.read_aoi``), e.g. to tell AOIs apart in the scene index."""
+    return hashlib.sha1(json.dumps(read_aoi(aoi)).encode()).hexdigest()[:16]
+
+
+def _qa_statistics_task(src, aoi, decimation):
+    start = time.perf_counter()
+    try:
+        result = qa_statistics(src, aoi=aoi, decimation=decimation)
+        result["error"] = None
+    except Exception as exc:
+        log.exception(f"ERROR DURING QA STATISTICS OF {src}.")
+        result = {"path": src, "error": str(exc)}
+    return result, time.perf_counter() - start
+
+
+class SceneIndex(object):
+    """Persistent SQLite index of the QA statistics of scenes (see ``qa_statistics``).
+
+    There is one row per scene and region, the region ``''`` being the whole scene and any
+    other the name of an AOI. The rows of an AOI also hold the hash of its geometry
+    (``aoi_hash``). The rows are indexed by tile, region and date, i.e. selecting
+    the scenes of a tile in a period, e.g. the clearest scenes per month, does not read the
+    rows of other tiles.
+
+    Arguments:
+        path {str} -- Path of the SQLite database or of a directory. In case of a directory
+            the database ``nasa_hls_scenes.sqlite`` in that directory is used.
+            It is created if it does not exist.
+    """
+    def __init__(self, path):
+        path = Path(path)
+        if path.is_dir():
+            path = path / SCENE_INDEX_NAME
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS scenes ("
+                "sceneid TEXT, "
+                "region TEXT, "
+                "aoi_hash TEXT, "
+                "product TEXT, "
+                "tile TEXT, "
+                "date TEXT, "
+                "path TEXT, "
+                "decimation INTEGER, "
+                + "".join(f"{key} REAL, " for key in STATISTICS) +
+                "PRIMARY KEY (sceneid, region))")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS scenes_tile_date ON scenes (tile, region, date)")
+
+    def close(self):
+        self._connection.close()
+
+    def put(self, stats, region="", aoi_hash=""):
+        """Store the statistics of scenes, a dataframe as returned by ``qa_statistics_batch``."""
+        columns = SCENE_COLUMNS + STATISTICS
+        rows = []
+        for row in stats[columns].itertuples(index=False):
+            row = row._asdict()
+            row["date"] = pd.Timestamp(row["date"]).strftime("%Y-%m-%d")
+            rows.append([row["sceneid"], region, aoi_hash] +
+                        [_to_sql(row[key]) for key in columns[1:]])
+        with self._lock, self._connection:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO scenes (sceneid, region, aoi_hash, {', '.join(columns[1:])}) "
+                f"VALUES ({', '.join('?' * (len(columns) + 2))})", rows)
+
+    def get(self, sceneids, region=""):
+        """Get the statistics of scenes (only those in the index) as dataframe."""
+        frames = []
+        sceneids = list(sceneids)
+        # stay below the maximum number of SQL variables
+        for i in range(0, len(sceneids), 500):
+            chunk = sceneids[i:i + 500]
+            frames.append(self._query(
+                f"SELECT * FROM scenes WHERE region = ? AND sceneid IN ({', '.join('?' * len(chunk))})",
+                [region] + chunk))
+        return pd.concat(frames, ignore_index=True) if frames else self._query(
+            "SELECT * FROM scenes WHERE 0", [])
+
+    def clearest(self, tile, n=1, region="", start_date=None, end_date=None, freq="month"):
+        """Get the ``n`` clearest scenes of a tile per month (or year).
+
+        The scenes are ranked by the fraction of clear pixels of the whole scene or region,
+        i.e. ``clear * (1 - nodata)``.
+
+        Arguments:
+            tile {str} -- Tile, e.g. ``'32UNU'`` or ``'T32UNU'``.
+
+        Keyword Arguments:
+            n {int} -- Number of scenes per period. (default: {1})
+            region {str} -- ``''`` (whole scene) or the name of an AOI. (default: {""})
+            start_date {str} -- First date (inclusive). (default: {None})
+            end_date {str} -- Last date (inclusive). (default: {None})
+            freq {str} -- ``'month'`` or ``'year'``. (default: {"month"})
+
+        Returns:
+            dataframe -- The scenes sorted by date with the columns of the index and ``rank``.
+        """
+        if freq not in ("month", "year"):
+            raise ValueError(f"'freq' must be 'month' or 'year'. Got {freq}.")
+        period = "substr(date, 1, 7)" if freq == "month" else "substr(date, 1, 4)"
+        start = pd.Timestamp(start_date or "1900-01-01").strftime("%Y-%m-%d")
+        end = pd.Timestamp(end_date or "2100-12-31").strftime("%Y-%m-%d")
+        return self._query(
+            "SELECT * FROM ("
+            "SELECT *, ROW_NUMBER() OVER ("
+            f"PARTITION BY {period} ORDER BY clear * (1 - nodata) DESC, date) AS rank "
+            "FROM scenes WHERE tile = ? AND region = ? AND date BETWEEN ? AND ? "
+            "AND clear IS NOT NULL) "
+            "WHERE rank <= ? ORDER BY date, rank",
+            [tile[1:] if tile.startswith("T") else tile, region, start, end, n])
+
+    def _query(self, sql, parameters):
+        with self._lock:
+            cursor = self._connection.execute(sql, parameters)
+            rows = cursor.fetchall()
+            columns = [description[0] for description in cursor.description]
+        frame = pd.DataFrame(rows, columns=columns)
+        frame["date"] = pd.to_datetime(frame["date"])
+        return frame
+
+
+def get_scene_index(index):
+    """Get a ``SceneIndex`` from a path, or ``index`` itself if it is a ``SceneIndex`` or ``None``."""
+    if index is None or isinstance(index, SceneIndex):
+        return index
+    return SceneIndex(index)
+
+
+def _to_sql(value):
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
@@ -1,24 +1,51 @@
 import click
 import datetime
-import numpy as np
-import pandas as pd
 from pathlib import Path
 
 import nasa_hls
+from nasa_hls.scripts.options import instrumented
 
 @click.command()
+@instrumented("hls_convert_batch")
 @click.option('-s', '--src', help="Directory (with .hdf files), path to one .hdf file or a csv with a 'path' column with paths to .hdf files.")
 @click.option('-d', '--dir_dst', help="Destination directory for the converted data.")
 @click.option('-b', '--bands', type=str, default=None, help="List of bands. Default is None, i.e. all bands.")
 @click.option('-c', '--max_cloud_coverage', type=int, default=80, help="Maximum cloud cover.")
-@click.option('-g', '--gdal_translate_options', type=str, default=None, help="GDAL translate options. Example 1 (build Cloud Optimized GeoTiff): '-of COG'. Example 2 (using quotes): '-of GTiff -co \"TILED=YES\"'.")
+@click.option('-g', '--gdal_translate_options', type=str, default=None, help="GDAL translate options. If given, the bands are converted with gdal_translate instead of in-process. Example 1 (build Cloud Optimized GeoTiff): '-of COG'. Example 2 (using quotes): '-of GTiff -co \"TILED=YES\"'.")
+@click.option('-f', '--driver', type=str, default="GTiff", show_default=True, help="GDAL driver of the output files, e.g. 'COG' for Cloud Optimized GeoTiffs.")
+@click.option('--co', 'creation_options', type=str, multiple=True, help="GDAL creation option of the output files. Can be given multiple times, e.g. --co COMPRESS=DEFLATE --co BLOCKSIZE=512.")
 @click.option('-o', '--overwrite', type=bool, default=False, required=False, show_default=True)
+@click.option('-m', '--metadata_cache', type=str, default=None, help="Path of a SQLite metadata cache (or a directory to keep it in) for the cloud cover check. Default is no cache.")
+@click.option('-w', '--workers', type=int, default=1, show_default=True, help="Number of processes converting files in parallel.")
+@click.option('--gdal_cache_max', type=int, default=None, help="GDAL block cache size in MB per process. Default is the GDAL default.")
+@click.option('--gdal_num_threads', type=str, default=None, help="Number of threads GDAL may use per process, e.g. for compression. Default is the number of CPUs divided by the number of workers.")
+@click.option('--stack', is_flag=True, default=False, help="Write one multi-band file per scene instead of one file per band.")
+@click.option('--interleave', type=click.Choice(["band", "pixel"]), default="band", show_default=True, help="Interleaving of the multi-band file (with --stack).")
+@click.option('--store', is_flag=True, default=False, help="Do not write GeoTiffs but append the bands to one chunked time series store per tile in the destination directory.")
+@click.option('--vrt', is_flag=True, default=False, help="Do not convert but write a VRT per scene referring to the bands in the .hdf files and per tile one time series VRT per band.")
+@click.option('--bbox', type=str, default=None, help="Only convert the window 'left,bottom,right,top' in the coordinates of the tile (extended to the block boundaries).")
+@click.option('--window', type=str, default=None, help="Only convert the pixel window 'col_off,row_off,width,height' (extended to the block boundaries).")
+@click.option('-a', '--aoi', type=str, default=None, help="Only convert the window intersecting an area of interest given as path of a GeoJSON file or as bounding box 'west,south,east,north' in longitude/latitude. Scenes not intersecting are skipped.")
 def convert_batch(src, 
                   dir_dst, 
                   bands=None, 
                   max_cloud_coverage=80, 
                   gdal_translate_options=None, 
-                  overwrite=False):
+                  overwrite=False,
+                  metadata_cache=None,
+                  driver="GTiff",
+                  creation_options=(),
+                  workers=1,
+                  gdal_cache_max=None,
+                  gdal_num_threads=None,
+                  stack=False,
+                  interleave="band",
+                  store=False,
+                  vrt=False,
+                  bbox=None,
+                  window=None,
+                  aoi=None):
+    import pandas as pd
 
     #src = "./query-results_downloads"
     # src = "./query-results_downloads/HLS.L30.T32UMU.2018001.v1.4.hdf"
@@ -39,8 +66,50 @@ def convert_batch(src,
     if bands is not None:
         bands = [b.strip() for b in bands.split(",")]
 
-    nasa_hls.convert_hdf2tiffs_batch(path_list, 
-                                    Path(dir_dst), 
-                                    bands=bands, 
-                                    max_cloud_coverage=max_cloud_coverage,
-                                    gdal_translate_options=gdal_translate_options)
+    if bbox is not None:
+        bbox = [float(coord) for coord in bbox.split(",")]
+    if window is not None:
+        window = [int(value) for value in window.split(",")]
+    if aoi is not None and not Path(aoi).exists():
+        aoi = [float(coord) for coord in aoi.split(",")]
+
+    if vrt:
+        df_vrts = nasa_hls.write_vrt_catalog(path_list,
+                                             Path(dir_dst),
+                                             bands=bands,
+                                             max_cloud_coverage=max_cloud_coverage,
+                                             metadata_cache=metadata_cache)
+        df_vrts.to_csv(
+            Path(dir_dst) / 'datasets_vrts_{date:%Y-%m-%dT%H:%M:%S}.csv'.format(date=datetime.datetime.now()),
+            index=False
+            )
+        n_failed = (df_vrts["status"] == "failed").sum()
+        if n_failed:
+            raise click.ClickException(f"VRT creation of {n_failed} of {df_vrts.shape[0]} files failed.")
+        return
+
+    df_converted = nasa_hls.convert_hdf2tiffs_batch(path_list, 
+                                                   Path(dir_dst), 
+                                                   bands=bands, 
+                                                   max_cloud_coverage=max_cloud_coverage,
+                                                   gdal_translate_options=gdal_translate_options,
+                                                   metadata_cache=metadata_cache,
+                                                   driver=driver,
+                                                   creation_options=dict(co.split("=", 1) for co in creation_options),
+                                                   stack=stack,
+                                                   interleave=interleave,
+                                                   max_workers=workers,
+                                                   gdal_cache_max=gdal_cache_max,
+                                                   gdal_num_threads=gdal_num_threads,
+                                                   store=store,
+                                                   window=window,
+                                                   bounds=bbox,
+                                                   aoi=aoi)
+    Path(dir_dst).mkdir(parents=True, exist_ok=True)
+    df_converted.to_csv(
+        Path(dir_dst) / 'datasets_converted_{date:%Y-%m-%dT%H:%M:%S}.csv'.format(date=datetime.datetime.now()),
+        index=False
+        )
+    n_failed = (df_converted["status"] == "failed").sum()
+    if n_failed:
+        raise click.ClickException(f"Conversion of {n_failed} of {df_converted.shape[0]} files failed.")
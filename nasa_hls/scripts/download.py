@@ -1,42 +1,50 @@
 import click
 import datetime
-import numpy as np
-import pandas as pd
 from pathlib import Path
 
 import nasa_hls
+from nasa_hls.scripts.options import instrumented
 
 @click.command()
-@click.option('-p', '--path_query', help="Path of a CSV-file as returned by nhls_query.")
+@instrumented("hls_download")
+@click.option('-p', '--path_query', help="Path of a CSV or Parquet file as returned by hls_query. The result table is written in the same format.")
 @click.option('-d', '--dir_dst', help="Destination directory for the downloaded data.")
 @click.option('-o', '--overwrite', type=bool, default=False, required=False, show_default=True)
-def download(path_query, dir_dst, overwrite=False):
-    df_download = pd.read_csv(path_query, parse_dates=["date"])
+@click.option('-w', '--workers', type=int, default=4, show_default=True, help="Number of concurrent downloads.")
+@click.option('-c', '--max_cloud_coverage', type=float, default=None, help="Skip datasets with a higher cloud cover (taken from the .hdf.hdr file) before downloading the .hdf file.")
+@click.option('-s', '--min_spatial_coverage', type=float, default=None, help="Skip datasets with a lower spatial coverage (taken from the .hdf.hdr file) before downloading the .hdf file.")
+def download(path_query, dir_dst, overwrite=False, workers=4,
+             max_cloud_coverage=None, min_spatial_coverage=None):
+    import pandas as pd
+
+    df_download = nasa_hls.read_datasets(path_query)
     df_download = df_download.sort_values(["date", "tile", "product"])
-    df_download["id"] = df_download["url"].str.split("/", expand=True)[11].str[0:-4]
+    df_download["id"] = nasa_hls.parse_granule_ids(df_download["url"])["sceneid"]
     df_download["path"] = dir_dst + "/" + df_download["id"] + ".hdf"
-    df_download["exists_before"] = df_download.path.apply(lambda x: Path(x).exists())
+    df_download["exists_before"] = nasa_hls.files_exist(dir_dst, df_download["id"] + ".hdf")
 
-    nasa_hls.download_batch(dstdir=dir_dst,
-                            datasets=df_download,
-                            version="v1.4",
-                            overwrite=overwrite)
-    df_download["exists_after"] = df_download.path.apply(lambda x: Path(x).exists())
+    df_results = nasa_hls.download_batch(dstdir=dir_dst,
+                                         datasets=df_download,
+                                         version="v1.4",
+                                         overwrite=overwrite,
+                                         max_cloud_coverage=max_cloud_coverage,
+                                         min_spatial_coverage=min_spatial_coverage,
+                                         max_workers=workers)
+    df_download = df_download.join(df_results[["status", "bytes", "duration", "error",
+                                               "cloud_cover", "spatial_coverage"]])
+    df_download["exists_after"] = nasa_hls.files_exist(dir_dst, df_download["id"] + ".hdf")
     
-    df_download["cloud_cover"] = np.NaN
-    df_download["spatial_coverage"] = np.NaN
-
-    for i in df_download.index:
-        try:
-            _ = nasa_hls.get_metadata_from_hdf(df_download.loc[i, "path"],
-                                            fields=["cloud_cover",
-                                                    "spatial_coverage"])
-            df_download.loc[i, "cloud_cover"] = _["cloud_cover"]
-            df_download.loc[i, "spatial_coverage"] = _["spatial_coverage"]
-        except:
-            pass
+    coverages = nasa_hls.get_coverages_from_hdfs(
+        df_download.loc[df_download["exists_after"], "path"],
+        metadata_cache=nasa_hls.MetadataCache(dir_dst))
+    # the coverages of the prefilter are kept where the hdf file has none, e.g. filtered by it
+    for column in ["cloud_cover", "spatial_coverage"]:
+        from_hdfs = pd.Series(coverages[column].values, dtype=float,
+                              index=df_download.index[df_download["exists_after"]])
+        df_download[column] = from_hdfs.combine_first(df_download[column].astype(float))
 
-    df_download.to_csv(
-        Path(dir_dst) / 'datasets_downloaded_{date:%Y-%m-%dT%H:%M:%S}.csv'.format( date=datetime.datetime.now()), 
-        index=False
+    suffix = ".parquet" if str(path_query).endswith(".parquet") else ".csv"
+    nasa_hls.write_datasets(
+        df_download,
+        Path(dir_dst) / 'datasets_downloaded_{date:%Y-%m-%dT%H:%M:%S}{suffix}'.format(date=datetime.datetime.now(), suffix=suffix)
         )
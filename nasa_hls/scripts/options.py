@@ -0,0 +1,17 @@
+import click
+import functools
+
+from nasa_hls.metrics import instrument
+
+
+def instrumented(command):
+    """Add the options ``--metrics`` and ``--profile`` to a command, see ``metrics.instrument``."""
+    def decorator(func):
+        @click.option('--metrics', 'metrics_path', type=str, default=None, help="Write timers and counters of the run (requests, bytes, files, GDAL time) to this path: a '.prom' file in the Prometheus text format, else appended as JSON line.")
+        @click.option('--profile', 'profile_path', type=str, default=None, help="Profile the run and write the result to this path: cProfile statistics, or with pyinstrument installed an '.html' or '.txt' report.")
+        @functools.wraps(func)
+        def wrapper(*args, metrics_path=None, profile_path=None, **kwargs):
+            with instrument(metrics_path, profile_path, command=command):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,80 @@
+import click
+import datetime
+from pathlib import Path
+
+import nasa_hls
+from nasa_hls.scripts.options import instrumented
+
+@click.command()
+@instrumented("hls_pipeline")
+@click.option('-p', '--products', help=" Landsat (L30) and/or Sentinel-2 (S30), e.g. 'L30,S30'")
+@click.option('-t', '--tiles', default=None, help="List of tiles, e.g. '32UNU,32UPU' or path to a file with tiles in rows (32UNU\n32UPU). Optional with --aoi.")
+@click.option('-a', '--aoi', type=str, default=None, help="Area of interest as path of a GeoJSON file with (multi)polygons or as bounding box 'west,south,east,north' in longitude/latitude. Only the tiles intersecting it are processed.")
+@click.option('-s', '--start_date', help="Start date (inclusive), e.g. '2019-01-01'")
+@click.option('-e', '--end_date', help="End date (inclusive), e.g. '2019-12-31'")
+@click.option('-d', '--dir_dst', help="Destination directory for the downloaded and converted data.")
+@click.option('-b', '--bands', type=str, default=None, help="List of bands. Default is None, i.e. all bands.")
+@click.option('-c', '--max_cloud_coverage', type=float, default=80, show_default=True, help="Maximum cloud cover.")
+@click.option('--min_spatial_coverage', type=float, default=None, help="Minimum spatial coverage.")
+@click.option('-f', '--driver', type=str, default="GTiff", show_default=True, help="GDAL driver of the output files, e.g. 'COG' for Cloud Optimized GeoTiffs.")
+@click.option('--co', 'creation_options', type=str, multiple=True, help="GDAL creation option of the output files. Can be given multiple times, e.g. --co COMPRESS=DEFLATE --co BLOCKSIZE=512.")
+@click.option('--stack', is_flag=True, default=False, help="Write one multi-band file per scene instead of one file per band.")
+@click.option('-o', '--overwrite', type=bool, default=False, required=False, show_default=True)
+@click.option('-m', '--manifest', type=str, default=None, help="Path of the checkpoint manifest. Default is 'pipeline_manifest.jsonl' in the destination directory. Granules filtered or converted according to the manifest are not processed again.")
+@click.option('-q', '--queue_size', type=int, default=16, show_default=True, help="Maximum number of granules waiting between two stages.")
+@click.option('--download_workers', type=int, default=4, show_default=True, help="Number of concurrent downloads.")
+@click.option('--filter_workers', type=int, default=2, show_default=True, help="Number of threads reading the metadata of downloaded files.")
+@click.option('--convert_workers', type=int, default=1, show_default=True, help="Number of processes converting files in parallel.")
+@click.option('-r', '--requests_per_second', type=float, default=None, help="Maximum number of requests per second to the server. Default is no limit.")
+@click.option('-i', '--index', type=str, default=None, help="Path of a SQLite listing index. Default is no index.")
+def pipeline(products, tiles, start_date, end_date, dir_dst, bands=None, max_cloud_coverage=80,
+             min_spatial_coverage=None, driver="GTiff", creation_options=(), stack=False,
+             overwrite=False, manifest=None, queue_size=16, download_workers=4,
+             filter_workers=2, convert_workers=1, requests_per_second=None, index=None, aoi=None):
+    products = [pr.strip() for pr in products.split(",")]
+
+    if tiles is None:
+        if aoi is None:
+            raise click.UsageError("Either --tiles or --aoi is required.")
+    elif Path(tiles).exists():
+        with open(tiles) as src:
+            tiles = [tl.strip() for tl in src.read().split("\n") if tl.strip()]
+    else:
+        tiles = [tl.strip() for tl in tiles.split(",")]
+
+    if aoi is not None and not Path(aoi).exists():
+        aoi = [float(coord) for coord in aoi.split(",")]
+
+    if bands is not None:
+        bands = [b.strip() for b in bands.split(",")]
+
+    years = list(range(int(start_date[:4]), int(end_date[:4])+1))
+
+    df_results = nasa_hls.run_pipeline(Path(dir_dst),
+                                       products=products,
+                                       years=years,
+                                       tiles=tiles,
+                                       start_date=start_date,
+                                       end_date=end_date,
+                                       bands=bands,
+                                       max_cloud_coverage=max_cloud_coverage,
+                                       min_spatial_coverage=min_spatial_coverage,
+                                       driver=driver,
+                                       creation_options=dict(co.split("=", 1) for co in creation_options),
+                                       stack=stack,
+                                       overwrite=overwrite,
+                                       manifest=manifest,
+                                       queue_size=queue_size,
+                                       download_workers=download_workers,
+                                       filter_workers=filter_workers,
+                                       convert_workers=convert_workers,
+                                       requests_per_second=requests_per_second,
+                                       index=index,
+                                       aoi=aoi)
+    df_results.to_csv(
+        Path(dir_dst) / 'datasets_pipeline_{date:%Y-%m-%dT%H:%M:%S}.csv'.format(date=datetime.datetime.now()),
+        index=False
+        )
+    n_failed = (df_results["status"] == "failed").sum()
+    if n_failed:
+        raise click.ClickException(f"Processing of {n_failed} of {df_results.shape[0]} granules failed.")
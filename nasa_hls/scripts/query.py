@@ -1,30 +1,46 @@
 import click
-import pandas as pd
 from pathlib import Path
 
 import nasa_hls
+from nasa_hls.scripts.options import instrumented
 
 @click.command()
+@instrumented("hls_query")
 @click.option('-p', '--products', help=" Landsat (L30) and/or Sentinel-2 (S30), e.g. 'L30,S30'")
-@click.option('-t', '--tiles', help="List of tiles, e.g. '32UNU,32UPU' or path to a file with tiles in rows (32UNU\n32UPU).")
+@click.option('-t', '--tiles', default=None, help="List of tiles, e.g. '32UNU,32UPU' or path to a file with tiles in rows (32UNU\n32UPU). Optional with --aoi.")
 @click.option('-s', '--start_date', help="Start date (inclusive), e.g. '2019-01-01'")
 @click.option('-e', '--end_date', help="End date (inclusive), e.g. '2019-12-31'")
-@click.option('-d', '--dst_path', help="Path of a destination CSV-file.", required=False)
+@click.option('-d', '--dst_path', help="Path of a destination CSV-file or, with the suffix '.parquet', Parquet file (needs pyarrow).", required=False)
 @click.option('-o', '--overwrite', type=bool, default=False, required=False, show_default=True)
-def query(products, tiles, start_date, end_date, dst_path=None, overwrite=False):
+@click.option('-w', '--workers', type=int, default=8, show_default=True, help="Number of concurrent directory requests.")
+@click.option('-r', '--requests_per_second', type=float, default=None, help="Maximum number of requests per second to the server. Default is no limit.")
+@click.option('-a', '--aoi', type=str, default=None, help="Area of interest as path of a GeoJSON file with (multi)polygons or as bounding box 'west,south,east,north' in longitude/latitude. Only the tiles intersecting it are queried.")
+@click.option('-i', '--index', type=str, default=None, help="Path of a SQLite listing index. Directory listings are served from and stored in the index. Default is no index.")
+def query(products, tiles, start_date, end_date, dst_path=None, overwrite=False,
+          workers=8, requests_per_second=None, index=None, aoi=None):
     products = [pr.strip() for pr in products.split(",")]
     
-    if Path(tiles).exists():
+    if tiles is None:
+        if aoi is None:
+            raise click.UsageError("Either --tiles or --aoi is required.")
+    elif Path(tiles).exists():
         with open(tiles) as src:
             tiles = src.read().split("\n")
     else:
         tiles = [tl.strip() for tl in tiles.split(",")]
+
+    if aoi is not None and not Path(aoi).exists():
+        aoi = [float(coord) for coord in aoi.split(",")]
     
     years = list(range(int(start_date[:4]), int(end_date[:4])+1))
 
     urls_datasets = nasa_hls.get_available_datasets(products=products,
                                                     years=years,
-                                                    tiles=tiles)
+                                                    tiles=tiles,
+                                                    max_workers=workers,
+                                                    requests_per_second=requests_per_second,
+                                                    index=index,
+                                                    aoi=aoi)
     print(urls_datasets)
     df_datasets = nasa_hls.dataframe_from_urls(urls_datasets)
     print(df_datasets.dtypes)
@@ -32,6 +48,6 @@ def query(products, tiles, start_date, end_date, dst_path=None, overwrite=False)
     df_datasets = df_datasets[(df_datasets["date"] >= start_date) & (df_datasets["date"] <= end_date)]
     
     if dst_path is not None:
-        df_datasets.to_csv(dst_path, index=False)
+        nasa_hls.write_datasets(df_datasets, dst_path)
     else:
         click.echo(df_datasets)
@@ -0,0 +1,88 @@
+import click
+from pathlib import Path
+
+import nasa_hls
+from nasa_hls.scripts.options import instrumented
+
+@click.command()
+@instrumented("hls_scene_stats")
+@click.option('-s', '--src', default=None, help="Directory (with .hdf files or scene directories written by hls_convert_batch), path to one .hdf file or a csv/parquet file with a 'path' column. Can be omitted with --clearest to only query the index.")
+@click.option('-i', '--index', required=True, help="Path of the SQLite scene index (or a directory to keep it in). Created if it does not exist.")
+@click.option('-a', '--aoi', type=str, default=None, help="Area of interest given as path of a GeoJSON file or as bounding box 'west,south,east,north' in longitude/latitude. Its statistics are added with the prefix 'aoi_'.")
+@click.option('--aoi_name', type=str, default="aoi", show_default=True, help="Name of the AOI in the scene index.")
+@click.option('-x', '--decimation', type=int, default=8, show_default=True, help="Read every n-th pixel of the QA layer. 1 reads the full resolution.")
+@click.option('-w', '--workers', type=int, default=1, show_default=True, help="Number of processes reading scenes in parallel.")
+@click.option('-o', '--overwrite', is_flag=True, default=False, help="Read scenes already in the index again.")
+@click.option('-n', '--clearest', type=int, default=None, help="Output the n clearest scenes per month (see --freq) instead of the statistics of the scenes read.")
+@click.option('-t', '--tile', type=str, default=None, help="Tile of --clearest, e.g. 32UNU. Default are the tiles of the scenes in 'src'.")
+@click.option('--region', type=str, default="", help="Rank --clearest by the statistics of the AOI of this name. Default is the whole scene.")
+@click.option('--start_date', type=str, default=None, help="First date of --clearest (YYYY-MM-DD).")
+@click.option('--end_date', type=str, default=None, help="Last date of --clearest (YYYY-MM-DD).")
+@click.option('--freq', type=click.Choice(["month", "year"]), default="month", show_default=True, help="Period of --clearest.")
+@click.option('-d', '--dst', type=str, default=None, help="Path of the output table (.csv or .parquet). Default prints it.")
+def scene_stats(src=None,
+                index=None,
+                aoi=None,
+                aoi_name="aoi",
+                decimation=8,
+                workers=1,
+                overwrite=False,
+                clearest=None,
+                tile=None,
+                region="",
+                start_date=None,
+                end_date=None,
+                freq="month",
+                dst=None):
+    import pandas as pd
+
+    if src is None and clearest is None:
+        raise click.ClickException("Expecting 'src' and/or --clearest.")
+    if aoi is not None and not Path(aoi).exists():
+        aoi = [float(coord) for coord in aoi.split(",")]
+
+    scene_index = nasa_hls.SceneIndex(index)
+    stats = None
+    if src is not None:
+        if Path(src).is_dir():
+            path_list = list(Path(src).glob("*.hdf")) or \
+                [path for path in Path(src).iterdir() if path.is_dir() and path.name.startswith("HLS.")]
+        elif Path(src).suffix == ".hdf":
+            path_list = [src]
+        elif Path(src).is_file():
+            path_list = list(nasa_hls.read_datasets(src)["path"])
+        else:
+            raise click.ClickException(f"Invalid 'src'. Expecting directory, path to one .hdf file or a csv/parquet file with a 'path' column. Got {src}")
+        stats = nasa_hls.qa_statistics_batch(path_list,
+                                             aoi=aoi,
+                                             decimation=decimation,
+                                             max_workers=workers,
+                                             index=scene_index,
+                                             aoi_name=aoi_name,
+                                             overwrite=overwrite)
+    result = stats
+    if clearest is not None:
+        if tile is not None:
+            tiles = [tile]
+        elif stats is not None:
+            tiles = sorted(stats["tile"].dropna().unique())
+        else:
+            raise click.ClickException("Expecting --tile or 'src' with --clearest.")
+        frames = [scene_index.clearest(tile,
+                                       n=clearest,
+                                       region=region,
+                                       start_date=start_date,
+                                       end_date=end_date,
+                                       freq=freq) for tile in tiles]
+        # no scenes in 'src', an empty table
+        result = pd.concat(frames, ignore_index=True) if frames else scene_index.get([])
+    scene_index.close()
+
+    if dst is not None:
+        nasa_hls.write_datasets(result, dst)
+    else:
+        click.echo(result.to_string(index=False))
+    if stats is not None:
+        n_failed = stats["error"].notna().sum()
+        if n_failed:
+            raise click.ClickException(f"Reading the QA layer of {n_failed} of {stats.shape[0]} scenes failed.")
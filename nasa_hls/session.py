@@ -0,0 +1,97 @@
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import METRICS
+
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_TIMEOUT = 60
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter(object):
+    """Thread-safe limiter spacing out requests to the same host.
+
+    Arguments:
+        requests_per_second {float} -- Maximum number of requests per second and host.
+            If ``None`` or ``0`` requests are not limited.
+    """
+    def __init__(self, requests_per_second=None):
+        self.requests_per_second = requests_per_second
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url):
+        """Block until the next request to the host of ``url`` is allowed."""
+        if not self.requests_per_second:
+            return
+        host = urllib.parse.urlsplit(url).netloc
+        interval = 1.0 / self.requests_per_second
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class HLSSession(requests.Session):
+    """A ``requests.Session`` with a default timeout and a per-host rate limit.
+
+    Requests are counted (``http_requests``) and timed until the headers are received
+    (``http_request``) in ``metrics.METRICS``.
+    """
+    def __init__(self, rate_limiter=None, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        self.rate_limiter.wait(url)
+        METRICS.increment("http_requests")
+        with METRICS.timer("http_request"):
+            return super().request(method, url, **kwargs)
+
+
+def get_session(max_connections=DEFAULT_MAX_WORKERS,
+                retries=3,
+                backoff_factor=0.5,
+                requests_per_second=None,
+                timeout=DEFAULT_TIMEOUT):
+    """Get a session with a connection pool, retries with backoff and per-host rate limiting.
+
+    The session can be shared between threads, e.g. when crawling directories or
+    downloading datasets concurrently.
+
+    Keyword Arguments:
+        max_connections {int} -- Number of connections kept open per host.
+            Should be at least the number of concurrent requests. (default: {8})
+        retries {int} -- Number of retries on connection errors and on the
+            status codes 429, 500, 502, 503 and 504. (default: {3})
+        backoff_factor {float} -- The n-th retry waits ``backoff_factor * 2 ** (n - 1)``
+            seconds. A ``Retry-After`` header sent by the server is respected. (default: {0.5})
+        requests_per_second {float} -- Maximum number of requests per second and host.
+            ``None`` means no limit. (default: {None})
+        timeout {float} -- Default timeout in seconds of each request. (default: {60})
+
+    Returns:
+        HLSSession -- The session.
+    """
+    retry = Retry(total=retries,
+                  backoff_factor=backoff_factor,
+                  status_forcelist=RETRY_STATUS_CODES,
+                  allowed_methods=["HEAD", "GET"],
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=max_connections,
+                          pool_maxsize=max_connections,
+                          max_retries=retry)
+    session = HLSSession(rate_limiter=RateLimiter(requests_per_second), timeout=timeout)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
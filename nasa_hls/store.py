@@ -0,0 +1,245 @@
+import json
+import numpy as np
+import os
+import pandas as pd
+from pathlib import Path
+import rasterio
+from rasterio.windows import Window
+import threading
+
+from .metadata import hdf_subdataset_name
+from .names import parse_granule_id
+from .utils import BAND_NAMES
+
+
+INDEX_NAME = "index.json"
+DEFAULT_CHUNK_SIZE = 128
+DEFAULT_TIME_BLOCK = 64
+FILL_VALUE = -1000
+
+
+class TimeSeriesStore(object):
+    """Chunked, append-only time series store of the scenes of one tile.
+
+    The tile is split into spatial chunks of ``chunk_size`` x ``chunk_size`` pixels.
+    Each band and chunk is stored in raw files holding the time series pixel by pixel,
+    i.e. time is the fastest varying axis:
+
+    * ``<band>/<row>_<col>.dat``: The complete time blocks, a (block, y, x, time) array with
+      ``time_block`` scenes per block. The time series of a pixel within a block is contiguous,
+      i.e. the full time series of a pixel is one read per time block.
+    * ``<band>/<row>_<col>.tail``: The scenes of the incomplete last time block as (time, y, x)
+      array. A new scene is appended at its end, i.e. an append is a sequential write.
+      Once ``time_block`` scenes are collected they are transposed and appended to the
+      ``.dat`` file.
+
+    The bands, the grid and the scenes along the time axis (``sceneid``, ``product``, ``date``)
+    are kept in ``index.json``.
+
+    The store is created with the first appended scene. The order of the time axis is the
+    order in which the scenes were appended, ``read`` and ``read_pixel`` sort by date.
+
+    Arguments:
+        path {str} -- Directory of the store, e.g. ``<root>/T32UNU``.
+
+    Keyword Arguments:
+        bands {list} -- Long band names stored. Only used when the store is created. ``None``
+            means all bands of L30 and S30. Bands missing in a scene are filled with ``fill_value``.
+            (default: {None})
+        chunk_size {int} -- Width and height of the chunks. Only used when the store is created.
+            (default: {128})
+        time_block {int} -- Number of scenes per time block. Only used when the store is
+            created. (default: {64})
+        dtype {str} -- Data type of all bands. Only used when the store is created.
+            (default: {"int16"})
+        fill_value {int} -- See ``bands``. Only used when the store is created. (default: {-1000})
+    """
+    def __init__(self, path, bands=None, chunk_size=DEFAULT_CHUNK_SIZE, time_block=DEFAULT_TIME_BLOCK,
+                 dtype="int16", fill_value=FILL_VALUE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        if (self.path / INDEX_NAME).exists():
+            with open(self.path / INDEX_NAME) as src:
+                self.index = json.load(src)
+        else:
+            if bands is None:
+                bands = list(dict.fromkeys(list(BAND_NAMES["S30"]) + list(BAND_NAMES["L30"])))
+            self.index = {"bands": list(bands), "chunk_size": chunk_size, "time_block": time_block,
+                          "dtype": dtype, "fill_value": fill_value, "width": None, "height": None,
+                          "crs": None, "transform": None, "scenes": []}
+
+    @property
+    def bands(self):
+        return self.index["bands"]
+
+    @property
+    def scenes(self):
+        """The scenes along the time axis with the columns ``sceneid``, ``product`` and ``date``."""
+        scenes = pd.DataFrame(self.index["scenes"], columns=["sceneid", "product", "date"])
+        scenes["date"] = pd.to_datetime(scenes["date"])
+        return scenes
+
+    def __contains__(self, sceneid):
+        return any(scene["sceneid"] == sceneid for scene in self.index["scenes"])
+
+    def append(self, sceneid, arrays, profile=None):
+        """Append the bands of a scene.
+
+        Arguments:
+            sceneid {str} -- Scene id, e.g. ``'HLS.L30.T32UNU.2017007.v1.4'``.
+            arrays {dict} -- 2D array per long band name.
+
+        Keyword Arguments:
+            profile {dict} -- Profile with ``crs`` and ``transform``. Only used for the first
+                scene. (default: {None})
+        """
+        granule = parse_granule_id(sceneid)
+        height, width = next(iter(arrays.values())).shape
+        with self._lock:
+            if sceneid in self:
+                raise ValueError(f"{sceneid} is already in the store {self.path}.")
+            if self.index["width"] is None:
+                self.index.update(width=width, height=height)
+                if profile is not None:
+                    self.index["crs"] = profile["crs"].to_wkt() if profile.get("crs") else None
+                    self.index["transform"] = list(profile["transform"])[:6]
+            if (height, width) != (self.index["height"], self.index["width"]):
+                raise ValueError(f"Shape {(height, width)} of {sceneid} does not match the "
+                                 f"store {(self.index['height'], self.index['width'])}.")
+            n_times = len(self.index["scenes"])
+            time_block = self.index["time_block"]
+            block, position = divmod(n_times, time_block)
+            dtype = np.dtype(self.index["dtype"])
+            for band in self.bands:
+                array = arrays.get(band)
+                if array is None:
+                    array = np.full((height, width), self.index["fill_value"], dtype=dtype)
+                for (row, col), window in self._chunk_windows():
+                    chunk = np.ascontiguousarray(
+                        array[window.row_off:window.row_off + window.height,
+                              window.col_off:window.col_off + window.width], dtype=dtype)
+                    path = self._chunk_path(band, row, col)
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(path.with_suffix(".tail"), "a+b") as tail:
+                        # drop the leftovers of an interrupted append or of the previous block
+                        tail.truncate(position * chunk.nbytes)
+                        tail.seek(0, os.SEEK_END)
+                        tail.write(chunk.tobytes())
+                        if position == time_block - 1:
+                            tail.seek(0)
+                            times = np.frombuffer(tail.read(), dtype=dtype) \
+                                .reshape((time_block, ) + chunk.shape)
+                            with open(path, "ab") as dst:
+                                dst.truncate(block * times.nbytes)
+                                dst.seek(0, os.SEEK_END)
+                                dst.write(np.ascontiguousarray(times.transpose(1, 2, 0)).tobytes())
+            self.index["scenes"].append({"sceneid": sceneid, "product": granule["product"],
+                                         "date": str(granule["date"].date())})
+            self._write_index()
+
+    def append_hdf(self, hdf_path):
+        """Append the bands of a nasa-hls hdf file."""
+        hdf_path = Path(hdf_path)
+        granule = parse_granule_id(hdf_path)
+        product = granule["product"]
+        arrays, profile = {}, None
+        for band in self.bands:
+            if band not in BAND_NAMES[product]:
+                continue
+            with rasterio.open(hdf_subdataset_name(str(hdf_path.resolve()),
+                                                   BAND_NAMES[product][band])) as src:
+                arrays[band] = src.read(1)
+                profile = src.profile
+        self.append(granule["sceneid"], arrays, profile=profile)
+
+    def read(self, band, window=None, start_date=None, end_date=None):
+        """Read the time series of a band within a window. Raises a ``ValueError`` if the store is empty.
+
+        Keyword Arguments:
+            window {Window or tuple} -- Pixel window, a ``rasterio.windows.Window`` or
+                ``(col_off, row_off, width, height)``. ``None`` reads the whole tile.
+                (default: {None})
+            start_date {str} -- First date (inclusive). (default: {None})
+            end_date {str} -- Last date (inclusive). (default: {None})
+
+        Returns:
+            tuple -- The (time, y, x) array and the scenes along its time axis sorted by date.
+        """
+        if band not in self.bands:
+            raise ValueError(f"Band {band} not in the store. Available: {self.bands}.")
+        if not self.index["scenes"]:
+            # the grid is only known with the first scene
+            raise ValueError(f"The store {self.path} is empty.")
+        if window is None:
+            window = Window(0, 0, self.index["width"], self.index["height"])
+        elif not isinstance(window, Window):
+            window = Window(*window)
+        scenes = self.scenes
+        selected = np.ones(len(scenes), dtype=bool)
+        if start_date is not None:
+            selected &= (scenes["date"] >= pd.Timestamp(start_date)).values
+        if end_date is not None:
+            selected &= (scenes["date"] <= pd.Timestamp(end_date)).values
+        scenes = scenes[selected].sort_values(["date", "product"], kind="stable")
+        times = scenes.index.values
+
+        row_start, col_start = int(window.row_off), int(window.col_off)
+        row_stop, col_stop = row_start + int(window.height), col_start + int(window.width)
+        out = np.empty((len(times), row_stop - row_start, col_stop - col_start),
+                       dtype=self.index["dtype"])
+        time_block = self.index["time_block"]
+        n_blocks, n_tail = divmod(len(self.index["scenes"]), time_block)
+        in_blocks = times < n_blocks * time_block
+        for (row, col), chunk_window in self._chunk_windows():
+            r0, c0 = chunk_window.row_off, chunk_window.col_off
+            r1, c1 = r0 + chunk_window.height, c0 + chunk_window.width
+            if r1 <= row_start or r0 >= row_stop or c1 <= col_start or c0 >= col_stop:
+                continue
+            rs, re = max(r0, row_start), min(r1, row_stop)
+            cs, ce = max(c0, col_start), min(c1, col_stop)
+            target = (slice(rs - row_start, re - row_start), slice(cs - col_start, ce - col_start))
+            path = self._chunk_path(band, row, col)
+            if in_blocks.any():
+                blocks = np.memmap(path, dtype=self.index["dtype"], mode="r",
+                                   shape=(n_blocks, chunk_window.height, chunk_window.width,
+                                          time_block))
+                selected = times[in_blocks]
+                out[(in_blocks, ) + target] = blocks[selected // time_block, rs - r0:re - r0,
+                                                     cs - c0:ce - c0, selected % time_block]
+                del blocks
+            if not in_blocks.all():
+                tail = np.memmap(path.with_suffix(".tail"), dtype=self.index["dtype"], mode="r",
+                                 shape=(n_tail, chunk_window.height, chunk_window.width))
+                out[(~in_blocks, ) + target] = \
+                    tail[times[~in_blocks] - n_blocks * time_block, rs - r0:re - r0, cs - c0:ce - c0]
+                del tail
+        return out, scenes.reset_index(drop=True)
+
+    def read_pixel(self, band, row, col, start_date=None, end_date=None):
+        """Read the time series of a pixel. See ``read``."""
+        out, scenes = self.read(band, Window(col, row, 1, 1), start_date=start_date,
+                                end_date=end_date)
+        return out[:, 0, 0], scenes
+
+    def _chunk_windows(self):
+        size = self.index["chunk_size"]
+        for row, row_off in enumerate(range(0, self.index["height"], size)):
+            for col, col_off in enumerate(range(0, self.index["width"], size)):
+                yield (row, col), Window(col_off, row_off,
+                                         min(size, self.index["width"] - col_off),
+                                         min(size, self.index["height"] - row_off))
+
+    def _chunk_path(self, band, row, col):
+        return self.path / band / f"{row}_{col}.dat"
+
+    def _write_index(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp = self.path / (INDEX_NAME + ".tmp")
+        with open(tmp, "w") as dst:
+            json.dump(self.index, dst, indent=1)
+        os.replace(tmp, self.path / INDEX_NAME)
+
+
+def get_store(root, tile, **kwargs):
+    """Get the ``TimeSeriesStore`` of a tile (e.g. ``'T32UNU'``) in the directory ``root``."""
+    return TimeSeriesStore(Path(root) / tile, **kwargs)
@@ -0,0 +1,215 @@
+"""The HLS (= Sentinel-2 / MGRS) tiling system computed offline.
+
+A tile, e.g. ``32UNU``, is named by its UTM zone (``32``), latitude band (``U``) and the column
+(``N``) and row (``U``) letters of its 100 km MGRS square. The tile covers 109.8 km x 109.8 km:
+its upper left corner is the upper left corner of the square snapped to the 60 m grid, i.e.
+tiles overlap their neighbours by 9.8 km.
+"""
+import json
+import math
+from pathlib import Path
+
+from rasterio.warp import transform
+
+
+TILE_SIZE = 109800
+SQUARE_SIZE = 100000
+LATITUDE_BANDS = "CDEFGHJKLMNPQRSTUVWX"
+COLUMN_LETTERS = ("ABCDEFGH", "JKLMNPQR", "STUVWXYZ")
+ROW_LETTERS = "ABCDEFGHJKLMNPQRSTUV"
+
+
+def tiles_from_aoi(aoi):
+    """Get the tiles intersecting an area of interest.
+
+    The tiles are computed from the coordinates, i.e. no tile list is downloaded.
+    Each part of the AOI is only assigned to the tiles of the UTM zone it is in, i.e.
+    the result is the minimal set of tiles covering the AOI.
+    Where a 100 km square spans two latitude bands the band of its center is used.
+
+    Arguments:
+        aoi {str or tuple or dict} -- Path of a GeoJSON file, a GeoJSON object (geometry,
+            feature or feature collection with polygons) or a bounding box
+            ``(west, south, east, north)``, all in longitude/latitude (EPSG:4326).
+
+    Returns:
+        list -- Sorted tile names, e.g. ``['32UNU', '32UPU']``.
+    """
+    tiles = set()
+    for polygon in read_aoi(aoi):
+        lons = [lon for ring in polygon for lon, _ in ring]
+        for zone in range(_zone(min(lons)), _zone(max(lons)) + 1):
+            west = -180 + (zone - 1) * 6
+            clipped = [_clip_ring(_densify(ring), west, -80, west + 6, 84) for ring in polygon]
+            if len(clipped[0]) < 3:
+                continue
+            tiles.update(_tiles_in_zone(zone, clipped))
+    return sorted(tiles)
+
+
+def tile_bounds(tile):
+    """Get the CRS and the bounds ``(left, bottom, right, top)`` of a tile, e.g. ``'32UNU'``."""
+    zone, band, column, row = int(tile[:2]), tile[2], tile[3], tile[4]
+    crs = _utm_crs(zone, band >= "N")
+    easting = (COLUMN_LETTERS[(zone - 1) % 3].index(column) + 1) * SQUARE_SIZE
+    row_index = (ROW_LETTERS.index(row) - (5 if zone % 2 == 0 else 0)) % 20
+    # the row letters repeat every 2000 km, take the square in the latitude band
+    band_center = -80 + LATITUDE_BANDS.index(band) * 8 + 4
+    _, ys = transform("EPSG:4326", crs, [zone * 6 - 183], [band_center])
+    candidates = [k * SQUARE_SIZE for k in range(0, 100) if k % 20 == row_index]
+    northing = min(candidates, key=lambda n: abs(n + SQUARE_SIZE / 2 - ys[0]))
+    return crs, _square_to_tile_bounds(easting, northing)
+
+
+def read_aoi(aoi):
+    """Get the polygons of an AOI (see ``tiles_from_aoi``) as lists of rings of (lon, lat)."""
+    if isinstance(aoi, (tuple, list)) and len(aoi) == 4 and not isinstance(aoi[0], (tuple, list)):
+        west, south, east, north = aoi
+        return [[[(west, south), (east, south), (east, north), (west, north), (west, south)]]]
+    if isinstance(aoi, (str, Path)):
+        with open(aoi) as src:
+            aoi = json.load(src)
+    if aoi["type"] == "FeatureCollection":
+        return [polygon for feature in aoi["features"] for polygon in read_aoi(feature)]
+    if aoi["type"] == "Feature":
+        return read_aoi(aoi["geometry"])
+    if aoi["type"] == "Polygon":
+        return [[[tuple(xy[:2]) for xy in ring] for ring in aoi["coordinates"]]]
+    if aoi["type"] == "MultiPolygon":
+        return [[[tuple(xy[:2]) for xy in ring] for ring in polygon]
+                for polygon in aoi["coordinates"]]
+    raise ValueError(f"Unsupported AOI geometry {aoi['type']}. Expecting (Multi)Polygons.")
+
+
+def polygon_intersects_rectangle(polygon, bounds):
+    """Check if a polygon (list of rings, the first being the exterior) intersects a rectangle."""
+    left, bottom, right, top = bounds
+    for ring in polygon[:1]:
+        if any(left <= x <= right and bottom <= y <= top for x, y in ring):
+            return True
+    corners = [(left, bottom), (right, bottom), (right, top), (left, top)]
+    if any(_point_in_polygon(corner, polygon) for corner in corners):
+        return True
+    edges = list(zip(corners, corners[1:] + corners[:1]))
+    for ring in polygon:
+        for a, b in zip(ring, ring[1:] + ring[:1]):
+            if any(_segments_intersect(a, b, c, d) for c, d in edges):
+                return True
+    return False
+
+
+def _tiles_in_zone(zone, polygon):
+    tiles = set()
+    # project both hemispheres separately, the northings of the tiles differ
+    for north in (True, False):
+        lats = [lat for lon, lat in polygon[0]]
+        if (north and max(lats) < 0) or (not north and min(lats) >= 0):
+            continue
+        crs = _utm_crs(zone, north)
+        projected = []
+        for ring in polygon:
+            xs, ys = transform("EPSG:4326", crs, [lon for lon, _ in ring], [lat for _, lat in ring])
+            projected.append(list(zip(xs, ys)))
+        xs = [x for x, _ in projected[0]]
+        ys = [y for _, y in projected[0]]
+        # the tiles extend beyond their square, check the neighbouring squares too
+        for column in range(max(1, math.floor(min(xs) / SQUARE_SIZE) - 1),
+                            min(8, math.floor(max(xs) / SQUARE_SIZE)) + 1):
+            for row in range(math.floor(min(ys) / SQUARE_SIZE) - 1,
+                             math.floor(max(ys) / SQUARE_SIZE) + 1):
+                easting, northing = column * SQUARE_SIZE, row * SQUARE_SIZE
+                bounds = _square_to_tile_bounds(easting, northing)
+                if not polygon_intersects_rectangle(projected, bounds):
+                    continue
+                lons, lats = transform(crs, "EPSG:4326", [easting + SQUARE_SIZE / 2],
+                                       [northing + SQUARE_SIZE / 2])
+                if (lats[0] >= 0) != north or not -80 <= lats[0] <= 84:
+                    continue
+                tiles.add(_tile_name(zone, lats[0], easting, northing))
+    return tiles
+
+
+def _tile_name(zone, lat, easting, northing):
+    band = LATITUDE_BANDS[min(int((lat + 80) // 8), len(LATITUDE_BANDS) - 1)]
+    column = COLUMN_LETTERS[(zone - 1) % 3][int(easting // SQUARE_SIZE) - 1]
+    row = ROW_LETTERS[(int(northing // SQUARE_SIZE) + (5 if zone % 2 == 0 else 0)) % 20]
+    return f"{zone:02d}{band}{column}{row}"
+
+
+def _square_to_tile_bounds(easting, northing):
+    left = math.floor(easting / 60) * 60
+    top = math.ceil((northing + SQUARE_SIZE) / 60) * 60
+    return left, top - TILE_SIZE, left + TILE_SIZE, top
+
+
+def _utm_crs(zone, north=True):
+    return f"EPSG:{326 if north else 327}{zone:02d}"
+
+
+def _zone(lon):
+    return min(max(int((lon + 180) // 6) + 1, 1), 60)
+
+
+def _densify(ring, step=0.1):
+    """Insert points such that straight lines in lon/lat stay close to their projection."""
+    points = []
+    for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]):
+        n = max(1, int(math.ceil(max(abs(x1 - x0), abs(y1 - y0)) / step)))
+        points.extend((x0 + (x1 - x0) * i / n, y0 + (y1 - y0) * i / n) for i in range(n))
+    return points
+
+
+def _clip_ring(ring, left, bottom, right, top):
+    """Clip a ring to a rectangle (Sutherland-Hodgman)."""
+    def _clip(points, inside, intersect):
+        result = []
+        for a, b in zip(points, points[1:] + points[:1]):
+            if inside(b):
+                if not inside(a):
+                    result.append(intersect(a, b))
+                result.append(b)
+            elif inside(a):
+                result.append(intersect(a, b))
+        return result
+
+    def _at_x(x):
+        return lambda a, b: (x, a[1] + (b[1] - a[1]) * (x - a[0]) / (b[0] - a[0]))
+
+    def _at_y(y):
+        return lambda a, b: (a[0] + (b[0] - a[0]) * (y - a[1]) / (b[1] - a[1]), y)
+
+    for inside, intersect in [(lambda p: p[0] >= left, _at_x(left)),
+                              (lambda p: p[0] <= right, _at_x(right)),
+                              (lambda p: p[1] >= bottom, _at_y(bottom)),
+                              (lambda p: p[1] <= top, _at_y(top))]:
+        ring = _clip(ring, inside, intersect)
+        if not ring:
+            break
+    return ring
+
+
+def _point_in_polygon(point, polygon):
+    """Even-odd rule over all rings, i.e. points in holes are outside."""
+    x, y = point
+    inside = False
+    for ring in polygon:
+        for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]):
+            if (y0 > y) != (y1 > y) and x < x0 + (y - y0) * (x1 - x0) / (y1 - y0):
+                inside = not inside
+    return inside
+
+
+def _segments_intersect(a, b, c, d):
+    def _orientation(p, q, r):
+        value = (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+        return (value > 0) - (value < 0)
+
+    def _on_segment(p, q, r):
+        return min(p[0], r[0]) <= q[0] <= max(p[0], r[0]) and min(p[1], r[1]) <= q[1] <= max(p[1], r[1])
+
+    o1, o2, o3, o4 = (_orientation(a, b, c), _orientation(a, b, d),
+                      _orientation(c, d, a), _orientation(c, d, b))
+    if o1 != o2 and o3 != o4:
+        return True
+    return (o1 == 0 and _on_segment(a, c, b)) or (o2 == 0 and _on_segment(a, d, b)) or \
+        (o3 == 0 and _on_segment(c, a, d)) or (o4 == 0 and _on_segment(c, b, d))
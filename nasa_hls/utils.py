@@ -1,150 +1,153 @@
+import ast
 from bs4 import BeautifulSoup
-import collections
-import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import fnmatch
+import functools
 import numpy as np
+import os
 import pandas as pd
 from pathlib import Path
 import rasterio
+import re
 import requests
-from subprocess import Popen, PIPE
 from tqdm import tqdm
 import urllib
 import warnings
 
-BAND_NAMES = {'S30': {'Coastal_Aerosol': 'B01',
-                      'Blue': 'B02',
-                      'Green': 'B03',
-                      'Red': 'B04',
-                      'Red_Edge1': 'B05',
-                      'Red_Edge2': 'B06',
-                      'Red_Edge3': 'B07',
-                      'NIR_Broad': 'B08',
-                      'NIR_Narrow': 'B8A',
-                      'Water_Vapor' : 'B09',
-                      'Cirrus': 'B10',
-                      'SWIR1': 'B11',
-                      'SWIR2': 'B12',
-                      'QA': 'QA'},
-              'L30': {'Coastal_Aerosol': 'band01',
-                      'Blue': 'band02',
-                      'Green': 'band03',
-                      'Red': 'band04',
-                      'NIR': 'band05',
-                      'SWIR1': 'band06',
-                      'SWIR2': 'band07',
-                      'Cirrus': 'band09',
-                      'TIRS1': 'band10',
-                      'TIRS2': 'band11',
-                      'QA': 'QA'}}
-
-QA_ATTRIBUTES_SHORT = ['a_clima',
-                       'a_low',
-                       'a_avg',
-                       'a_high',
-                       'water',
-                       'snow',
-                       'cloud_shadow',
-                       'adj_cloud',
-                       'cloud',
-                       'cirrus',
-                       'no_water',
-                       'no_snow',
-                       'no_cloud_shadow',
-                       'no_adj_cloud',
-                       'no_cloud',
-                       'no_cirrus']
-
-QA_ATTRIBUTES_SHORT = ['Aerosol Quality Climatology',
-                       'Aerosol Quality Low',
-                       'Aerosol Quality Average',
-                       'Aerosol Quality  High',
-                       'Water',
-                       'Snow/ice',
-                       'Cloud shadow',
-                       'Adjacent cloud',
-                       'Cloud',
-                       'Cirrus',
-                       'No water',
-                       'No snow/ice',
-                       'No cloud shadow',
-                       'No adjacent cloud',
-                       'No cloud',
-                       'No cirrus']
+from .listing_index import ListingIndex
+from .metadata import get_metadata_cache
+from .metadata import read_metadata
+from .metadata import read_metadata_batch
+from .metrics import METRICS
+from .names import BAND_ALIASES
+from .names import BAND_NAMES
+from .names import BASE_URL
+from .names import GRANULE_ID_FIELDS
+from .names import GRANULE_ID_PATTERN
+from .names import QA_ATTRIBUTES_SHORT
+from .names import QA_BITS
+from .names import convert_date_to_Yj
+from .names import parse_granule_id
+from .names import parse_url
+from .names import resolve_band_name
+from .session import DEFAULT_MAX_WORKERS
+from .session import get_session
+from .tiles import tiles_from_aoi
 
 
 def get_qa_look_up_table():
     """Get a dataframe with all QA values, binary strings and to which QA attributes they resolve."""
-    def bit_num_to_str_idx(bit_number, n_total_bits=8):
-        """Get the index of bit(s) in a binary string given the bit number."""
-        string_indices = list(range(n_total_bits-1, -1, -1))
-        if isinstance(bit_number, list):
-            str_idx = [string_indices[bn] for bn in bit_number]
-        else:
-            str_idx = string_indices[bit_number]
-        return str_idx
-
-    lut_qa = pd.DataFrame({"qa_value": list(range(256)),
-                       "binary_string": ["{0:08b}".format(i) for i in range(256)]})
-
-    # # define a LUT dictionary for each bit combination
-    # 1) the 2-bit combinations and the '1' cases of the single cases 
-    lut_bits = {"a_clima": {"bit_combination":"00",
-                            "bit_number": [7, 6]},
-                "a_low": {"bit_combination":"01",
-                          "bit_number": [7, 6]},
-                "a_avg": {"bit_combination":"10",
-                          "bit_number": [7, 6]},
-                "a_high": {"bit_combination":"11",
-                           "bit_number": [7, 6]},
-                "water": {"bit_combination":"1",
-                          "bit_number": 5},
-                "snow": {"bit_combination":"1",
-                         "bit_number": 4},
-                "cloud_shadow": {"bit_combination":"1",
-                                 "bit_number": 3},
-                "adj_cloud": {"bit_combination":"1",
-                              "bit_number": 2},
-                "cloud": {"bit_combination":"1",
-                          "bit_number": 1},
-                "cirrus": {"bit_combination":"1",
-                           "bit_number": 0},
-                }
-    # 2 a) get the string indices 
-    # bit number -> string indices, e.g. [7, 6] -> [0, 1])
-    #                                    0 -> 7
-    # 2 b) get definition of the '0' cases of single bit combinations
-    # the 2-bit combinations and the true cases of the single cases 
-    for key in list(lut_bits.keys()):
-        lut_bits[key]["string_index"] = bit_num_to_str_idx(lut_bits[key]["bit_number"], n_total_bits=8)
-        if not isinstance(lut_bits[key]["bit_number"], list):
-            key_opposite = "no_" + key
-            lut_bits[key_opposite] = lut_bits[key].copy()
-            lut_bits[key_opposite]["bit_combination"] = "0"
-
-    # now we can create a column for each possible QA attribute
-    for key in lut_bits.keys():
-        if isinstance(lut_bits[key]["string_index"], list):
-            tmp_col = lut_qa.binary_string.str[lut_bits[key]["string_index"][0] : lut_bits[key]["string_index"][1]+1]
-            new_col = tmp_col == lut_bits[key]["bit_combination"]
-            del tmp_col
-        else:
-            new_col = lut_qa.binary_string.str[lut_bits[key]["string_index"]] == lut_bits[key]["bit_combination"]
-        lut_qa.loc[:, key] = new_col
-        del new_col
+    return _get_qa_look_up_table().copy()
+
+
+@functools.lru_cache(maxsize=None)
+def _get_qa_look_up_table():
+    qa_values = np.arange(256)
+    lut_qa = pd.DataFrame({"qa_value": qa_values,
+                           "binary_string": ["{0:08b}".format(i) for i in range(256)]})
+    for key, (mask, value) in QA_BITS.items():
+        lut_qa[key] = (qa_values & mask) == value
     return lut_qa
 
+
+def compile_qa_expression(expression):
+    """Compile a QA attribute expression to a function of a QA array returning a boolean mask.
+
+    An expression combines the QA attributes of ``QA_BITS`` (e.g. ``'no_cloud'``, ``'snow'``)
+    with ``&`` (and), ``|`` (or), ``~`` (not) and parentheses, e.g.
+    ``'no_cloud & no_cloud_shadow & no_adj_cloud & ~snow'``.
+    Conjunctions of attributes are compiled to a single ``qa & mask == value`` comparison.
+
+    Arguments:
+        expression {str} -- The QA attribute expression.
+
+    Returns:
+        function -- Function of a QA array returning a boolean array.
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode="eval").body
+    except SyntaxError:
+        raise ValueError(f"Invalid QA expression: {expression}")
+    return _compile_qa_node(tree, expression)
+
+
+def qa_expression_to_mask(qa_array, expression):
+    """Evaluate a QA attribute expression (see ``compile_qa_expression``) on a QA array."""
+    return compile_qa_expression(expression)(np.asarray(qa_array))
+
+
+def qa_expression_to_values(expression):
+    """Get the QA values (0-255) for which a QA attribute expression is true.
+
+    The result can be used as ``qa_valid`` in ``hls_qa_layer_to_mask``.
+    """
+    return np.flatnonzero(qa_expression_to_mask(np.arange(256), expression))
+
+
+def _compile_qa_node(node, expression):
+    conjunction = _qa_conjunction(node)
+    if conjunction is not None:
+        mask, value = conjunction
+        if mask is None:
+            return lambda qa: np.zeros(np.shape(qa), dtype=bool)
+        return lambda qa: (qa & mask) == value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Invert, ast.Not)):
+        operand = _compile_qa_node(node.operand, expression)
+        return lambda qa: ~operand(qa)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+        left = _compile_qa_node(node.left, expression)
+        right = _compile_qa_node(node.right, expression)
+        if isinstance(node.op, ast.BitAnd):
+            return lambda qa: left(qa) & right(qa)
+        return lambda qa: left(qa) | right(qa)
+    if isinstance(node, ast.Name):
+        raise ValueError(f"Unknown QA attribute '{node.id}' in {expression}. "
+                         f"Valid attributes: {', '.join(QA_BITS)}.")
+    raise ValueError(f"Invalid QA expression: {expression}")
+
+
+def _qa_conjunction(node):
+    """Merge a conjunction of (negated single-bit) attributes into one (mask, value) pair.
+
+    Returns ``None`` if the node is not such a conjunction and ``(None, None)``
+    if the conjunction can never be true.
+    """
+    if isinstance(node, ast.Name) and node.id in QA_BITS:
+        return QA_BITS[node.id]
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Invert, ast.Not)) \
+            and isinstance(node.operand, ast.Name) and node.operand.id in QA_BITS:
+        mask, value = QA_BITS[node.operand.id]
+        if bin(mask).count("1") == 1:
+            return mask, value ^ mask
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitAnd):
+        left, right = _qa_conjunction(node.left), _qa_conjunction(node.right)
+        if left is None or right is None:
+            return None
+        if left[0] is None or right[0] is None:
+            return None, None
+        common = left[0] & right[0]
+        if left[1] & common != right[1] & common:
+            return None, None
+        return left[0] | right[0], left[1] | right[1]
+    return None
+
+
 def hls_qa_layer_to_mask(qa_path, 
                          qa_valid,
                          keep_255=True,
                          mask_path=None, 
-                         overwrite=False):
+                         overwrite=False,
+                         blockwise=False):
     """Derive a mask from a binary encoded QA raster.
+
+    The mask is derived in one pass with a look-up table of the 256 possible QA values.
     
     Arguments:
         qa_path {str} -- Path to the single band HLS QA layer GeoTiFF.
-        qa_valid {str} -- QA values to be considered valid in the QA layer. 
+        qa_valid {list or str} -- QA values to be considered valid in the QA layer. 
             they will be 1 in the output array/GeoTiFF. Other values will be 0.
+            Alternatively a QA attribute expression, e.g.
+            ``'no_cloud & no_cloud_shadow & no_adj_cloud & ~snow'`` (see ``compile_qa_expression``).
     
     Keyword Arguments:
         keep_255 {bool} -- If ``True`` the 255 value 
@@ -156,214 +159,446 @@ def hls_qa_layer_to_mask(qa_path,
         overwrite {bool} -- Overwrite the ``mask_path`` in case it exists?
             Else the processing is skipped.
             Only applies if ``mask_path`` is not ``None``. (default: {False})
+        blockwise {bool} -- Read (and write) the raster block by block, i.e. with the
+            internal tiles or strips of the QA layer, instead of at once. With a
+            ``mask_path`` the memory usage is then bounded by the block size. (default: {False})
     
     Returns:
-        array or 0 -- Array if ``mask_path`` is given, else an array. 
+        array or 0 -- 0 if ``mask_path`` is given, else an array. 
     """
     if mask_path is not None:
         if Path(mask_path).exists() and not overwrite:
             print("Processing skipped. File exists.")
             return 0
-    
+
+    lut = qa_valid_to_lut(qa_valid, keep_255=keep_255)
     with rasterio.open(qa_path) as qa:
-        meta = qa.meta
-        qa_array = qa.read()
+        profile = qa.profile
+        profile.update(count=1, dtype="uint8", nodata=None, compress="lzw")
+        if not blockwise:
+            clear_array = _apply_lut(lut, qa.read(1))
+            if mask_path is not None:
+                with rasterio.open(mask_path, "w", **profile) as dst:
+                    dst.write(clear_array, 1)
+        elif mask_path is not None:
+            with rasterio.open(mask_path, "w", **profile) as dst:
+                for _, window in qa.block_windows(1):
+                    dst.write(_apply_lut(lut, qa.read(1, window=window)), 1, window=window)
+        else:
+            clear_array = np.empty(qa.shape, dtype="uint8")
+            for _, window in qa.block_windows(1):
+                clear_array[window.toslices()] = _apply_lut(lut, qa.read(1, window=window))
 
-    clear_array = np.zeros_like(qa_array)
-    for num in qa_valid:
-        clear_array[qa_array == num] = 1
-    if keep_255:
-        clear_array[qa_array == 255] = 255
-    
     if mask_path is not None:
-        meta.update(compress="lzw")
-        with rasterio.open(mask_path, "w", **meta) as dst:
-            dst.write(clear_array)
         return 0
     else:
-        return clear_array[0, :, :]
+        return clear_array
+
+
+def hls_qa_layer_to_mask_batch(qa_paths,
+                               qa_valid,
+                               mask_paths,
+                               keep_255=True,
+                               overwrite=False,
+                               blockwise=True,
+                               max_workers=None):
+    """Derive masks from many binary encoded QA rasters on a process pool.
+
+    See ``hls_qa_layer_to_mask`` for the arguments.
+
+    Keyword Arguments:
+        max_workers {int} -- Number of processes. ``None`` uses the number of CPUs. (default: {None})
+
+    Returns:
+        dataframe -- One row per QA layer with the columns ``qa_path``, ``mask_path``,
+            ``status`` (``'written'``, ``'skipped'`` or ``'failed'``) and ``error``.
+    """
+    qa_paths = [str(qa_path) for qa_path in qa_paths]
+    mask_paths = [str(mask_path) for mask_path in mask_paths]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_hls_qa_layer_to_mask_task, qa_path, mask_path, qa_valid,
+                                   keep_255, overwrite, blockwise)
+                   for qa_path, mask_path in zip(qa_paths, mask_paths)]
+        results = [future.result() for future in tqdm(futures, total=len(futures))]
+    return pd.DataFrame(results, columns=["qa_path", "mask_path", "status", "error"])
+
+
+def _hls_qa_layer_to_mask_task(qa_path, mask_path, qa_valid, keep_255, overwrite, blockwise):
+    result = {"qa_path": qa_path, "mask_path": mask_path, "status": "written", "error": None}
+    if Path(mask_path).exists() and not overwrite:
+        result["status"] = "skipped"
+        return result
+    try:
+        hls_qa_layer_to_mask(qa_path, qa_valid, keep_255=keep_255, mask_path=mask_path,
+                             overwrite=overwrite, blockwise=blockwise)
+    except Exception as exc:
+        result["status"] = "failed"
+        result["error"] = str(exc)
+    return result
+
+
+def qa_valid_to_lut(qa_valid, keep_255=True):
+    """Get a look-up table mapping each of the 256 QA values to its mask value.
+
+    Arguments:
+        qa_valid {list or str} -- QA values mapped to 1. All other values are mapped to 0.
+            Alternatively a QA attribute expression (see ``compile_qa_expression``).
+
+    Keyword Arguments:
+        keep_255 {bool} -- Map 255 to 255. (default: {True})
+
+    Returns:
+        array -- uint8 array with 256 elements.
+    """
+    if isinstance(qa_valid, str):
+        qa_valid = qa_expression_to_values(qa_valid)
+    lut = np.zeros(256, dtype="uint8")
+    lut[np.asarray(qa_valid, dtype="int64")] = 1
+    if keep_255:
+        lut[255] = 255
+    return lut
+
+
+def _apply_lut(lut, qa_array):
+    if qa_array.dtype != np.uint8:
+        qa_array = qa_array.astype("uint8")
+    return lut[qa_array]
+
 
 def get_metadata_from_hdf(src, fields=["cloud_cover", "spatial_coverage"]):
     """Get metadata from a nasa-hls hdf file. See HLS user guide for valid fields.
+
+    A field matches the metadata entry with the same name or else the first entry
+    containing it, e.g. ``'cloud_cover'`` matches ``'cloud_coverage'``.
+    Use ``metadata.read_metadata`` to get all fields.
     
     HLS User Guide - see Section 6.6: 
     
     https://hls.gsfc.nasa.gov/wp-content/uploads/2019/01/HLS.v1.4.UserGuide_draft_ver3.1.pdf
     """
-    band="QA"
-    cmd = f"gdalinfo HDF4_EOS:EOS_GRID:'{src}':Grid:{band}"
-    p = Popen(cmd, stdout=PIPE, shell=True)
-    output, err = p.communicate()
-    output = str(output)[2:-1].replace("\\n", "\n")
-    rc = p.returncode
+    return _select_metadata_fields(read_metadata(src), fields)
+
+
+def _select_metadata_fields(all_metadata, fields):
     metadata = {}
-    for line in output.split("\n"):
-        for field in fields:
-            if field in line:
-                metadata[field] = line.split("=")[1].strip()
-                try:
-                    metadata[field] = float(metadata[field])
-                except:
-                    pass
     for field in fields:
-        if field not in metadata.keys():
+        keys = [field] if field in all_metadata else [key for key in all_metadata if field in key]
+        if keys:
+            value = all_metadata[keys[0]]
+            metadata[field] = float(value) if isinstance(value, int) else value
+        else:
             warnings.warn(f"Could not find metadata for field '{field}'.")
     return metadata
 
 def get_cloud_coverage_from_hdf(src):
     """Get the cloud coverage from the metadata of a nasa-hls hdf file.
     """
-    band="QA"
-    cmd = f"gdalinfo HDF4_EOS:EOS_GRID:'{src}':Grid:{band}"
-    p = Popen(cmd, stdout=PIPE, shell=True)
-    output, err = p.communicate()
-    output = str(output)[2:-1].replace("\\n", "\n")
-    rc = p.returncode
-    cloud_coverage = None
-    for line in output.split("\n"):
-        if "cloud_coverage" in line:
-            cloud_coverage = float(line.split("=")[1].strip())
+    cloud_coverage = read_metadata(src).get("cloud_coverage")
     if cloud_coverage is None:
         raise Exception("Could not derive cloud cover.")
-    return cloud_coverage
+    return float(cloud_coverage)
 
-def get_available_tiles_from_url(
-        url_tiles="https://hls.gsfc.nasa.gov/wp-content/uploads/2018/10/HLS_Sentinel2_Granule.csv"):
-    txt = urllib.request.urlopen(url_tiles).read()
-    tiles = str(txt)[2:-5].split("\\r\\n")
-    return tiles
 
-def parse_url(date,
-              tile="33UUU",
-              product="S30",
-              version="v1.4"):
-    """Download a HLS dataset from https://hls.gsfc.nasa.gov/data/.
-
-    :param date: A date in one of the following supported formats: '%Y-%m-%d', '%Y%m%d', %Y%j'.
-    :param tile: Tile name of the HLS = Sentinel2 tiling system
-        (see https://hls.gsfc.nasa.gov/products-description/tiling-system/).
-    :param product: Download Landsat (use 'L30') or Sentinel-2 (use 'S30') data.
-    :param version: Product version, at the time writing there was only 'v1.4' available.
-    :return: The dataset URL.
-    """
-    base_url = "https://hls.gsfc.nasa.gov/data"
+def get_metadata_from_hdr(src, fields=["cloud_cover", "spatial_coverage"]):
+    """Get metadata from the .hdf.hdr sidecar file of a nasa-hls hdf file.
 
-    if len(tile) != 5:
-        raise ValueError(f"Tilename must follow the pattern of e.g. 32TPT. Got {tile}.")
+    Fields are matched like in ``get_metadata_from_hdf``, i.e. ``'cloud_cover'`` matches
+    a ``cloud_coverage = 41`` entry. Fields which are not found are missing in the result.
 
-    date_yyyydoy = convert_date_to_Yj(date)
-    year = date_yyyydoy[:4]
-    doy = date_yyyydoy[4::]
+    Arguments:
+        src {str} -- Path of the .hdf.hdr file.
 
-    file_name = f"HLS.{product}.T{tile}.{year}{doy}.{version}.hdf"
-    hls_dataset_url = f"{base_url}/{version}/{product}/{year}/{tile[:2]}/{tile[2]}/{tile[3]}/{tile[4]}/{file_name}"
+    Keyword Arguments:
+        fields {list} -- Metadata fields. (default: {["cloud_cover", "spatial_coverage"]})
 
-    return hls_dataset_url
+    Returns:
+        dict -- Metadata with float values where the value is numeric.
+    """
+    with open(src, "rb") as fh:
+        return parse_metadata_text(fh.read(), fields=fields)
 
-def convert_date_to_Yj(date: str) -> str:
-    """Convert a date to the format '%Y%j'.
 
-    :param date: A date in one of the following supported formats: '%Y-%m-%d', '%Y%m%d', %Y%j'.
-    :return: Date as string in the format '%Y%j.
-    """
+def parse_metadata_text(text, fields=["cloud_cover", "spatial_coverage"]):
+    """Search ``<name> = <value>`` metadata entries with ``name`` containing one of the ``fields``.
+
+    ``text`` can be a string or bytes, e.g. the content of a .hdf.hdr file or the first
+    bytes of a hdf file.
 
-    date_recognizers = [
-        lambda date: datetime.datetime.strptime(date, "%Y%j"),
-        lambda date: datetime.datetime.strptime(date, "%Y-%m-%d"),
-        lambda date: datetime.datetime.strptime(date, "%Y%m%d")
-    ]
-    # convert the user given date in the required %Y%j format
-    date_yyydoy = None
-    for date_recognizer in date_recognizers:
+    Returns:
+        dict -- Metadata with float values where the value is numeric.
+    """
+    if isinstance(text, bytes):
+        text = text.decode("latin-1")
+    metadata = {}
+    for field in fields:
+        match = re.search(rf"\w*{re.escape(field)}\w*\s*=\s*{{?\s*([^\s,}}\x00]+)", text)
+        if match is None:
+            continue
+        metadata[field] = match.group(1)
         try:
-            dt = date_recognizer(date)
-            date_yyydoy = datetime.datetime.strftime(dt, "%Y%j")
-            # exit the loop on success
-            break
+            metadata[field] = float(metadata[field])
         except ValueError:
-            # repeat the loop on failure
-            continue
-    if date_yyydoy is None:
-        raise ValueError(
-            f"Date {date} did not match any supported format '%Y-%m-%d', '%Y%m%d', %Y%j'.")
-    return date_yyydoy
+            pass
+    return metadata
+
+
+def get_available_tiles_from_url(
+        url_tiles="https://hls.gsfc.nasa.gov/wp-content/uploads/2018/10/HLS_Sentinel2_Granule.csv"):
+    txt = urllib.request.urlopen(url_tiles).read()
+    tiles = str(txt)[2:-5].split("\\r\\n")
+    return tiles
+
+def get_available_datasets(products, years, tiles, return_list=True,
+                           max_workers=DEFAULT_MAX_WORKERS, requests_per_second=None,
+                           session=None, index=None, base_url=BASE_URL, aoi=None):
+    """Get all the datasets available for your products, years and tiles of interest.
+
+    The product/year/tile directories are listed concurrently over a shared,
+    connection-pooled session. The order of the result is deterministic, i.e.
+    datasets are ordered by product, year and tile as given and within each
+    directory as listed by the server.
 
+    With an ``index`` the listings are served from a persistent listing index.
+    Only stale entries are revalidated with conditional requests and directories
+    of closed years are not requested at all (see ``listing_index.ListingIndex``).
 
-def get_available_datasets(products, years, tiles, return_list=True):
-    """Get all the datasets available for your products, years and tiles of interest."""
+    Arguments:
+        products {list} -- Products, e.g. ``["L30", "S30"]``.
+        years {list} -- Years, e.g. ``[2018, 2019]``.
+        tiles {list} -- Tiles, e.g. ``["32UNU", "32UPU"]``. ``None`` means all tiles
+            intersecting ``aoi``.
+
+    Keyword Arguments:
+        return_list {bool} -- Return a list of URLs, else a dataframe as
+            returned by ``dataframe_from_urls``. (default: {True})
+        max_workers {int} -- Number of concurrent directory requests. (default: {8})
+        requests_per_second {float} -- Maximum number of requests per second to the
+            server. ``None`` means no limit. Ignored if ``session`` is given. (default: {None})
+        session {requests.Session} -- Session to be used, e.g. as returned by
+            ``session.get_session``. If ``None`` a new one is created. (default: {None})
+        index {str or ListingIndex} -- Listing index or path of its SQLite database.
+            If ``None`` all directories are requested. (default: {None})
+        base_url {str} -- Root of the HLS data directory tree. (default: {BASE_URL})
+        aoi {str or tuple or dict} -- Area of interest, see ``tiles.tiles_from_aoi``.
+            Only the tiles intersecting it are listed. (default: {None})
+    """
+    if aoi is not None:
+        tiles_aoi = tiles_from_aoi(aoi)
+        tiles = [tile for tile in tiles_aoi if tiles is None or tile in tiles]
     urls_to_screen = []
     for product in products:
         for year in years:
             for tile in tiles:
-                url = parse_url(f"{year}-01-01", tile, product)
+                url = parse_url(f"{year}-01-01", tile, product, base_url=base_url)
                 urls_to_screen += ["/".join(url.split("/")[:-1]) + "/"]
-    datasets = _get_directories_in_directories(urls_to_screen, "*.hdf")
+    if session is None:
+        session = get_session(max_connections=max_workers,
+                              requests_per_second=requests_per_second)
+    if index is not None and not isinstance(index, ListingIndex):
+        index = ListingIndex(index)
+    datasets = _get_directories_in_directories(urls_to_screen, "*.hdf",
+                                               max_workers=max_workers,
+                                               session=session,
+                                               index=index)
     if not return_list:
         datasets = dataframe_from_urls(datasets)
     return datasets
 
 
+def parse_granule_ids(values):
+    """Parse HLS granule ids, e.g. ``'HLS.L30.T32UNU.2017007.v1.4'``, out of ids, file names, paths or URLs.
+
+    All values are parsed at once with one regular expression (see ``GRANULE_ID_PATTERN``).
+
+    Arguments:
+        values {list or Series} -- Granule ids, paths or URLs.
+
+    Returns:
+        dataframe -- With the columns ``sceneid``, ``product`` and ``tile`` (without the leading
+            ``'T'``) as categoricals, ``date_Yj``, ``date`` (datetime64) and ``version``.
+            The index is the one of ``values`` if it is a Series.
+    """
+    values = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+    sceneids = values.astype(str).str.extract(GRANULE_ID_PATTERN, expand=False)
+    invalid = sceneids.isna()
+    if invalid.any():
+        raise ValueError(f"No HLS granule id in {invalid.sum()} values, e.g. {values[invalid].iloc[0]}.")
+    fields = {field: sceneids.str[chars] for field, chars in GRANULE_ID_FIELDS.items()}
+    granules = pd.DataFrame({"sceneid": sceneids,
+                             "product": fields["product"].astype("category"),
+                             "tile": fields["tile"].astype("category"),
+                             "date_Yj": fields["date_Yj"],
+                             "version": fields["version"]})
+    # parse each date once, there are far fewer dates than granules
+    dates = granules["date_Yj"].astype("category")
+    granules["date"] = pd.to_datetime(dates.cat.categories, format="%Y%j")[dates.cat.codes].values
+    return granules[["sceneid", "product", "tile", "date_Yj", "date", "version"]]
+
+
 def dataframe_from_urls(urls):
     """Convert list of HLS dataset URLs in dataframe (columns: product, tile, date, url)."""
-    import pandas as pd
-    datasets = pd.DataFrame(pd.Series(urls).str.split("/", expand=True))[11] \
-        .str.split(".", expand=True)[[1, 2, 3]] \
-        .rename({1: "product", 2: "tile", 3: "date"}, axis=1)
-    datasets.tile = datasets.tile.str[1::]
-    datasets.date = pd.to_datetime(datasets.date, format="%Y%j")
-    datasets["url"] = urls
+    datasets = parse_granule_ids(urls)[["product", "tile", "date"]]
+    datasets["url"] = list(urls)
     return datasets
 
 
-def dataframe_from_hdf_paths(hdf_paths, add_cloud_spatial_coverages=False):
+def dataframe_from_hdf_paths(hdf_paths, add_cloud_spatial_coverages=False,
+                             metadata_cache=None, max_workers=None):
     """Convert list of HLS dataset HDF paths in dataframe.
 
+    Keyword Arguments:
+        add_cloud_spatial_coverages {bool} -- Add the cloud cover and spatial coverage
+            from the metadata of the files (see ``get_coverages_from_hdfs``). (default: {False})
+        metadata_cache {str or MetadataCache} -- Metadata cache or path of its SQLite
+            database. See ``get_coverages_from_hdfs``. (default: {None})
+        max_workers {int} -- See ``get_coverages_from_hdfs``. (default: {None})
+
     Returns:
         dataframe -- with columns: path, sceneid, product, tile, date_Yj, date. 
         Optional columns (if ``add_cloud_spatial_coverages=True`): cloud_cover, spatial_coverage
     """
-    import pandas as pd
-    datasets = pd.DataFrame(hdf_paths, columns=["path"])
-    datasets["sceneid"] = datasets["path"].apply(lambda x: Path(x).stem)
-    datasets = pd.concat([datasets,
-                          datasets["sceneid"].str.split(".", expand=True) \
-                              .loc[:, [1, 2, 3]] \
-                              .rename({1: "product", 2: "tile", 3: "date_Yj"}, axis=1)], axis=1)
-    datasets["date"] = pd.to_datetime(datasets["date_Yj"], format="%Y%j")
-
-    cov = collections.defaultdict(list)
-    for path in datasets["path"]:
-        try:
-            tmp = get_metadata_from_hdf(path,
-                                        fields=["cloud_cover", "spatial_coverage"])
-            cov['cloud_cover'].append(tmp['cloud_cover'])
-            cov['spatial_coverage'].append(tmp['spatial_coverage'])
-        except:
-            warnings.warn(f"Could derive cloud cover and spatial coverage from {str(path)}") 
-            cov['cloud_cover'].append("None")
-            cov['spatial_coverage'].append("None")
-
-    datasets["cloud_cover"] = cov['cloud_cover']
-    datasets["spatial_coverage"] = cov['spatial_coverage']
+    paths = [str(path) for path in hdf_paths]
+    datasets = parse_granule_ids(paths)[["sceneid", "product", "tile", "date_Yj", "date"]]
+    datasets.insert(0, "path", paths)
+    # as in the file names, e.g. 'T32UNU'
+    datasets["tile"] = datasets["tile"].cat.rename_categories(lambda tile: "T" + tile)
+
+    if add_cloud_spatial_coverages:
+        coverages = get_coverages_from_hdfs(datasets["path"],
+                                            metadata_cache=metadata_cache,
+                                            max_workers=max_workers)
+        datasets["cloud_cover"] = coverages["cloud_cover"].values
+        datasets["spatial_coverage"] = coverages["spatial_coverage"].values
 
     return datasets
 
 
-def _get_directories(url, href_match):
-    page = requests.get(url).text
+def read_datasets(path):
+    """Read a table of datasets, e.g. written by ``hls_query``, from a Parquet or CSV file.
+
+    Parquet files (``.parquet``) need pyarrow or fastparquet. From CSV files the column
+    ``date`` is parsed as datetime64 and ``product`` and ``tile`` are read as categoricals.
+    """
+    if str(path).endswith(".parquet"):
+        return pd.read_parquet(path)
+    datasets = pd.read_csv(path, dtype={"product": "category", "tile": "category"})
+    if "date" in datasets:
+        datasets["date"] = pd.to_datetime(datasets["date"])
+    return datasets
+
+
+def write_datasets(datasets, path):
+    """Write a table of datasets to a Parquet (``.parquet``, see ``read_datasets``) or CSV file."""
+    if str(path).endswith(".parquet"):
+        datasets.to_parquet(path, index=False)
+    else:
+        datasets.to_csv(path, index=False)
+
+
+def files_exist(directory, names):
+    """Check which files exist in a directory with a single scan of the directory.
+
+    Arguments:
+        directory {str} -- The directory. If it does not exist no file exists.
+        names {list or Series} -- File names.
+
+    Returns:
+        array -- Boolean array, ``True`` where the file exists.
+    """
+    try:
+        with os.scandir(directory) as entries:
+            existing = {entry.name for entry in entries if entry.is_file()}
+    except FileNotFoundError:
+        existing = set()
+    return pd.Series(list(names), dtype=object).isin(existing).values
+
+
+def get_coverages_from_hdfs(hdf_paths, metadata_cache=None, max_workers=None):
+    """Get the cloud cover and spatial coverage of many nasa-hls hdf files.
+
+    The metadata is read on a process pool. With a ``metadata_cache`` only files which
+    are not in the cache or changed since they were cached are read.
+
+    Arguments:
+        hdf_paths {list} -- Paths of hdf files.
+
+    Keyword Arguments:
+        metadata_cache {str or MetadataCache} -- Metadata cache or path of its SQLite
+            database or of the directory to keep it in. (default: {None})
+        max_workers {int} -- Number of processes. ``None`` uses the number of CPUs. (default: {None})
+
+    Returns:
+        dataframe -- With the columns ``path``, ``cloud_cover`` and ``spatial_coverage``
+            (``None`` if the metadata could not be read).
+    """
+    fields = ["cloud_cover", "spatial_coverage"]
+    metadata_cache = get_metadata_cache(metadata_cache)
+    if metadata_cache is not None:
+        all_metadata = metadata_cache.read_metadata_batch(hdf_paths, max_workers=max_workers)
+    else:
+        all_metadata = read_metadata_batch(hdf_paths, max_workers=max_workers)
+    coverages = []
+    for row in all_metadata.to_dict("records"):
+        row = {key: value for key, value in row.items() if not pd.isna(value)}
+        if "error" in row:
+            warnings.warn(f"Could not derive cloud cover and spatial coverage from {row['path']}")
+            metadata = {}
+        else:
+            metadata = _select_metadata_fields(row, fields)
+        coverages.append(dict({field: metadata.get(field) for field in fields}, path=row["path"]))
+    return pd.DataFrame(coverages, columns=["path"] + fields)
+
+
+def _get_directories(url, href_match, session=None, index=None):
+    if session is None:
+        session = get_session()
+    METRICS.increment("listing_directories")
+    entry = index.get(url) if index is not None else None
+    if entry is not None and index.is_fresh(entry):
+        METRICS.increment("listing_index_hits")
+        hrefs = entry["hrefs"]
+    else:
+        headers = {}
+        if entry is not None and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry is not None and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        response = session.get(url, headers=headers)
+        if response.status_code == 304:
+            METRICS.increment("listing_not_modified")
+            index.touch(url)
+            hrefs = entry["hrefs"]
+        elif response.status_code in (200, 404):
+            hrefs = _parse_hrefs(response.text) if response.status_code == 200 else []
+            if index is not None:
+                index.put(url, hrefs,
+                          etag=response.headers.get("ETag"),
+                          last_modified=response.headers.get("Last-Modified"))
+        else:
+            warnings.warn(f"Listing {url} failed with status code {response.status_code}.")
+            hrefs = entry["hrefs"] if entry is not None else _parse_hrefs(response.text)
+    return [url + href for href in hrefs if fnmatch.fnmatch(href, href_match)]
+
+
+def _parse_hrefs(page):
     soup = BeautifulSoup(page, 'html.parser')
-    urls = []
+    hrefs = []
     for node in soup.find_all('a'):
         if node.get('href'):
-            href = node.get("href")
-            if fnmatch.fnmatch(href, href_match):
-                urls.append(url + href)
-    return urls
+            hrefs.append(node.get("href"))
+    return hrefs
 
 
-def _get_directories_in_directories(url_list, href_match):
+def _get_directories_in_directories(url_list, href_match,
+                                    max_workers=DEFAULT_MAX_WORKERS, session=None, index=None):
+    if session is None:
+        session = get_session(max_connections=max_workers)
     urls_new = []
-    for url in tqdm(url_list, total=len(url_list)):
-        urls_new += _get_directories(url, href_match)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # map yields the listings in the order of url_list
+        listings = executor.map(
+            lambda url: _get_directories(url, href_match, session=session, index=index),
+            url_list)
+        for urls in tqdm(listings, total=len(url_list)):
+            urls_new += urls
     return urls_new
-
@@ -0,0 +1,227 @@
+import logging
+import pandas as pd
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+import rasterio
+import rasterio.windows
+
+from .metadata import hdf_subdataset_name
+from .names import parse_granule_id
+from .utils import BAND_NAMES
+from .utils import dataframe_from_hdf_paths
+from .utils import get_coverages_from_hdfs
+
+
+log = logging.getLogger(__name__)
+
+GDAL_DATA_TYPES = {"uint8": "Byte", "int8": "Int8", "uint16": "UInt16", "int16": "Int16",
+                   "uint32": "UInt32", "int32": "Int32", "float32": "Float32", "float64": "Float64"}
+
+
+def vrt_xml(sources, descriptions=None, dtype=None, nodata=None, metadata=None, window=None):
+    """Get the XML of a GDAL VRT stacking single bands of other datasets.
+
+    The datasets have to be on the same grid, e.g. the bands (subdatasets) of a
+    nasa-hls hdf file or the same band of different scenes of one tile.
+    Only the first source is opened to get the grid, the others are not read.
+
+    Arguments:
+        sources {list} -- GDAL dataset names, e.g. as returned by
+            ``metadata.hdf_subdataset_name``, each contributing its first band.
+
+    Keyword Arguments:
+        descriptions {list} -- One description per band. (default: {None})
+        dtype {str or list} -- Data type of the VRT bands or one data type per band.
+            ``None`` uses the data type of the first source. (default: {None})
+        nodata {list} -- One nodata value (or ``None``) per band. ``None`` uses the nodata
+            value of the first source for all bands. (default: {None})
+        metadata {dict} -- Dataset metadata items. (default: {None})
+        window {Window} -- Only refer to this pixel window of the sources, i.e. the VRT covers
+            the window. ``None`` refers to the whole sources. (default: {None})
+
+    Returns:
+        str -- The VRT XML.
+    """
+    sources = [str(src) for src in sources]
+    with rasterio.open(sources[0]) as ref:
+        profile = ref.profile
+        crs_wkt = ref.crs.to_wkt() if ref.crs else None
+        geotransform = ref.transform.to_gdal()
+        if window is not None:
+            geotransform = rasterio.windows.transform(window, ref.transform).to_gdal()
+            profile.update(width=int(window.width), height=int(window.height))
+    dtype = dtype or profile["dtype"]
+    if isinstance(dtype, str):
+        dtype = [dtype] * len(sources)
+    if nodata is None:
+        nodata = [profile.get("nodata")] * len(sources)
+
+    lines = [f'<VRTDataset rasterXSize="{profile["width"]}" rasterYSize="{profile["height"]}">']
+    if crs_wkt:
+        lines.append(f"  <SRS>{escape(crs_wkt)}</SRS>")
+    lines.append("  <GeoTransform>" + ", ".join(repr(v) for v in geotransform) + "</GeoTransform>")
+    if metadata:
+        lines.append("  <Metadata>")
+        for key, value in metadata.items():
+            lines.append(f'    <MDI key="{escape(str(key))}">{escape(str(value))}</MDI>')
+        lines.append("  </Metadata>")
+    for i, src in enumerate(sources):
+        lines.append(f'  <VRTRasterBand dataType="{GDAL_DATA_TYPES[str(dtype[i])]}" band="{i + 1}">')
+        if descriptions is not None:
+            lines.append(f"    <Description>{escape(str(descriptions[i]))}</Description>")
+        if nodata[i] is not None:
+            lines.append(f"    <NoDataValue>{nodata[i]!r}</NoDataValue>")
+        lines.append("    <SimpleSource>")
+        lines.append(f'      <SourceFilename relativeToVRT="0">{escape(src)}</SourceFilename>')
+        lines.append("      <SourceBand>1</SourceBand>")
+        if window is not None:
+            lines.append(f'      <SrcRect xOff="{int(window.col_off)}" yOff="{int(window.row_off)}" '
+                         f'xSize="{int(window.width)}" ySize="{int(window.height)}" />')
+            lines.append(f'      <DstRect xOff="0" yOff="0" '
+                         f'xSize="{int(window.width)}" ySize="{int(window.height)}" />')
+        lines.append("    </SimpleSource>")
+        lines.append("  </VRTRasterBand>")
+    lines.append("</VRTDataset>")
+    return "\n".join(lines) + "\n"
+
+
+def write_vrt(path, sources, descriptions=None, dtype=None, nodata=None, metadata=None,
+              window=None):
+    """Write a GDAL VRT stacking single bands of other datasets. See ``vrt_xml``."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(vrt_xml(sources, descriptions=descriptions, dtype=dtype, nodata=nodata,
+                            metadata=metadata, window=window))
+    return path
+
+
+def write_scene_vrt(hdf_path, dstdir, bands=None):
+    """Write a VRT ``<dstdir>/<sceneid>/<sceneid>.vrt`` over the bands of a nasa-hls hdf file.
+
+    The VRT bands refer to the subdatasets of the hdf file, i.e. no pixels are converted.
+    The band descriptions are the long band names, i.e. the VRT can be read with
+    ``hdf2tiff_conversion.read_stack``.
+
+    Arguments:
+        hdf_path {str} -- Path of the hdf file.
+        dstdir {str} -- Destination directory.
+
+    Keyword Arguments:
+        bands {list} -- Long band names. ``None`` means all bands. (default: {None})
+
+    Returns:
+        Path -- Path of the VRT.
+    """
+    hdf_path = Path(hdf_path).resolve()
+    product = parse_granule_id(hdf_path)["product"]
+    long_band_names = [name for name in (bands or BAND_NAMES[product].keys())
+                       if name in BAND_NAMES[product]]
+    sources = [hdf_subdataset_name(str(hdf_path), BAND_NAMES[product][name])
+               for name in long_band_names]
+    dtypes, nodata = [], []
+    for src in sources:
+        with rasterio.open(src) as ds:
+            dtypes.append(ds.dtypes[0])
+            nodata.append(ds.nodata)
+            tags = ds.tags()
+    return write_vrt(Path(dstdir) / hdf_path.stem / f"{hdf_path.stem}.vrt", sources,
+                     descriptions=long_band_names, dtype=dtypes, nodata=nodata, metadata=tags)
+
+
+def write_timeseries_vrts(hdf_paths, dstdir, bands=None):
+    """Write one time series VRT per tile and band over the hdf files of many scenes.
+
+    For each tile and (long) band name a VRT ``<dstdir>/<tile>/<tile>__<band>.vrt``
+    with one VRT band per scene, ordered by date, is written. L30 and S30 scenes are
+    combined by the long band names. The band descriptions are the scene ids.
+    The scenes of the VRT bands are also listed in ``<dstdir>/<tile>/<tile>__timeseries.csv``.
+    The scenes listed there by earlier calls are kept, i.e. new scenes can be added incrementally.
+
+    Arguments:
+        hdf_paths {list} -- Paths of hdf files.
+        dstdir {str} -- Destination directory.
+
+    Keyword Arguments:
+        bands {list} -- Long band names. ``None`` means all bands. (default: {None})
+
+    Returns:
+        dataframe -- One row per tile, band and scene (including the scenes of earlier calls)
+            with the columns ``tile``, ``band``, ``vrt``, ``band_index`` (1-based), ``sceneid``,
+            ``product``, ``date`` and ``path``.
+    """
+    hdf_paths = [str(Path(p).resolve()) for p in hdf_paths]
+    scenes = dataframe_from_hdf_paths(hdf_paths)
+    # add the scenes of earlier calls, i.e. a tile's time series grows with each batch
+    previous = [pd.read_csv(Path(dstdir) / tile / f"{tile}__timeseries.csv", usecols=["sceneid", "path"])
+                for tile in scenes["tile"].unique()
+                if (Path(dstdir) / tile / f"{tile}__timeseries.csv").exists()]
+    if previous:
+        previous = pd.concat(previous)
+        previous = previous[~previous["sceneid"].isin(scenes["sceneid"])]
+        scenes = dataframe_from_hdf_paths(list(previous["path"].unique()) + hdf_paths)
+    scenes = scenes.drop_duplicates("sceneid", keep="last").sort_values(["tile", "date", "product"])
+    if bands is None:
+        bands = list(dict.fromkeys(list(BAND_NAMES["S30"]) + list(BAND_NAMES["L30"])))
+    index = []
+    for tile, scenes_tile in scenes.groupby("tile", sort=True, observed=True):
+        dstdir_tile = Path(dstdir) / tile
+        for band in bands:
+            scenes_band = scenes_tile[scenes_tile["product"].map(lambda pr: band in BAND_NAMES[pr])]
+            if scenes_band.empty:
+                continue
+            sources = [hdf_subdataset_name(row.path, BAND_NAMES[row.product][band])
+                       for row in scenes_band.itertuples()]
+            path_vrt = write_vrt(dstdir_tile / f"{tile}__{band}.vrt", sources,
+                                 descriptions=list(scenes_band["sceneid"]))
+            for band_index, row in enumerate(scenes_band.itertuples(), start=1):
+                index.append({"tile": tile, "band": band, "vrt": str(path_vrt),
+                              "band_index": band_index, "sceneid": row.sceneid,
+                              "product": row.product, "date": row.date, "path": row.path})
+        pd.DataFrame([r for r in index if r["tile"] == tile]) \
+            .to_csv(dstdir_tile / f"{tile}__timeseries.csv", index=False)
+    return pd.DataFrame(index, columns=["tile", "band", "vrt", "band_index", "sceneid",
+                                        "product", "date", "path"])
+
+
+def write_vrt_catalog(hdf_paths, dstdir, bands=None, max_cloud_coverage=100, metadata_cache=None):
+    """Write scene VRTs and time series VRTs for many nasa-hls hdf files.
+
+    This is a zero-conversion alternative to ``hdf2tiff_conversion.convert_hdf2tiffs_batch``:
+    The data stays in the hdf files and is read lazily through the VRTs.
+    See ``write_scene_vrt`` and ``write_timeseries_vrts``.
+
+    Keyword Arguments:
+        bands {list} -- Long band names. ``None`` means all bands. (default: {None})
+        max_cloud_coverage {float} -- Skip scenes with a higher cloud cover. (default: {100})
+        metadata_cache {str or MetadataCache} -- See ``utils.get_coverages_from_hdfs``.
+            (default: {None})
+
+    Returns:
+        dataframe -- One row per hdf file with the columns ``path``, ``vrt``,
+            ``status`` (``'written'``, ``'skipped'`` or ``'failed'``) and ``error``.
+    """
+    hdf_paths = [str(hdf_path) for hdf_path in hdf_paths]
+    cloud_cover = [None] * len(hdf_paths)
+    if max_cloud_coverage < 100:
+        cloud_cover = list(get_coverages_from_hdfs(hdf_paths, metadata_cache=metadata_cache)
+                           ["cloud_cover"])
+    results = []
+    for hdf_path, cc in zip(hdf_paths, cloud_cover):
+        result = {"path": hdf_path, "vrt": None, "status": "written", "error": None}
+        if cc is not None and not pd.isna(cc) and cc > max_cloud_coverage:
+            log.debug(f"SKIPPING VRT - TOO HIGH CLOUD COVER: {cc}")
+            result["status"] = "skipped"
+        else:
+            try:
+                result["vrt"] = str(write_scene_vrt(hdf_path, dstdir, bands=bands))
+            except Exception as exc:
+                log.exception(f"ERROR DURING VRT CREATION OF {hdf_path}.")
+                result["status"] = "failed"
+                result["error"] = str(exc)
+        results.append(result)
+    results = pd.DataFrame(results, columns=["path", "vrt", "status", "error"])
+    written = results.loc[results["status"] == "written", "path"]
+    if not written.empty:
+        write_timeseries_vrts(written, dstdir, bands=bands)
+    return results
@@ -22,15 +22,18 @@ setup(
     author='Benjamin Mack',
     author_email='ben8mack@gmail.com',
     description='Download data from NASA\'s Harmonized Landsat and Sentinel-2 project.',
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
     install_requires=parse_requirements("requirements.txt"),
     setup_requires=["pytest-runner"],
     tests_require=['pytest'],
+    extras_require={'benchmarks': ['pytest-benchmark'], 'parquet': ['pyarrow']},
     include_package_data=True,
     entry_points='''
         [console_scripts]
         hls_query=nasa_hls.scripts.query:query
         hls_download=nasa_hls.scripts.download:download
         hls_convert_batch=nasa_hls.scripts.convert:convert_batch
+        hls_pipeline=nasa_hls.scripts.pipeline:pipeline
+        hls_scene_stats=nasa_hls.scripts.scene_stats:scene_stats
     ''',
 )
\ No newline at end of file
@@ -0,0 +1,28 @@
+import importlib
+import pkgutil
+import sys
+
+import pytest
+
+import nasa_hls
+
+from .hls_fixtures import fake_subdataset_name
+from .hls_server import HLSServer
+
+
+@pytest.fixture
+def hls_server():
+    server = HLSServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def fake_hdfs(monkeypatch):
+    """Resolve hdf subdatasets to the GeoTIFFs written by ``hls_fixtures.write_fake_hdf``."""
+    # the submodules are imported lazily, load them all to patch them
+    for module in pkgutil.iter_modules(nasa_hls.__path__):
+        importlib.import_module(f"nasa_hls.{module.name}")
+    for name, module in list(sys.modules.items()):
+        if name.startswith("nasa_hls") and hasattr(module, "hdf_subdataset_name"):
+            monkeypatch.setattr(module, "hdf_subdataset_name", fake_subdataset_name)
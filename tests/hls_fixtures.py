@@ -0,0 +1,59 @@
+"""Synthetic HLS-like rasters for the tests."""
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+# an upper left corner on the 60 m grid of UTM zone 32 (not the one of tile 32UNU)
+CRS = "EPSG:32632"
+TRANSFORM = from_origin(499980, 5900040, 30, 30)
+
+
+def write_geotiff(path, array, tags=None, **profile):
+    """Write a (bands, rows, cols) or (rows, cols) array georeferenced in UTM zone 32."""
+    array = np.asarray(array)
+    if array.ndim == 2:
+        array = array[np.newaxis]
+    kwargs = dict(driver="GTiff", width=array.shape[2], height=array.shape[1],
+                  count=array.shape[0], dtype=array.dtype, crs=CRS, transform=TRANSFORM)
+    kwargs.update(profile)
+    with rasterio.open(path, "w", **kwargs) as dst:
+        dst.write(array)
+        if tags:
+            dst.update_tags(**tags)
+    return path
+
+
+def write_fake_hdf(directory, sceneid, shape=(64, 64), cloud_coverage=10, seed=0, **profile):
+    """Write an empty ``<sceneid>.hdf`` file and one GeoTIFF per band standing in for its subdatasets.
+
+    ``profile`` is passed to ``write_geotiff``, e.g. for a tiled layout.
+
+    Returns:
+        Path -- Path of the .hdf file. See ``fake_subdataset_name`` for resolving the subdatasets.
+    """
+    from pathlib import Path
+    from nasa_hls.utils import BAND_NAMES
+
+    rng = np.random.default_rng(seed)
+    directory = Path(directory)
+    product = sceneid.split(".")[1]
+    subdataset_dir = directory / "subdatasets" / sceneid
+    subdataset_dir.mkdir(parents=True, exist_ok=True)
+    tags = {"cloud_coverage": str(cloud_coverage), "spatial_coverage": "100"}
+    for band in BAND_NAMES[product].values():
+        if band == "QA":
+            array = rng.choice(np.array([0, 64, 66, 72, 96, 255], dtype="uint8"), size=shape,
+                               p=[.05, .6, .15, .1, .05, .05])
+        else:
+            array = rng.integers(0, 10000, size=shape).astype("int16")
+        write_geotiff(subdataset_dir / f"{band}.tif", array, tags=tags, **profile)
+    path = directory / f"{sceneid}.hdf"
+    path.write_bytes(b"")
+    return path
+
+
+def fake_subdataset_name(src, band="QA"):
+    """Resolve the subdatasets of a hdf file written by ``write_fake_hdf``."""
+    from pathlib import Path
+    src = Path(src)
+    return str(src.parent / "subdatasets" / src.stem / f"{band}.tif")
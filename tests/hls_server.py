@@ -0,0 +1,165 @@
+"""A local HTTP stand-in for https://hls.gsfc.nasa.gov/data serving fake HLS directory listings."""
+import collections
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+from nasa_hls.utils import parse_url
+
+
+def hls_file_path(sceneid):
+    """Get the path relative to the data root of a granule, e.g. 'HLS.L30.T32UNU.2017007.v1.4'."""
+    _, product, tile, date_yj, version = sceneid.split(".", 4)
+    url = parse_url(date_yj, tile=tile[1:], product=product, version=version, base_url="")
+    return url[1:]
+
+
+class HLSServer(object):
+    """Serve ``files`` (relative path -> bytes) below ``/data/`` with directory listings.
+
+    Directories are listed as an html page with one link per child.
+    Paths that do not exist are answered with 404.
+    Responses carry an ``ETag`` and ``If-None-Match`` requests are answered with 304.
+    Range requests of the form ``bytes=<start>-`` are answered with 206, or with 200 and the
+    whole file if an ``If-Range`` header does not match the ETag. A range starting at or beyond
+    the end of the file is answered with 416 and ``Content-Range: bytes */<size>``.
+
+    ``fail_next[path] = n`` answers the next ``n`` requests of ``path`` with 503 and
+    ``truncate_next[path] = n`` drops the connection of the next request of ``path``
+    after ``n`` bytes of the body.
+
+    ``latency`` (seconds) delays every response and ``bandwidth`` (bytes per second)
+    throttles the bodies of each connection, e.g. to benchmark against a realistic server.
+    """
+    def __init__(self, files=None, latency=0, bandwidth=None):
+        self.files = dict(files or {})
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = []
+        self.statuses = []
+        self.fail_next = collections.Counter()
+        self.truncate_next = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/data"
+
+    def add_granule(self, sceneid, content=b"hdf", header=b"hdr"):
+        """Add the .hdf and .hdf.hdr files of a granule, e.g. 'HLS.L30.T32UNU.2017007.v1.4'."""
+        path = hls_file_path(sceneid)
+        self.files[path] = content
+        self.files[path + ".hdr"] = header
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _listing(self, directory):
+        children = set()
+        for path in self.files:
+            if path.startswith(directory):
+                rest = path[len(directory):]
+                child = rest.split("/")[0] + ("/" if "/" in rest else "")
+                children.add(child)
+        if not children:
+            return None
+        links = "\n".join(f'<a href="{child}">{child}</a>' for child in sorted(children))
+        return f"<html><body><a href=\"../\">Parent Directory</a>\n{links}\n</body></html>".encode()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests.append(self.path)
+                    failures = server.fail_next[self.path]
+                    if failures:
+                        server.fail_next[self.path] -= 1
+                    truncate_at = server.truncate_next.pop(self.path, None)
+                if server.latency:
+                    time.sleep(server.latency)
+                if failures:
+                    self._respond(503)
+                    return
+                if not self.path.startswith("/data/"):
+                    self._respond(404)
+                    return
+                path = self.path[len("/data/"):]
+                if path.endswith("/") or path == "":
+                    body = server._listing(path)
+                    content_type = "text/html"
+                else:
+                    body = server.files.get(path)
+                    content_type = "application/octet-stream"
+                if body is None:
+                    self._respond(404)
+                    return
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self._respond(304)
+                    return
+                size = len(body)
+                byte_range = self.headers.get("Range")
+                if self.headers.get("If-Range") not in (None, etag):
+                    # the file changed, send all of it
+                    byte_range = None
+                if byte_range is not None:
+                    start = int(byte_range.replace("bytes=", "").split("-")[0])
+                    if start >= size:
+                        self._respond(416)
+                        self.send_header("Content-Range", f"bytes */{size}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    body = body[start:]
+                    self._respond(206)
+                    self.send_header("Content-Range", f"bytes {start}-{size - 1}/{size}")
+                else:
+                    self._respond(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                if truncate_at is not None:
+                    self.wfile.write(body[:truncate_at])
+                    self.close_connection = True
+                elif server.bandwidth:
+                    self._write_throttled(body)
+                else:
+                    self.wfile.write(body)
+
+            def _write_throttled(self, body, chunk_size=16384):
+                start = time.perf_counter()
+                for offset in range(0, len(body), chunk_size):
+                    chunk = body[offset:offset + chunk_size]
+                    # send a chunk not before it would have been transferred completely
+                    ahead = (offset + len(chunk)) / server.bandwidth - (time.perf_counter() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+                    self.wfile.write(chunk)
+
+            def _respond(self, status):
+                with server._lock:
+                    server.statuses.append((self.path, status))
+                if status in (200, 206, 416):
+                    self.send_response(status)
+                elif status == 304:
+                    self.send_response(status)
+                    self.end_headers()
+                else:
+                    self.send_error(status)
+
+        return Handler
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import rasterio
+import warnings
+
+from nasa_hls import composite
+from nasa_hls import utils
+
+from .hls_fixtures import write_fake_hdf
+
+
+def _read_bands(tmp_path, sceneid, bands):
+    arrays = []
+    for band in bands:
+        with rasterio.open(tmp_path / "subdatasets" / sceneid / f"{band}.tif") as src:
+            arrays.append(src.read(1).astype("float64"))
+    return np.stack(arrays)
+
+
+@pytest.fixture
+def scenes(tmp_path):
+    hdf_paths = [write_fake_hdf(tmp_path, "HLS.L30.T32UNU.2017007.v1.4", shape=(40, 50), seed=1),
+                 write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017009.v1.4", shape=(40, 50), seed=2),
+                 write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017019.v1.4", shape=(40, 50), seed=3)]
+    return utils.dataframe_from_hdf_paths([str(p) for p in hdf_paths])
+
+
+def _expected(tmp_path, method):
+    data = np.stack([_read_bands(tmp_path, "HLS.L30.T32UNU.2017007.v1.4", ["band04", "band05"]),
+                     _read_bands(tmp_path, "HLS.S30.T32UNU.2017009.v1.4", ["B04", "B8A"]),
+                     _read_bands(tmp_path, "HLS.S30.T32UNU.2017019.v1.4", ["B04", "B8A"])])
+    qa = np.stack([_read_bands(tmp_path, sceneid, ["QA"])[0] for sceneid in
+                   ["HLS.L30.T32UNU.2017007.v1.4", "HLS.S30.T32UNU.2017009.v1.4",
+                    "HLS.S30.T32UNU.2017019.v1.4"]]).astype("uint8")
+    valid = (qa & 0b1110) == 0
+    count = valid.sum(axis=0)
+    if method == "max_ndvi":
+        ndvi = np.where(valid, (data[:, 1] - data[:, 0]) / (data[:, 1] + data[:, 0]), -np.inf)
+        best = np.argmax(ndvi, axis=0)
+        result = np.take_along_axis(data, best[np.newaxis, np.newaxis], axis=0)[0]
+    else:
+        masked = np.where(valid[:, np.newaxis], data, np.nan)
+        with np.errstate(all="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            result = np.nanmedian(masked, axis=0) if method == "median" else np.nanmean(masked, axis=0)
+    result = np.where(count > 0, np.round(result), -1000)
+    return np.concatenate([result, count[np.newaxis]])
+
+
+@pytest.mark.parametrize("method, max_workers", [("median", 1), ("mean", 2), ("max_ndvi", 2)])
+def test_composite(tmp_path, fake_hdfs, scenes, method, max_workers):
+    dst = composite.write_composite(scenes, tmp_path / "composite.tif", ["Red", "NIR"], method=method,
+                                    block_size=16, max_workers=max_workers)
+    with rasterio.open(dst) as src:
+        assert src.descriptions == ("Red", "NIR", "count")
+        assert src.driver == "GTiff" and src.tags(ns="IMAGE_STRUCTURE")["LAYOUT"] == "COG"
+        assert np.array_equal(src.read(), _expected(tmp_path, method))
+    assert not (tmp_path / "composite.tif.tmp.tif").exists()
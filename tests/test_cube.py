@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+import rasterio
+
+from nasa_hls import cube
+from nasa_hls import hdf2tiff_conversion
+from nasa_hls import utils
+
+from .hls_fixtures import write_fake_hdf
+
+
+@pytest.fixture
+def hdf_paths(tmp_path):
+    return [write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017009.v1.4", seed=1),
+            write_fake_hdf(tmp_path, "HLS.L30.T32UNU.2017007.v1.4", seed=2),
+            write_fake_hdf(tmp_path, "HLS.L30.T32UNU.2017200.v1.4", seed=3)]
+
+
+def _subdataset(tmp_path, sceneid, band):
+    with rasterio.open(tmp_path / "subdatasets" / sceneid / f"{band}.tif") as src:
+        return src.read(1)
+
+
+def test_read_cube_from_hdfs(tmp_path, fake_hdfs, hdf_paths):
+    scenes = utils.dataframe_from_hdf_paths([str(p) for p in hdf_paths])
+    data, scenes_cube = cube.read_cube(scenes, ["Red", "QA"], end_date="2017-06-30",
+                                       window=(8, 4, 16, 32), qa_valid=[64])
+    assert data.shape == (2, 2, 32, 16)
+    assert list(scenes_cube["sceneid"]) == ["HLS.L30.T32UNU.2017007.v1.4",
+                                            "HLS.S30.T32UNU.2017009.v1.4"]
+    red = _subdataset(tmp_path, "HLS.S30.T32UNU.2017009.v1.4", "B04")[4:36, 8:24]
+    qa = _subdataset(tmp_path, "HLS.S30.T32UNU.2017009.v1.4", "QA")[4:36, 8:24]
+    assert np.array_equal(data[1, 1], qa)
+    assert np.array_equal(data[1, 0], np.where((qa == 64) | (qa == 255), red, -1000))
+
+
+def test_read_cube_from_converted_directory(tmp_path, fake_hdfs, hdf_paths):
+    hdf2tiff_conversion.convert_hdf2tiffs(hdf_paths[0], tmp_path / "out", bands=["Red", "QA"])
+    hdf2tiff_conversion.convert_hdf2tiffs(hdf_paths[1], tmp_path / "out", bands=["Red", "QA"],
+                                          stack=True)
+    data, scenes = cube.read_cube(tmp_path / "out", ["QA", "Red"], bounds=(500940, 5899080, 501900, 5900040),
+                                  out=tmp_path / "cube.npy")
+    assert isinstance(data, np.memmap)
+    assert data.shape == (2, 2, 32, 32)
+    assert list(scenes["sceneid"]) == ["HLS.L30.T32UNU.2017007.v1.4",
+                                       "HLS.S30.T32UNU.2017009.v1.4"]
+    red = _subdataset(tmp_path, "HLS.L30.T32UNU.2017007.v1.4", "band04")[0:32, 32:64]
+    assert np.array_equal(np.load(tmp_path / "cube.npy")[0, 1], red)
+
+    with pytest.raises(ValueError, match="Red_Edge1"):
+        cube.read_cube(tmp_path / "out", ["Red_Edge1"])
@@ -0,0 +1,170 @@
+import hashlib
+import time
+
+import pandas as pd
+import pytest
+
+from nasa_hls import download_hls_dataset
+
+from .hls_server import hls_file_path
+
+
+@pytest.fixture
+def server(hls_server):
+    hls_server.add_granule("HLS.L30.T32UNU.2017007.v1.4", content=b"x" * 5000, header=b"hdr")
+    hls_server.add_granule("HLS.S30.T32UNU.2017009.v1.4", content=b"y" * 7000, header=b"hdr")
+    return hls_server
+
+
+def _datasets():
+    return pd.DataFrame({"date": pd.to_datetime(["2017-01-07", "2017-01-09", "2017-01-11"]),
+                         "tile": ["32UNU"] * 3,
+                         "product": ["L30", "S30", "S30"]})
+
+
+def test_download_batch_result_table(server, tmp_path):
+    results = download_hls_dataset.download_batch(tmp_path, _datasets(), max_workers=3,
+                                                  base_url=server.base_url)
+    assert list(results["status"]) == ["downloaded", "downloaded", "failed"]
+    assert list(results["bytes"]) == [5003, 7003, 0]
+    assert "404" in results["error"][2]
+    assert not (tmp_path / "HLS.S30.T32UNU.2017011.v1.4.hdf").exists()
+    assert (tmp_path / "HLS.S30.T32UNU.2017009.v1.4.hdf").read_bytes() == b"y" * 7000
+    assert (tmp_path / "HLS.S30.T32UNU.2017009.v1.4.hdf.hdr").read_bytes() == b"hdr"
+
+    results = download_hls_dataset.download_batch(tmp_path, _datasets()[:2],
+                                                  base_url=server.base_url)
+    assert list(results["status"]) == ["skipped", "skipped"]
+
+
+def test_interrupted_download_is_resumed(server, tmp_path):
+    path = "/data/v1.4/L30/2017/32/U/N/U/HLS.L30.T32UNU.2017007.v1.4.hdf"
+    dst = tmp_path / "HLS.L30.T32UNU.2017007.v1.4.hdf"
+    server.truncate_next[path] = 3000
+    result = download_hls_dataset.download(tmp_path, "2017-01-07", "32UNU", "L30",
+                                           chunk_size=1000, base_url=server.base_url)
+    assert result["status"] == "failed"
+    assert not dst.exists()
+    assert (tmp_path / (dst.name + ".part")).stat().st_size == 3000
+
+    result = download_hls_dataset.download(tmp_path, "2017-01-07", "32UNU", "L30",
+                                           base_url=server.base_url)
+    assert result["status"] == "downloaded"
+    assert result["bytes"] == 2000
+    assert server.statuses[-1] == (path, 206)
+    assert dst.read_bytes() == b"x" * 5000
+    assert not (tmp_path / (dst.name + ".part")).exists()
+
+
+def test_download_batch_prefilters_with_hdr(server, tmp_path):
+    server.add_granule("HLS.L30.T32UNU.2017007.v1.4", content=b"x" * 5000,
+                       header=b"ENVI\ncloud_coverage = 80\nspatial_coverage = 100\n")
+    server.add_granule("HLS.S30.T32UNU.2017009.v1.4", content=b"y" * 7000,
+                       header=b"ENVI\nband names = {B01}\n")
+    server.add_granule("HLS.S30.T32UNU.2017011.v1.4",
+                       content=b"\x00cloud_coverage=10\x00spatial_coverage=40\x00" + b"z" * 5000,
+                       header=b"ENVI\n")
+    results = download_hls_dataset.download_batch(tmp_path, _datasets(),
+                                                  max_cloud_coverage=50,
+                                                  min_spatial_coverage=50,
+                                                  metadata_bytes=100,
+                                                  base_url=server.base_url)
+    assert list(results["status"]) == ["filtered", "downloaded", "filtered"]
+    assert list(results["cloud_cover"].fillna(-1)) == [80, -1, 10]
+    assert not (tmp_path / "HLS.L30.T32UNU.2017007.v1.4.hdf").exists()
+    assert (tmp_path / "HLS.L30.T32UNU.2017007.v1.4.hdf.hdr").exists()
+
+
+@pytest.mark.parametrize("max_cloud_coverage", [None, 50])
+def test_download_without_hdr(server, tmp_path, max_cloud_coverage):
+    sceneid = "HLS.S30.T32UNU.2017011.v1.4"
+    server.add_granule(sceneid, content=b"\x00cloud_coverage=10\x00" + b"z" * 5000)
+    del server.files[hls_file_path(sceneid) + ".hdr"]
+    result = download_hls_dataset.download(tmp_path, "2017-01-11", "32UNU", "S30",
+                                           max_cloud_coverage=max_cloud_coverage,
+                                           metadata_bytes=100, base_url=server.base_url)
+    assert result["status"] == "downloaded"
+    assert result["error"] is None
+    assert (tmp_path / f"{sceneid}.hdf").exists()
+    assert not (tmp_path / f"{sceneid}.hdf.hdr").exists()
+    if max_cloud_coverage is not None:
+        # prefiltered with a Range request of the metadata block of the hdf file
+        assert result["cloud_cover"] == 10
+        assert (f"/data/{hls_file_path(sceneid)}", 206) in server.statuses
+
+
+def test_server_latency_and_bandwidth(server, tmp_path):
+    server.latency = 0.05
+    server.bandwidth = 50000
+    start = time.perf_counter()
+    result = download_hls_dataset.download(tmp_path, "2017-01-09", "32UNU", "S30",
+                                           base_url=server.base_url)
+    assert result["status"] == "downloaded"
+    # two requests (.hdf and .hdf.hdr) and 7000 bytes at 50 kB/s
+    assert time.perf_counter() - start >= 2 * 0.05 + 7000 / 50000
+
+
+def test_interrupted_download_of_changed_file_starts_over(server, tmp_path):
+    sceneid = "HLS.L30.T32UNU.2017007.v1.4"
+    path = f"/data/{hls_file_path(sceneid)}"
+    dst = tmp_path / f"{sceneid}.hdf"
+    server.truncate_next[path] = 3000
+    result = download_hls_dataset.download(tmp_path, "2017-01-07", "32UNU", "L30",
+                                           chunk_size=1000, base_url=server.base_url)
+    assert result["status"] == "failed"
+    assert (tmp_path / f"{dst.name}.part.validator").exists()
+
+    # reprocessed, same size
+    server.add_granule(sceneid, content=b"r" * 5000, header=b"hdr")
+    result = download_hls_dataset.download(tmp_path, "2017-01-07", "32UNU", "L30",
+                                           base_url=server.base_url)
+    assert result["status"] == "downloaded"
+    assert (path, 200) in server.statuses[-2:]
+    assert dst.read_bytes() == b"r" * 5000
+    assert not (tmp_path / f"{dst.name}.part").exists()
+    assert not (tmp_path / f"{dst.name}.part.validator").exists()
+
+
+@pytest.mark.parametrize("part_size", [5000, 6000])
+def test_complete_part_file_is_not_downloaded_again(server, tmp_path, part_size):
+    sceneid = "HLS.L30.T32UNU.2017007.v1.4"
+    path = f"/data/{hls_file_path(sceneid)}"
+    dst = tmp_path / f"{sceneid}.hdf"
+    # e.g. interrupted before the rename
+    (tmp_path / f"{dst.name}.part").write_bytes(b"x" * part_size)
+    (tmp_path / f"{dst.name}.part.validator").write_text('"' + hashlib.md5(b"x" * 5000).hexdigest() + '"')
+    result = download_hls_dataset.download(tmp_path, "2017-01-07", "32UNU", "L30",
+                                           base_url=server.base_url)
+    assert result["status"] == "downloaded"
+    assert (path, 416) in server.statuses
+    assert dst.read_bytes() == b"x" * 5000
+    assert not (tmp_path / f"{dst.name}.part.validator").exists()
+    if part_size == 5000:
+        assert (path, 200) not in server.statuses
+    else:
+        assert (path, 200) in server.statuses
+
+
+@pytest.mark.filterwarnings("ignore:Could not derive")
+def test_hls_download_cli_keeps_prefilter_coverages(server, tmp_path, monkeypatch):
+    from functools import partial
+
+    from click.testing import CliRunner
+    import nasa_hls
+    from nasa_hls.scripts.download import download as cli
+
+    server.add_granule("HLS.L30.T32UNU.2017007.v1.4", content=b"x" * 5000,
+                       header=b"ENVI\ncloud_coverage = 80\nspatial_coverage = 100\n")
+    monkeypatch.setattr(nasa_hls, "download_batch",
+                        partial(download_hls_dataset.download_batch, base_url=server.base_url))
+    datasets = _datasets()[:2]
+    datasets["url"] = [f"{server.base_url}/HLS.L30.T32UNU.2017007.v1.4.hdf",
+                       f"{server.base_url}/HLS.S30.T32UNU.2017009.v1.4.hdf"]
+    datasets.to_csv(tmp_path / "query.csv", index=False)
+    result = CliRunner().invoke(cli, ["-p", str(tmp_path / "query.csv"), "-d", str(tmp_path / "hdf"),
+                                      "-c", "50"])
+    assert result.exit_code == 0, result.output
+    downloaded = pd.read_csv(next((tmp_path / "hdf").glob("datasets_downloaded_*.csv")))
+    assert list(downloaded["status"]) == ["filtered", "downloaded"]
+    assert list(downloaded["cloud_cover"].fillna(-1)) == [80, -1]
+    assert list(downloaded["spatial_coverage"].fillna(-1)) == [100, -1]
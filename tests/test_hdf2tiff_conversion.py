@@ -0,0 +1,183 @@
+import numpy as np
+import pytest
+import rasterio
+import rasterio.warp
+import shutil
+from rasterio.windows import Window
+
+from nasa_hls import hdf2tiff_conversion
+
+from .hls_fixtures import write_fake_hdf
+
+
+def test_convert_hdf2tiffs(tmp_path, fake_hdfs):
+    hdf_path = write_fake_hdf(tmp_path, "HLS.L30.T32UNU.2017007.v1.4")
+    dstdir = hdf2tiff_conversion.convert_hdf2tiffs(hdf_path, tmp_path / "out",
+                                                   bands=["Red", "QA", "Unknown"],
+                                                   creation_options={"TILED": "YES",
+                                                                     "BLOCKXSIZE": 32,
+                                                                     "BLOCKYSIZE": 32,
+                                                                     "COMPRESS": "DEFLATE"})
+    assert dstdir == tmp_path / "out" / "HLS.L30.T32UNU.2017007.v1.4"
+    assert sorted(p.name for p in dstdir.iterdir()) == \
+        ["HLS.L30.T32UNU.2017007.v1.4__QA.tif", "HLS.L30.T32UNU.2017007.v1.4__Red.tif"]
+    with rasterio.open(dstdir / "HLS.L30.T32UNU.2017007.v1.4__Red.tif") as dst, \
+            rasterio.open(tmp_path / "subdatasets" / "HLS.L30.T32UNU.2017007.v1.4" / "band04.tif") as src:
+        assert np.array_equal(dst.read(), src.read())
+        assert dst.profile["compress"] == "deflate"
+        assert dst.block_shapes == [(32, 32)]
+        assert dst.tags()["cloud_coverage"] == "10"
+
+
+def test_convert_hdf2tiffs_skips_cloudy_scenes(tmp_path, fake_hdfs):
+    hdf_path = write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017007.v1.4", cloud_coverage=90)
+    assert hdf2tiff_conversion.convert_hdf2tiffs(hdf_path, tmp_path / "out",
+                                                 max_cloud_coverage=80) is None
+    assert not (tmp_path / "out").exists()
+
+
+def test_convert_hdf2tiffs_batch_status_table(tmp_path, fake_hdfs):
+    hdf_paths = [write_fake_hdf(tmp_path, "HLS.L30.T32UNU.2017007.v1.4"),
+                 write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017009.v1.4", cloud_coverage=90),
+                 write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017011.v1.4")]
+    (tmp_path / "subdatasets" / "HLS.S30.T32UNU.2017011.v1.4" / "B04.tif").unlink()
+    df = hdf2tiff_conversion.convert_hdf2tiffs_batch(hdf_paths, tmp_path / "out",
+                                                     bands=["Red", "QA"],
+                                                     max_cloud_coverage=50,
+                                                     max_workers=2, gdal_cache_max=64)
+    assert list(df["path"]) == [str(p) for p in hdf_paths]
+    assert list(df["status"]) == ["converted", "skipped", "failed"]
+    assert df.loc[2, "error"].startswith("Red: ")
+    assert (tmp_path / "out" / "HLS.S30.T32UNU.2017011.v1.4" /
+            "HLS.S30.T32UNU.2017011.v1.4__QA.tif").exists()
+
+
+def test_convert_hdf2tiffs_batch_default_workers(tmp_path, fake_hdfs):
+    hdf_path = write_fake_hdf(tmp_path, "HLS.L30.T32UNU.2017007.v1.4")
+    df = hdf2tiff_conversion.convert_hdf2tiffs_batch([hdf_path], tmp_path / "out", bands=["QA"],
+                                                     max_workers=None)
+    assert list(df["status"]) == ["converted"]
+
+
+@pytest.mark.parametrize("store, metadata_cache", [(False, True), (True, False), (True, True)])
+def test_convert_hdf2tiffs_batch_skips_cloudy_scenes(tmp_path, fake_hdfs, store, metadata_cache):
+    hdf_paths = [write_fake_hdf(tmp_path, "HLS.L30.T32UNU.2017007.v1.4"),
+                 write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017009.v1.4", cloud_coverage=90)]
+    df = hdf2tiff_conversion.convert_hdf2tiffs_batch(hdf_paths, tmp_path / "out", bands=["QA"],
+                                                     max_cloud_coverage=50, store=store,
+                                                     metadata_cache=tmp_path if metadata_cache else None)
+    assert list(df["status"]) == ["converted", "skipped"]
+
+
+@pytest.mark.parametrize("interleave", ["band", "pixel"])
+def test_convert_hdf2tiffs_stack(tmp_path, fake_hdfs, interleave):
+    hdf_path = write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017007.v1.4")
+    dstdir = hdf2tiff_conversion.convert_hdf2tiffs(hdf_path, tmp_path / "out",
+                                                   bands=["Red", "NIR_Narrow", "QA"],
+                                                   stack=True, interleave=interleave)
+    path = dstdir / "HLS.S30.T32UNU.2017007.v1.4.tif"
+    assert [p.name for p in dstdir.iterdir()] == [path.name]
+    with rasterio.open(path) as src:
+        assert src.descriptions == ("Red", "NIR_Narrow", "QA")
+        assert src.dtypes == ("int16", ) * 3
+        assert src.interleaving.value.lower() == interleave
+        assert src.tags()["cloud_coverage"] == "10"
+
+    arr = hdf2tiff_conversion.read_stack(path, bands=["QA", "Red"],
+                                         window=Window(8, 4, 16, 16))
+    subdatasets = tmp_path / "subdatasets" / "HLS.S30.T32UNU.2017007.v1.4"
+    with rasterio.open(subdatasets / "QA.tif") as qa, rasterio.open(subdatasets / "B04.tif") as red:
+        assert np.array_equal(arr[0], qa.read(1, window=Window(8, 4, 16, 16)))
+        assert np.array_equal(arr[1], red.read(1, window=Window(8, 4, 16, 16)))
+    with pytest.raises(ValueError, match="not in"):
+        hdf2tiff_conversion.read_stack(path, bands=["Blue"])
+
+
+@pytest.mark.parametrize("stack", [False, True])
+def test_convert_hdf2tiffs_window(tmp_path, fake_hdfs, stack):
+    sceneid = "HLS.L30.T32UNU.2017007.v1.4"
+    hdf_path = write_fake_hdf(tmp_path, sceneid, shape=(128, 128), tiled=True,
+                              blockxsize=32, blockysize=32)
+    # extended to the 32 x 32 blocks
+    expected = Window(32, 0, 64, 64)
+    subdatasets = tmp_path / "subdatasets" / sceneid
+    with rasterio.open(subdatasets / "band04.tif") as src:
+        left, top = src.transform * (40, 10)
+        right, bottom = src.transform * (70, 50)
+        red = src.read(1, window=expected)
+        expected_transform = src.window_transform(expected)
+
+    for kwargs in [{"window": (40, 10, 30, 40)}, {"bounds": (left, bottom, right, top)}]:
+        dstdir = hdf2tiff_conversion.convert_hdf2tiffs(hdf_path, tmp_path / "out", bands=["Red", "QA"],
+                                                       stack=stack, **kwargs)
+        path = dstdir / (f"{sceneid}.tif" if stack else f"{sceneid}__Red.tif")
+        with rasterio.open(path) as dst:
+            assert (dst.width, dst.height) == (64, 64)
+            assert dst.transform == expected_transform
+            assert np.array_equal(dst.read(1), red)
+        path.unlink()
+
+
+@pytest.mark.parametrize("stack", [False, True])
+def test_convert_hdf2tiffs_other_window_is_converted_again(tmp_path, fake_hdfs, stack):
+    sceneid = "HLS.L30.T32UNU.2017007.v1.4"
+    hdf_path = write_fake_hdf(tmp_path, sceneid, shape=(128, 128), tiled=True,
+                              blockxsize=32, blockysize=32)
+    with rasterio.open(tmp_path / "subdatasets" / sceneid / "band04.tif") as src:
+        red = src.read(1)
+
+    path = tmp_path / "out" / sceneid / (f"{sceneid}.tif" if stack else f"{sceneid}__Red.tif")
+    for window, expected in [((0, 0, 32, 32), Window(0, 0, 32, 32)),
+                             ((40, 10, 30, 40), Window(32, 0, 64, 64)),
+                             (None, Window(0, 0, 128, 128))]:
+        hdf2tiff_conversion.convert_hdf2tiffs(hdf_path, tmp_path / "out", bands=["Red", "QA"],
+                                              stack=stack, window=window)
+        with rasterio.open(path) as dst:
+            assert (dst.width, dst.height) == (expected.width, expected.height)
+            assert np.array_equal(dst.read(1), red[expected.toslices()])
+
+    # the same extent is not written again
+    mtime = path.stat().st_mtime_ns
+    hdf2tiff_conversion.convert_hdf2tiffs(hdf_path, tmp_path / "out", bands=["Red", "QA"], stack=stack)
+    assert path.stat().st_mtime_ns == mtime
+
+
+@pytest.mark.skipif(shutil.which("gdal_translate") is None, reason="gdal_translate not installed")
+@pytest.mark.parametrize("window", [None, (40, 10, 30, 40)])
+@pytest.mark.parametrize("options", ["-tr 90 90", "-outsize 50% 50%"])
+def test_convert_hdf2tiffs_resampled_is_not_written_again(tmp_path, fake_hdfs, window, options):
+    sceneid = "HLS.L30.T32UNU.2017007.v1.4"
+    hdf_path = write_fake_hdf(tmp_path, sceneid, shape=(128, 128), tiled=True,
+                              blockxsize=32, blockysize=32)
+    path = tmp_path / "out" / sceneid / f"{sceneid}__Red.tif"
+    hdf2tiff_conversion.convert_hdf2tiffs(hdf_path, tmp_path / "out", bands=["Red"],
+                                          gdal_translate_options=options, window=window)
+    with rasterio.open(path) as dst:
+        assert dst.res != (30, 30)
+    mtime = path.stat().st_mtime_ns
+    hdf2tiff_conversion.convert_hdf2tiffs(hdf_path, tmp_path / "out", bands=["Red"],
+                                          gdal_translate_options=options, window=window)
+    assert path.stat().st_mtime_ns == mtime
+
+
+def test_convert_hdf2tiffs_aoi(tmp_path, fake_hdfs):
+    hdf_paths = [write_fake_hdf(tmp_path, "HLS.L30.T32UNU.2017007.v1.4"),
+                 write_fake_hdf(tmp_path, "HLS.L30.T32UNU.2017009.v1.4")]
+    with rasterio.open(tmp_path / "subdatasets" / "HLS.L30.T32UNU.2017007.v1.4" / "QA.tif") as src:
+        lons, lats = rasterio.warp.transform(src.crs, "EPSG:4326", [src.bounds.left + 100],
+                                             [src.bounds.top - 100])
+    aoi = (lons[0] - 0.0001, lats[0] - 0.0001, lons[0] + 0.0001, lats[0] + 0.0001)
+    df = hdf2tiff_conversion.convert_hdf2tiffs_batch(hdf_paths, tmp_path / "out", bands=["QA"],
+                                                     aoi=aoi)
+    assert list(df["status"]) == ["converted", "converted"]
+    with rasterio.open(tmp_path / "out" / "HLS.L30.T32UNU.2017007.v1.4" /
+                       "HLS.L30.T32UNU.2017007.v1.4__QA.tif") as dst:
+        assert dst.bounds.left == src.bounds.left and dst.bounds.top == src.bounds.top
+
+    df = hdf2tiff_conversion.convert_hdf2tiffs_batch(hdf_paths, tmp_path / "out2", bands=["QA"],
+                                                     aoi=(0, 0, 1, 1))
+    assert list(df["status"]) == ["skipped", "skipped"]
+    assert not (tmp_path / "out2").exists()
+    with pytest.raises(ValueError, match="store"):
+        hdf2tiff_conversion.convert_hdf2tiffs_batch(hdf_paths, tmp_path / "out3", store=True,
+                                                    window=(0, 0, 1, 1))
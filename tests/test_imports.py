@@ -0,0 +1,56 @@
+import subprocess
+import sys
+
+import pytest
+
+import nasa_hls
+
+# generous for slow CI machines, the import itself takes a few milliseconds
+IMPORT_TIME_BUDGET = 0.25
+HEAVY_MODULES = ["pandas", "numpy", "rasterio", "requests", "bs4", "tqdm"]
+
+
+def _run(code):
+    return subprocess.run([sys.executable, "-c", code], check=True, capture_output=True,
+                          text=True).stdout.strip()
+
+
+@pytest.mark.parametrize("statement", ["import nasa_hls",
+                                       "import nasa_hls.scripts.query",
+                                       "import nasa_hls.scripts.download",
+                                       "import nasa_hls.scripts.convert",
+                                       "import nasa_hls.scripts.pipeline",
+                                       "import nasa_hls.scripts.scene_stats",
+                                       "import nasa_hls; nasa_hls.parse_url('2017-01-07')"])
+def test_import_does_not_load_heavy_dependencies(statement):
+    loaded = _run(f"import sys; {statement}; "
+                  f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    assert loaded == ""
+
+
+def test_import_time_budget():
+    duration = float(_run("import time; start = time.perf_counter(); import nasa_hls; "
+                          "print(time.perf_counter() - start)"))
+    assert duration < IMPORT_TIME_BUDGET
+
+
+def test_lazy_attributes():
+    from nasa_hls import download_hls_dataset, names
+    assert nasa_hls.parse_url is names.parse_url
+    assert nasa_hls.download_batch is download_hls_dataset.download_batch
+    assert set(nasa_hls._LAZY_ATTRIBUTES) <= set(dir(nasa_hls))
+    for name in nasa_hls.__all__:
+        assert getattr(nasa_hls, name) is not None
+    assert {"utils", "hdf2tiff_conversion", "scripts"} <= set(dir(nasa_hls))
+    with pytest.raises(AttributeError):
+        nasa_hls.not_an_attribute
+
+
+def test_lazy_submodules():
+    # in a fresh interpreter, i.e. without submodules imported by other tests
+    assert _run("import nasa_hls; "
+                "print(nasa_hls.utils.parse_url.__module__, "
+                "nasa_hls.hdf2tiff_conversion.convert_hdf2tiffs.__name__, "
+                "nasa_hls.download_hls_dataset.__name__, "
+                "nasa_hls.scripts.__name__)") == \
+        "nasa_hls.names convert_hdf2tiffs nasa_hls.download_hls_dataset nasa_hls.scripts"
@@ -0,0 +1,51 @@
+import numpy as np
+import rasterio
+
+from nasa_hls import hdf2tiff_conversion
+from nasa_hls import indices
+
+from .hls_fixtures import write_fake_hdf
+
+
+def _read(tmp_path, sceneid, band):
+    with rasterio.open(tmp_path / "subdatasets" / sceneid / f"{band}.tif") as src:
+        return src.read(1)
+
+
+def test_compute_indices_batch(tmp_path, fake_hdfs):
+    hdf_l30 = write_fake_hdf(tmp_path, "HLS.L30.T32UNU.2017007.v1.4", shape=(40, 50), seed=1)
+    hdf_s30 = write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017009.v1.4", shape=(40, 50), seed=2)
+    # the S30 scene is read from the converted files
+    hdf2tiff_conversion.convert_hdf2tiffs(hdf_s30, tmp_path / "converted", stack=True)
+    df = indices.compute_indices_batch([hdf_l30, tmp_path / "converted" / hdf_s30.stem, "missing.hdf"],
+                                       tmp_path / "out", indices=["NDVI", "NBR"], block_size=16,
+                                       max_workers=2)
+    assert list(df["status"]) == ["computed", "computed", "failed"]
+
+    for sceneid, red, nir in [("HLS.L30.T32UNU.2017007.v1.4", "band04", "band05"),
+                              ("HLS.S30.T32UNU.2017009.v1.4", "B04", "B8A")]:
+        red = _read(tmp_path, sceneid, red).astype("float32")
+        nir = _read(tmp_path, sceneid, nir).astype("float32")
+        qa = _read(tmp_path, sceneid, "QA")
+        expected = np.where((qa & 0b1110) == 0,
+                            np.round((nir - red) / (nir + red) * 10000), -32768)
+        path = tmp_path / "out" / sceneid / f"{sceneid}__NDVI.tif"
+        with rasterio.open(path) as src:
+            assert src.dtypes == ("int16", )
+            assert src.nodata == -32768
+            assert src.tags(ns="IMAGE_STRUCTURE")["LAYOUT"] == "COG"
+            assert np.array_equal(src.read(1), expected)
+        assert (tmp_path / "out" / sceneid / f"{sceneid}__NBR.tif").exists()
+
+
+def test_compute_indices_without_qa_layer(tmp_path, fake_hdfs):
+    sceneid = "HLS.S30.T32UNU.2017009.v1.4"
+    hdf = write_fake_hdf(tmp_path, sceneid, shape=(40, 50), seed=2)
+    hdf2tiff_conversion.convert_hdf2tiffs(hdf, tmp_path / "converted", bands=["Red", "NIR_Narrow"])
+    assert not list((tmp_path / "converted" / sceneid).glob("*QA*"))
+
+    paths = indices.compute_indices(tmp_path / "converted" / sceneid, tmp_path / "out", qa_valid=None)
+    red = _read(tmp_path, sceneid, "B04").astype("float32")
+    nir = _read(tmp_path, sceneid, "B8A").astype("float32")
+    with rasterio.open(paths[0]) as src:
+        assert np.array_equal(src.read(1), np.round((nir - red) / (nir + red) * 10000))
@@ -0,0 +1,53 @@
+import pytest
+
+from nasa_hls import utils
+from nasa_hls.session import RateLimiter, get_session
+
+SCENEIDS = ["HLS.L30.T32UNU.2017007.v1.4",
+            "HLS.L30.T32UNU.2017023.v1.4",
+            "HLS.S30.T32UNU.2017005.v1.4",
+            "HLS.L30.T32UPU.2017014.v1.4",
+            "HLS.L30.T32UNU.2018010.v1.4"]
+
+
+@pytest.fixture
+def server(hls_server):
+    for sceneid in SCENEIDS:
+        hls_server.add_granule(sceneid)
+    return hls_server
+
+
+def test_get_available_datasets_deterministic_order(server):
+    urls = utils.get_available_datasets(products=["L30", "S30"],
+                                        years=[2017, 2018],
+                                        tiles=["32UNU", "32UPU", "33UUU"],
+                                        max_workers=4,
+                                        base_url=server.base_url)
+    names = [url.split("/")[-1][:-4] for url in urls]
+    assert names == ["HLS.L30.T32UNU.2017007.v1.4",
+                     "HLS.L30.T32UNU.2017023.v1.4",
+                     "HLS.L30.T32UPU.2017014.v1.4",
+                     "HLS.L30.T32UNU.2018010.v1.4",
+                     "HLS.S30.T32UNU.2017005.v1.4"]
+    assert urls[0] == server.base_url + "/v1.4/L30/2017/32/U/N/U/HLS.L30.T32UNU.2017007.v1.4.hdf"
+
+
+def test_get_available_datasets_retries_failed_listings(server):
+    url_dir = "/data/v1.4/L30/2017/32/U/N/U/"
+    server.fail_next[url_dir] = 2
+    session = get_session(backoff_factor=0)
+    urls = utils.get_available_datasets(products=["L30"], years=[2017], tiles=["32UNU"],
+                                        session=session, base_url=server.base_url)
+    assert len(urls) == 2
+    assert server.requests.count(url_dir) == 3
+
+
+def test_rate_limiter_spaces_requests_per_host(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("nasa_hls.session.time.sleep", sleeps.append)
+    limiter = RateLimiter(requests_per_second=10)
+    for _ in range(3):
+        limiter.wait("http://a.org/x")
+    limiter.wait("http://b.org/x")
+    assert len(sleeps) == 2
+    assert sleeps[-1] == pytest.approx(0.2, abs=0.05)
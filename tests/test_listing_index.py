@@ -0,0 +1,49 @@
+import calendar
+import datetime
+
+import pytest
+
+from nasa_hls import utils
+from nasa_hls.listing_index import ListingIndex
+
+
+@pytest.fixture
+def server(hls_server):
+    hls_server.add_granule("HLS.L30.T32UNU.2017007.v1.4")
+    hls_server.add_granule("HLS.L30.T32UNU.2017023.v1.4")
+    return hls_server
+
+
+def _query(server, index):
+    return utils.get_available_datasets(products=["L30"], years=[2017], tiles=["32UNU", "32UPU"],
+                                        index=index, base_url=server.base_url)
+
+
+def test_fresh_entries_are_served_from_index(server, tmp_path):
+    index = ListingIndex(tmp_path / "index.sqlite")
+    urls = _query(server, index)
+    assert len(urls) == 2
+    assert len(server.requests) == 2
+    assert _query(server, index) == urls
+    assert len(server.requests) == 2
+
+
+def test_stale_entries_are_revalidated(server, tmp_path):
+    # the 2017 directories would be closed otherwise
+    index = ListingIndex(tmp_path / "index.sqlite", ttl=0, closed_year_grace=float("inf"))
+    urls = _query(server, index)
+    assert _query(server, index) == urls
+    assert sorted(status for _, status in server.statuses) == [200, 304, 404, 404]
+
+    server.add_granule("HLS.L30.T32UNU.2017039.v1.4")
+    assert len(_query(server, index)) == 3
+
+
+def test_closed_years_are_not_revalidated(server, tmp_path):
+    index = ListingIndex(tmp_path / "index.sqlite", ttl=0)
+    fetched_at = calendar.timegm(datetime.date(2018, 6, 1).timetuple())
+    url = server.base_url + "/v1.4/L30/2017/32/U/N/U/"
+    index.put(url, ["HLS.L30.T32UNU.2017007.v1.4.hdf"], fetched_at=fetched_at)
+    index.put(url.replace("/N/U/", "/P/U/"), [], fetched_at=fetched_at)
+    assert len(_query(server, index)) == 1
+    assert server.requests == []
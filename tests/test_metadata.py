@@ -0,0 +1,71 @@
+import numpy as np
+from pathlib import Path
+import pytest
+
+from nasa_hls import metadata, utils
+
+from .hls_fixtures import write_geotiff
+
+
+@pytest.fixture
+def qa_tiff(tmp_path):
+    return write_geotiff(tmp_path / "HLS.L30.T32UNU.2017007.v1.4__QA.tif",
+                         np.zeros((4, 4), dtype="uint8"),
+                         tags={"cloud_coverage": "41", "spatial_coverage": "99.5",
+                               "SENSOR": "OLI_TIRS"})
+
+
+def test_hdf_subdataset_name():
+    assert metadata.hdf_subdataset_name("/d/HLS.S30.T32UNU.2017007.v1.4.hdf", "B04") == \
+        'HDF4_EOS:EOS_GRID:"/d/HLS.S30.T32UNU.2017007.v1.4.hdf":Grid:B04'
+
+
+def test_read_metadata_typed(qa_tiff):
+    meta = metadata.read_metadata(qa_tiff)
+    assert meta["cloud_coverage"] == 41 and isinstance(meta["cloud_coverage"], int)
+    assert meta["spatial_coverage"] == 99.5
+    assert meta["SENSOR"] == "OLI_TIRS"
+
+
+def test_get_metadata_from_hdf_matches_field_substrings(qa_tiff):
+    assert utils.get_metadata_from_hdf(qa_tiff) == {"cloud_cover": 41.0,
+                                                   "spatial_coverage": 99.5}
+    assert utils.get_cloud_coverage_from_hdf(qa_tiff) == 41.0
+
+
+def test_read_metadata_batch(qa_tiff, tmp_path):
+    df = metadata.read_metadata_batch([qa_tiff, tmp_path / "missing.tif"], max_workers=2)
+    assert list(df["path"]) == [str(qa_tiff), str(tmp_path / "missing.tif")]
+    assert df["error"].isna().tolist() == [True, False]
+    assert df.loc[0, "cloud_coverage"] == 41
+
+
+def test_metadata_cache_is_keyed_by_size_and_mtime(qa_tiff, tmp_path):
+    cache = metadata.MetadataCache(tmp_path)
+    assert cache.path == tmp_path / metadata.METADATA_CACHE_NAME
+    assert cache.get(qa_tiff) is None
+    assert cache.read_metadata(qa_tiff)["cloud_coverage"] == 41
+    assert cache.get(qa_tiff)["cloud_coverage"] == 41
+    write_geotiff(qa_tiff, np.ones((4, 4), dtype="uint8"), tags={"cloud_coverage": "7"})
+    assert cache.get(qa_tiff) is None
+    assert cache.read_metadata(qa_tiff)["cloud_coverage"] == 7
+
+
+def test_dataframe_from_hdf_paths_coverages_from_cache(qa_tiff, tmp_path, monkeypatch):
+    paths = [str(qa_tiff).replace("__QA.tif", ".hdf")]
+    Path(paths[0]).write_bytes(b"hdf")
+    df = utils.dataframe_from_hdf_paths(paths)
+    assert "cloud_cover" not in df.columns
+
+    cache = metadata.MetadataCache(tmp_path / "cache.sqlite")
+    monkeypatch.setattr(metadata, "hdf_subdataset_name", lambda src, band: str(qa_tiff))
+    df = utils.dataframe_from_hdf_paths(paths, add_cloud_spatial_coverages=True,
+                                        metadata_cache=cache, max_workers=1)
+    assert df.loc[0, "cloud_cover"] == 41.0
+
+    def _fail(*args):
+        raise AssertionError("Not served from the cache.")
+    monkeypatch.setattr(metadata, "_read_metadata_rows", _fail)
+    df = utils.dataframe_from_hdf_paths(paths, add_cloud_spatial_coverages=True,
+                                        metadata_cache=cache)
+    assert df.loc[0, "spatial_coverage"] == 99.5
@@ -0,0 +1,93 @@
+import json
+import pstats
+
+from click.testing import CliRunner
+import pandas as pd
+
+from nasa_hls import download_hls_dataset
+from nasa_hls import hdf2tiff_conversion
+from nasa_hls import metrics
+from nasa_hls.scripts.convert import convert_batch
+
+from .hls_fixtures import write_fake_hdf
+
+
+def test_metrics_registry():
+    registry = metrics.Metrics()
+    registry.increment("files")
+    with registry.timer("step"):
+        pass
+    before = registry.snapshot()
+    registry.increment("files", 2)
+    registry.increment("bytes", 100)
+    registry.record_time("step", 2.0)
+    assert registry.since(before) == {"counters": {"files": 2, "bytes": 100},
+                                      "timers": {"step": {"count": 1, "total": 2.0, "max": 2.0}}}
+    other = metrics.Metrics()
+    other.merge(registry.snapshot())
+    other.merge(registry.snapshot())
+    assert other.counters == {"files": 6, "bytes": 200}
+    assert other.timers["step"]["count"] == 4 and other.timers["step"]["max"] == 2.0
+
+
+def test_write_metrics(tmp_path):
+    registry = metrics.Metrics()
+    registry.increment("download_bytes", 5)
+    registry.record_time("download", 1.5)
+    for _ in range(2):
+        metrics.write_metrics(tmp_path / "metrics.jsonl", registry, labels={"command": "test"})
+    records = [json.loads(line) for line in (tmp_path / "metrics.jsonl").read_text().splitlines()]
+    assert len(records) == 2
+    assert records[0]["command"] == "test"
+    assert records[0]["counters"] == {"download_bytes": 5}
+    assert records[0]["timers"]["download"]["total"] == 1.5
+
+    metrics.write_metrics(tmp_path / "metrics.prom", registry, labels={"command": "test"})
+    lines = (tmp_path / "metrics.prom").read_text().splitlines()
+    assert 'nasa_hls_download_bytes_total{command="test"} 5' in lines
+    assert 'nasa_hls_download_seconds_count{command="test"} 1' in lines
+    assert 'nasa_hls_download_seconds_sum{command="test"} 1.5' in lines
+
+    snapshots = []
+    metrics.write_metrics(lambda snapshot, labels: snapshots.append(snapshot), registry)
+    assert snapshots == [registry.snapshot()]
+
+
+def test_download_batch_metrics(hls_server, tmp_path):
+    hls_server.add_granule("HLS.L30.T32UNU.2017007.v1.4", content=b"x" * 5000)
+    datasets = pd.DataFrame({"date": pd.to_datetime(["2017-01-07", "2017-01-09"]),
+                             "tile": ["32UNU"] * 2, "product": ["L30", "L30"]})
+    before = metrics.METRICS.snapshot()
+    download_hls_dataset.download_batch(tmp_path, datasets, base_url=hls_server.base_url)
+    recorded = metrics.METRICS.since(before)
+    assert recorded["counters"]["download_downloaded"] == 1
+    assert recorded["counters"]["download_failed"] == 1
+    assert recorded["counters"]["download_bytes"] == 5003
+    # the .hdf and .hdf.hdr files are requested independently, also for the missing granule
+    assert recorded["counters"]["http_requests"] == 4
+    assert recorded["timers"]["download"]["count"] == 2
+
+
+def test_convert_metrics_of_workers_are_merged(tmp_path, fake_hdfs):
+    hdf_paths = [write_fake_hdf(tmp_path, f"HLS.L30.T32UNU.201700{day}.v1.4") for day in (1, 3, 5)]
+    before = metrics.METRICS.snapshot()
+    hdf2tiff_conversion.convert_hdf2tiffs_batch(hdf_paths, tmp_path / "out", bands=["Red", "QA"],
+                                                max_workers=2)
+    recorded = metrics.METRICS.since(before)
+    assert recorded["counters"]["convert_converted"] == 3
+    assert recorded["counters"]["convert_files_written"] == 6
+    assert recorded["counters"]["convert_bytes_written"] > 0
+    assert recorded["timers"]["convert_band"]["count"] == 6
+
+
+def test_cli_metrics_and_profile(tmp_path, fake_hdfs):
+    write_fake_hdf(tmp_path / "hdf", "HLS.L30.T32UNU.2017001.v1.4")
+    result = CliRunner().invoke(convert_batch, ["-s", str(tmp_path / "hdf"), "-d", str(tmp_path / "out"),
+                                                "-b", "Red,QA", "--metrics", str(tmp_path / "m.jsonl"),
+                                                "--profile", str(tmp_path / "run.prof")])
+    assert result.exit_code == 0, result.output
+    record = json.loads((tmp_path / "m.jsonl").read_text())
+    assert record["command"] == "hls_convert_batch"
+    assert record["counters"]["convert_converted"] >= 1
+    assert record["timers"]["run"]["count"] >= 1
+    assert pstats.Stats(str(tmp_path / "run.prof")).total_calls > 0
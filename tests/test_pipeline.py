@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+
+import pytest
+
+from nasa_hls import pipeline
+
+from .hls_fixtures import write_fake_hdf
+
+
+def _add_granule(server, dstdir, sceneid, cloud_coverage=10):
+    # the subdatasets the downloaded (empty) hdf file resolves to with fake_hdfs
+    write_fake_hdf(dstdir, sceneid, shape=(16, 16), cloud_coverage=cloud_coverage).unlink()
+    server.add_granule(sceneid, content=b"hdf", header=b"ENVI\n")
+
+
+@pytest.mark.parametrize("convert_workers", [1, 2])
+def test_run_pipeline_resumes_from_manifest(hls_server, tmp_path, fake_hdfs, convert_workers):
+    _add_granule(hls_server, tmp_path, "HLS.L30.T32UNU.2017007.v1.4")
+    _add_granule(hls_server, tmp_path, "HLS.S30.T32UNU.2017009.v1.4", cloud_coverage=90)
+    _add_granule(hls_server, tmp_path, "HLS.S30.T32UNU.2017300.v1.4")
+    kwargs = dict(products=["L30", "S30"], years=[2017], tiles=["32UNU"], end_date="2017-06-30",
+                  bands=["Red", "QA"], max_cloud_coverage=50, queue_size=1, download_workers=2,
+                  convert_workers=convert_workers,
+                  base_url=hls_server.base_url)
+
+    df = pipeline.run_pipeline(tmp_path, **kwargs)
+    assert list(df["sceneid"]) == ["HLS.L30.T32UNU.2017007.v1.4", "HLS.S30.T32UNU.2017009.v1.4"]
+    assert list(df["stage"]) == ["convert", "filter"]
+    assert list(df["status"]) == ["converted", "filtered"]
+    assert (tmp_path / "HLS.L30.T32UNU.2017007.v1.4" / "HLS.L30.T32UNU.2017007.v1.4__Red.tif").exists()
+    with open(tmp_path / pipeline.MANIFEST_NAME) as src:
+        records = [json.loads(line) for line in src]
+    assert [(r["stage"], r["status"]) for r in records
+            if r["sceneid"] == "HLS.L30.T32UNU.2017007.v1.4"] == \
+        [("download", "downloaded"), ("filter", "passed"), ("convert", "converted")]
+
+    # a granule interrupted after its download is converted, the others are not touched
+    with open(tmp_path / pipeline.MANIFEST_NAME, "a") as dst:
+        dst.write(json.dumps({"sceneid": "HLS.L30.T32UNU.2017007.v1.4", "stage": "download",
+                              "status": "downloaded"}) + "\n")
+    n_requests = len(hls_server.requests)
+    df = pipeline.run_pipeline(tmp_path, **kwargs)
+    assert list(df["status"]) == ["converted", "filtered"]
+    assert all(not path.endswith((".hdf", ".hdr")) for path in hls_server.requests[n_requests:])
+
+
+def _crash_worker(*args):
+    # like a worker killed by the OOM killer, breaks the process pool
+    os._exit(1)
+
+
+@pytest.mark.parametrize("failing", ["download", "manifest", "convert_worker"])
+def test_run_pipeline_raises_on_stage_failures(hls_server, tmp_path, fake_hdfs, monkeypatch, failing):
+    sceneids = [f"HLS.L30.T32UNU.2017{day:03d}.v1.4" for day in range(1, 12)]
+    for sceneid in sceneids:
+        _add_granule(hls_server, tmp_path, sceneid)
+    if failing == "download":
+        download = pipeline.download
+
+        def _download(dstdir, date, *args, **kwargs):
+            if date == "2017-01-03":
+                raise OSError("disk full")
+            return download(dstdir, date, *args, **kwargs)
+        monkeypatch.setattr(pipeline, "download", _download)
+    elif failing == "manifest":
+        record = pipeline.Manifest.record
+
+        def _record(self, sceneid, stage, status, **fields):
+            if stage == "convert" and status == "converted":
+                raise OSError("disk full")
+            return record(self, sceneid, stage, status, **fields)
+        monkeypatch.setattr(pipeline.Manifest, "record", _record)
+    else:
+        monkeypatch.setattr(pipeline, "_convert_hdf2tiffs_task", _crash_worker)
+
+    outcome = []
+
+    def _run():
+        try:
+            outcome.append(pipeline.run_pipeline(
+                tmp_path, products=["L30"], years=[2017], tiles=["32UNU"], bands=["QA"],
+                queue_size=1, download_workers=2, filter_workers=1,
+                convert_workers=1 if failing == "manifest" else 2, base_url=hls_server.base_url))
+        except Exception as exc:
+            outcome.append(exc)
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+    assert not thread.is_alive(), "the pipeline hangs"
+    assert isinstance(outcome[0], Exception)
+    with open(tmp_path / pipeline.MANIFEST_NAME) as src:
+        states = {record["sceneid"]: record for record in map(json.loads, src)}
+    assert set(states) == set(sceneids)
+    failed = [sceneid for sceneid, state in states.items() if state["status"] == "failed"]
+    if failing == "download":
+        assert failed == [sceneids[2]]
+    else:
+        assert sorted(failed) == sceneids
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+import rasterio
+
+from nasa_hls import utils
+
+from .hls_fixtures import write_geotiff
+
+QA_VALID = [0, 64, 128]
+
+
+@pytest.fixture
+def qa_path(tmp_path):
+    qa = np.random.default_rng(0).integers(0, 256, size=(100, 80)).astype("uint8")
+    return write_geotiff(tmp_path / "qa.tif", qa, tiled=True, blockxsize=32, blockysize=32)
+
+
+def _reference_mask(qa_path, qa_valid, keep_255=True):
+    with rasterio.open(qa_path) as src:
+        qa = src.read(1)
+    mask = np.isin(qa, qa_valid).astype("uint8")
+    if keep_255:
+        mask[qa == 255] = 255
+    return mask
+
+
+@pytest.mark.parametrize("blockwise", [False, True])
+@pytest.mark.parametrize("keep_255", [False, True])
+def test_hls_qa_layer_to_mask_array(qa_path, blockwise, keep_255):
+    mask = utils.hls_qa_layer_to_mask(qa_path, QA_VALID, keep_255=keep_255, blockwise=blockwise)
+    assert mask.dtype == np.uint8
+    assert np.array_equal(mask, _reference_mask(qa_path, QA_VALID, keep_255=keep_255))
+
+
+def test_hls_qa_layer_to_mask_blockwise_file(qa_path, tmp_path):
+    mask_path = tmp_path / "mask.tif"
+    assert utils.hls_qa_layer_to_mask(qa_path, QA_VALID, mask_path=mask_path, blockwise=True) == 0
+    with rasterio.open(mask_path) as src:
+        assert src.block_shapes == [(32, 32)]
+        assert np.array_equal(src.read(1), _reference_mask(qa_path, QA_VALID))
+
+
+def test_hls_qa_layer_to_mask_batch(qa_path, tmp_path):
+    mask_paths = [tmp_path / "mask_1.tif", tmp_path / "mask_2.tif"]
+    mask_paths[1].write_bytes(b"exists")
+    df = utils.hls_qa_layer_to_mask_batch([qa_path, qa_path], QA_VALID, mask_paths, max_workers=2)
+    assert list(df["status"]) == ["written", "skipped"]
+    with rasterio.open(mask_paths[0]) as src:
+        assert np.array_equal(src.read(1), _reference_mask(qa_path, QA_VALID))
+
+
+@pytest.mark.parametrize("expression, query", [
+    ("no_cloud & no_cloud_shadow & no_adj_cloud & ~snow",
+     "no_cloud & no_cloud_shadow & no_adj_cloud & no_snow"),
+    ("(water | snow) & ~a_high", "(water | snow) & ~a_high"),
+    ("a_low & a_avg", "a_low & a_avg"),
+    ("~(cloud | cirrus)", "no_cloud & no_cirrus"),
+])
+def test_qa_expression_to_values_matches_look_up_table(expression, query):
+    lut = utils.get_qa_look_up_table()
+    expected = lut.loc[lut.eval(query), "qa_value"].values
+    assert np.array_equal(utils.qa_expression_to_values(expression), expected)
+
+
+def test_qa_expression_errors():
+    with pytest.raises(ValueError, match="Unknown QA attribute 'no_clouds'"):
+        utils.compile_qa_expression("no_clouds")
+    with pytest.raises(ValueError, match="Invalid QA expression"):
+        utils.compile_qa_expression("cloud + 1")
+
+
+def test_hls_qa_layer_to_mask_with_expression(qa_path):
+    expression = "no_cloud & no_cloud_shadow & no_adj_cloud"
+    mask = utils.hls_qa_layer_to_mask(qa_path, expression, keep_255=False)
+    with rasterio.open(qa_path) as src:
+        qa = src.read(1)
+    assert np.array_equal(mask, utils.qa_expression_to_mask(qa, expression).astype("uint8"))
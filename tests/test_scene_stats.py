@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.warp import transform
+
+from nasa_hls import scene_stats
+
+from .hls_fixtures import write_fake_hdf
+
+
+def _expected(qa):
+    sensed = qa[qa != 255]
+    return {"nodata": (qa == 255).mean(),
+            "clear": ((sensed & 0b1110) == 0).mean(),
+            "cloud": ((sensed & 0b10) > 0).mean(),
+            "shadow": ((sensed & 0b1000) > 0).mean(),
+            "snow": ((sensed & 0b10000) > 0).mean(),
+            "water": ((sensed & 0b100000) > 0).mean(),
+            "pixels": qa.size}
+
+
+def _read_qa(tmp_path, sceneid):
+    with rasterio.open(tmp_path / "subdatasets" / sceneid / "QA.tif") as src:
+        return src.read(1)
+
+
+def test_qa_statistics(tmp_path, fake_hdfs):
+    sceneid = "HLS.S30.T32UNU.2017009.v1.4"
+    hdf = write_fake_hdf(tmp_path, sceneid, shape=(64, 64), seed=3)
+    qa = _read_qa(tmp_path, sceneid)
+
+    stats = scene_stats.qa_statistics(hdf, decimation=1)
+    assert (stats["sceneid"], stats["tile"]) == (sceneid, "32UNU")
+    assert stats["date"] == pd.Timestamp("2017-01-09")
+    for key, value in _expected(qa).items():
+        assert np.isclose(stats[key], value), key
+
+    # nearest neighbour: the pixel at the center of each 4 x 4 block
+    stats = scene_stats.qa_statistics(hdf, decimation=4)
+    for key, value in _expected(qa[2::4, 2::4]).items():
+        assert np.isclose(stats[key], value), key
+
+
+def test_qa_statistics_aoi(tmp_path, fake_hdfs):
+    sceneid = "HLS.L30.T32UNU.2017007.v1.4"
+    hdf = write_fake_hdf(tmp_path, sceneid, shape=(64, 64), seed=4)
+    qa = _read_qa(tmp_path, sceneid)
+    # the left half of the scene, the edges half a pixel off the pixel centers
+    left, top = 499980, 5900040
+    xs = [left - 100, left + 32 * 30, left + 32 * 30, left - 100, left - 100]
+    ys = [top + 100, top + 100, top - 64 * 30 - 100, top - 64 * 30 - 100, top + 100]
+    lons, lats = transform("EPSG:32632", "EPSG:4326", xs, ys)
+    aoi = {"type": "Polygon", "coordinates": [list(zip(lons, lats))]}
+
+    stats = scene_stats.qa_statistics(hdf, aoi=aoi, decimation=1)
+    for key, value in _expected(qa[:, :32]).items():
+        assert np.isclose(stats[f"aoi_{key}"], value), key
+    assert np.isclose(stats["clear"], _expected(qa)["clear"])
+
+
+def test_scene_index_clearest(tmp_path, fake_hdfs):
+    dates = ["2017005", "2017012", "2017020", "2017040", "2017050"]
+    hdfs = [write_fake_hdf(tmp_path, f"HLS.S30.T32UNU.{date}.v1.4", shape=(32, 32), seed=i)
+            for i, date in enumerate(dates)]
+    hdfs.append(write_fake_hdf(tmp_path, "HLS.S30.T33UUU.2017010.v1.4", shape=(32, 32)))
+    index_path = tmp_path / "index"
+    index_path.mkdir()
+
+    stats = scene_stats.qa_statistics_batch(hdfs, decimation=2, max_workers=2, index=index_path)
+    assert stats["error"].isna().all()
+    index = scene_stats.SceneIndex(index_path)
+    assert index.path == index_path / scene_stats.SCENE_INDEX_NAME
+
+    stats["month"] = stats["date"].dt.month
+    tile = stats[stats["tile"] == "32UNU"]
+    tile = tile.assign(usable=tile["clear"] * (1 - tile["nodata"]))
+    expected = tile.sort_values("usable", ascending=False).groupby("month").head(1)
+    clearest = index.clearest("T32UNU", n=1)
+    assert list(clearest["sceneid"]) == list(expected.sort_values("date")["sceneid"])
+    assert list(index.clearest("32UNU", n=2, start_date="2017-02-01")["sceneid"]) == \
+        ["HLS.S30.T32UNU.2017040.v1.4", "HLS.S30.T32UNU.2017050.v1.4"]
+    assert len(index.clearest("32UNU", n=10, freq="year")) == 5
+
+    # scenes in the index are not read again
+    (tmp_path / "subdatasets" / "HLS.S30.T33UUU.2017010.v1.4" / "QA.tif").unlink()
+    again = scene_stats.qa_statistics_batch(hdfs, decimation=2, max_workers=2, index=index)
+    assert again["error"].isna().all()
+    assert np.allclose(again["clear"], stats["clear"])
+    index.close()
+
+
+def test_hls_scene_stats_cli(tmp_path, fake_hdfs):
+    from click.testing import CliRunner
+    from nasa_hls.scripts.scene_stats import scene_stats as cli
+
+    for i, date in enumerate(["2017005", "2017012", "2017040"]):
+        write_fake_hdf(tmp_path / "hdf", f"HLS.L30.T32UNU.{date}.v1.4", shape=(32, 32), seed=i)
+    result = CliRunner().invoke(cli, ["-s", str(tmp_path / "hdf"), "-i", str(tmp_path / "index.sqlite"),
+                                      "-x", "2", "-n", "1", "-d", str(tmp_path / "clearest.csv")])
+    assert result.exit_code == 0, result.output
+    clearest = pd.read_csv(tmp_path / "clearest.csv")
+    assert list(clearest["date"].str[:7]) == ["2017-01", "2017-02"]
+    assert (clearest["rank"] == 1).all()
+
+
+def test_qa_statistics_batch_reads_again_with_other_aoi_or_decimation(tmp_path, fake_hdfs):
+    hdf = write_fake_hdf(tmp_path, "HLS.L30.T32UNU.2017007.v1.4", shape=(64, 64), seed=4)
+    qa = _read_qa(tmp_path, "HLS.L30.T32UNU.2017007.v1.4")
+    left, top = 499980, 5900040
+    lons, lats = transform("EPSG:32632", "EPSG:4326", [left + 10, left + 32 * 30, left + 64 * 30 - 10],
+                           [top - 64 * 30 + 10, top - 10, top - 10])
+    left_half = (lons[0], lats[0], lons[1], lats[1])
+    right_half = (lons[1], lats[0], lons[2], lats[2])
+    index = scene_stats.SceneIndex(tmp_path / "index.sqlite")
+
+    def _stats(**kwargs):
+        return scene_stats.qa_statistics_batch([hdf], max_workers=1, index=index, **kwargs).iloc[0]
+
+    stats = _stats(aoi=left_half, decimation=1)
+    assert np.isclose(stats["aoi_clear"], _expected(qa[:, :32])["clear"])
+    stats = _stats(aoi=right_half, decimation=1)
+    assert np.isclose(stats["aoi_clear"], _expected(qa[:, 32:])["clear"])
+    assert stats["pixels"] == 64 * 64
+    assert _stats(decimation=4)["pixels"] == 16 * 16
+    # the index holds the last statistics of a scene
+    (tmp_path / "subdatasets" / "HLS.L30.T32UNU.2017007.v1.4" / "QA.tif").unlink()
+    assert _stats(decimation=4)["error"] is None
+    assert _stats(decimation=1)["error"] is not None
+    index.close()
+
+
+def test_qa_statistics_batch_without_scenes(tmp_path):
+    from click.testing import CliRunner
+    from nasa_hls.scripts.scene_stats import scene_stats as cli
+
+    stats = scene_stats.qa_statistics_batch([], index=tmp_path / "index.sqlite", aoi=(0, 0, 1, 1))
+    assert stats.empty
+    assert {"sceneid", "tile", "date", "clear", "aoi_clear", "error"} <= set(stats.columns)
+
+    (tmp_path / "empty").mkdir()
+    for args in [[], ["-n", "1"]]:
+        result = CliRunner().invoke(cli, ["-s", str(tmp_path / "empty"), "-i", str(tmp_path / "index.sqlite"),
+                                          "-d", str(tmp_path / "out.csv")] + args)
+        assert result.exit_code == 0, result.output
+        assert pd.read_csv(tmp_path / "out.csv").empty
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+import rasterio
+
+from nasa_hls import hdf2tiff_conversion
+from nasa_hls import store
+
+from .hls_fixtures import write_fake_hdf
+
+
+def _subdataset(tmp_path, sceneid, band):
+    with rasterio.open(tmp_path / "subdatasets" / sceneid / f"{band}.tif") as src:
+        return src.read(1)
+
+
+def test_convert_to_store_appends_incrementally(tmp_path, fake_hdfs):
+    hdf_paths = [write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017011.v1.4", shape=(40, 70), seed=1),
+                 write_fake_hdf(tmp_path, "HLS.L30.T32UNU.2017007.v1.4", shape=(40, 70), seed=2)]
+    df = hdf2tiff_conversion.convert_hdf2tiffs_batch(hdf_paths, tmp_path / "out",
+                                                     bands=["Red", "Red_Edge1", "QA"], store=True)
+    assert list(df["status"]) == ["converted", "converted"]
+
+    hdf_paths.append(write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017009.v1.4", shape=(40, 70), seed=3))
+    df = hdf2tiff_conversion.convert_hdf2tiffs_batch(hdf_paths, tmp_path / "out", store=True)
+    assert list(df["status"]) == ["exists", "exists", "converted"]
+
+    tile_store = store.TimeSeriesStore(tmp_path / "out" / "T32UNU")
+    assert tile_store.bands == ["Red", "Red_Edge1", "QA"]
+    assert list(tile_store.scenes["sceneid"]) == ["HLS.L30.T32UNU.2017007.v1.4",
+                                                  "HLS.S30.T32UNU.2017011.v1.4",
+                                                  "HLS.S30.T32UNU.2017009.v1.4"]
+    series, scenes = tile_store.read_pixel("Red", 35, 66)
+    assert list(scenes["sceneid"]) == ["HLS.L30.T32UNU.2017007.v1.4",
+                                       "HLS.S30.T32UNU.2017009.v1.4",
+                                       "HLS.S30.T32UNU.2017011.v1.4"]
+    assert list(series) == [_subdataset(tmp_path, "HLS.L30.T32UNU.2017007.v1.4", "band04")[35, 66],
+                            _subdataset(tmp_path, "HLS.S30.T32UNU.2017009.v1.4", "B04")[35, 66],
+                            _subdataset(tmp_path, "HLS.S30.T32UNU.2017011.v1.4", "B04")[35, 66]]
+
+    data, scenes = tile_store.read("Red_Edge1", window=(0, 0, 70, 40), start_date="2017-01-08")
+    assert data.shape == (2, 40, 70)
+    assert np.array_equal(data[0], _subdataset(tmp_path, "HLS.S30.T32UNU.2017009.v1.4", "B05"))
+
+
+def test_interrupted_append_is_overwritten(tmp_path):
+    tile_store = store.TimeSeriesStore(tmp_path / "T32UNU", bands=["Red"], chunk_size=4)
+    ones = np.ones((6, 6), dtype="int16")
+    tile_store.append("HLS.L30.T32UNU.2017007.v1.4", {"Red": ones})
+    with open(tmp_path / "T32UNU" / "Red" / "1_1.tail", "ab") as dst:
+        dst.write(b"\x07" * 3)
+    tile_store = store.TimeSeriesStore(tmp_path / "T32UNU")
+    tile_store.append("HLS.L30.T32UNU.2017023.v1.4", {"Red": ones * 2})
+    data, _ = tile_store.read("Red")
+    assert np.array_equal(data, np.stack([ones, ones * 2]))
+
+
+def test_time_blocks(tmp_path):
+    rng = np.random.default_rng(0)
+    arrays = rng.integers(0, 10000, size=(7, 6, 5)).astype("int16")
+    tile_store = store.TimeSeriesStore(tmp_path / "T32UNU", bands=["Red"], chunk_size=4,
+                                       time_block=3)
+    # appended in reverse order of the dates
+    for day, array in zip(range(7, 0, -1), arrays[::-1]):
+        tile_store.append(f"HLS.L30.T32UNU.20170{day:02d}.v1.4", {"Red": array})
+        data, scenes = tile_store.read("Red")
+        assert np.array_equal(data, arrays[day - 1:])
+    # two complete blocks with the pixels' time series contiguous and a tail of one scene
+    blocks = np.fromfile(tmp_path / "T32UNU" / "Red" / "0_0.dat", dtype="int16").reshape(2, 4, 4, 3)
+    assert np.array_equal(blocks[1, 2, 3], arrays[::-1][3:6, 2, 3])
+    assert (tmp_path / "T32UNU" / "Red" / "0_0.tail").stat().st_size == 4 * 4 * 2
+
+    series, scenes = tile_store.read_pixel("Red", 5, 4, start_date="2017-01-02", end_date="2017-01-06")
+    assert list(series) == list(arrays[1:6, 5, 4])
+    assert list(scenes["date"].dt.day) == [2, 3, 4, 5, 6]
+
+
+def test_read_empty_store(tmp_path):
+    tile_store = store.TimeSeriesStore(tmp_path / "T32UNU", bands=["Red"])
+    with pytest.raises(ValueError, match="empty"):
+        tile_store.read("Red")
+    with pytest.raises(ValueError, match="empty"):
+        tile_store.read_pixel("Red", 0, 0)
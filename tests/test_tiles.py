@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from nasa_hls import tiles
+from nasa_hls import utils
+
+
+@pytest.mark.parametrize("aoi, expected", [
+    ((11.57, 48.13, 11.59, 48.15), ["32UPU"]),  # Munich
+    ((4.34, 50.84, 4.36, 50.86), ["31UES"]),  # Brussels
+    ((-58.4, -34.6, -58.3, -34.5), ["21HUB"]),  # Buenos Aires
+    ((11.9, 48.0, 12.1, 48.1), ["32UQU", "33UTP"]),  # across the zone border
+])
+def test_tiles_from_aoi(aoi, expected):
+    assert tiles.tiles_from_aoi(aoi) == expected
+
+
+def test_tile_bounds_of_tiles_from_aoi():
+    assert tiles.tile_bounds("32UNU") == ("EPSG:32632", (499980, 5290200, 609780, 5400000))
+    assert tiles.tile_bounds("31UDQ") == ("EPSG:32631", (399960, 5390220, 509760, 5500020))
+    assert tiles.tile_bounds("21HUB")[0] == "EPSG:32721"
+
+
+def test_tiles_from_geojson(tmp_path):
+    square = [[11.0, 48.0], [12.0, 48.0], [12.0, 49.0], [11.0, 49.0], [11.0, 48.0]]
+    path = tmp_path / "aoi.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {}, "geometry": {"type": "Polygon",
+                                                           "coordinates": [square]}}]}))
+    assert tiles.tiles_from_aoi(path) == tiles.tiles_from_aoi((11.0, 48.0, 12.0, 49.0))
+    assert "32UPU" in tiles.tiles_from_aoi(path)
+
+
+def test_polygon_intersects_rectangle():
+    exterior = [(0, 0), (10, 0), (10, 10), (0, 10)]
+    hole = [(2, 2), (8, 2), (8, 8), (2, 8)]
+    assert tiles.polygon_intersects_rectangle([exterior], (3, 3, 4, 4))
+    assert not tiles.polygon_intersects_rectangle([exterior, hole], (3, 3, 4, 4))
+    assert tiles.polygon_intersects_rectangle([exterior, hole], (1, 3, 4, 4))
+    assert tiles.polygon_intersects_rectangle([exterior], (-5, -5, 20, 20))
+    assert not tiles.polygon_intersects_rectangle([exterior], (11, 0, 12, 10))
+
+
+def test_get_available_datasets_with_aoi(hls_server):
+    for sceneid in ["HLS.L30.T32UPU.2017014.v1.4", "HLS.L30.T32UNU.2017007.v1.4"]:
+        hls_server.add_granule(sceneid)
+    urls = utils.get_available_datasets(["L30"], [2017], None, aoi=(11.57, 48.13, 11.59, 48.15),
+                                        base_url=hls_server.base_url)
+    assert [url.split("/")[-1] for url in urls] == ["HLS.L30.T32UPU.2017014.v1.4.hdf"]
+    assert not any("/N/U/" in path for path in hls_server.requests)
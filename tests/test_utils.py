@@ -14,3 +14,51 @@ def test_parse_url():
                            tile="32UNU",
                            product="L30",
                            version="v1.4") == target_url
+
+
+def test_parse_granule_ids():
+    urls = ["https://hls.gsfc.nasa.gov/data/v1.4/L30/2017/32/U/N/U/HLS.L30.T32UNU.2017007.v1.4.hdf",
+            "/data/HLS.S30.T01CDE.2018365.v1.5.hdf.hdr",
+            "HLS.S30.T32UNU.2017009.v1.4"]
+    granules = utils.parse_granule_ids(urls)
+    assert list(granules["sceneid"]) == ["HLS.L30.T32UNU.2017007.v1.4", "HLS.S30.T01CDE.2018365.v1.5",
+                                         "HLS.S30.T32UNU.2017009.v1.4"]
+    assert list(granules["tile"]) == ["32UNU", "01CDE", "32UNU"]
+    assert list(granules["version"]) == ["v1.4", "v1.5", "v1.4"]
+    assert granules["product"].dtype == "category" and granules["tile"].dtype == "category"
+    assert list(granules["date"].dt.strftime("%Y-%m-%d")) == ["2017-01-07", "2018-12-31", "2017-01-09"]
+    with pytest.raises(ValueError, match="1 values"):
+        utils.parse_granule_ids(urls + ["HLS.L30.32UNU.2017007.v1.4.hdf"])
+
+    # the scalar parser gives the same fields
+    for url, (_, granule) in zip(urls, granules.iterrows()):
+        assert {key: str(value) for key, value in utils.parse_granule_id(url).items()} == \
+            {key: str(value) for key, value in granule.items()}
+    with pytest.raises(ValueError, match="No HLS granule id"):
+        utils.parse_granule_id("HLS.L30.32UNU.2017007.v1.4.hdf")
+
+    datasets = utils.dataframe_from_urls(urls[:1])
+    assert list(datasets.columns) == ["product", "tile", "date", "url"]
+    datasets = utils.dataframe_from_hdf_paths(["/data/HLS.L30.T32UNU.2017007.v1.4.hdf"])
+    assert list(datasets.columns) == ["path", "sceneid", "product", "tile", "date_Yj", "date"]
+    assert datasets.loc[0, "tile"] == "T32UNU"
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_read_write_datasets(tmp_path, suffix):
+    if suffix == ".parquet":
+        pytest.importorskip("pyarrow")
+    datasets = utils.dataframe_from_urls(
+        ["https://hls.gsfc.nasa.gov/data/v1.4/L30/2017/32/U/N/U/HLS.L30.T32UNU.2017007.v1.4.hdf"])
+    utils.write_datasets(datasets, tmp_path / f"datasets{suffix}")
+    result = utils.read_datasets(tmp_path / f"datasets{suffix}")
+    assert list(result.columns) == list(datasets.columns)
+    assert result["tile"].dtype == "category"
+    assert result.loc[0, "date"] == datasets.loc[0, "date"]
+
+
+def test_files_exist(tmp_path):
+    (tmp_path / "a.hdf").write_bytes(b"")
+    (tmp_path / "b.hdf").mkdir()
+    assert list(utils.files_exist(tmp_path, ["a.hdf", "b.hdf", "c.hdf"])) == [True, False, False]
+    assert list(utils.files_exist(tmp_path / "missing", ["a.hdf"])) == [False]
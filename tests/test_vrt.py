@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import rasterio
+
+from nasa_hls import hdf2tiff_conversion
+from nasa_hls import vrt
+
+from .hls_fixtures import write_fake_hdf
+
+
+def test_write_scene_vrt(tmp_path, fake_hdfs):
+    hdf_path = write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017007.v1.4")
+    path = vrt.write_scene_vrt(hdf_path, tmp_path / "out", bands=["Red", "QA", "Unknown"])
+    assert path == tmp_path / "out" / "HLS.S30.T32UNU.2017007.v1.4" / "HLS.S30.T32UNU.2017007.v1.4.vrt"
+    with rasterio.open(path) as src:
+        assert src.descriptions == ("Red", "QA")
+        assert src.dtypes == ("int16", "uint8")
+        assert src.tags()["cloud_coverage"] == "10"
+    subdatasets = tmp_path / "subdatasets" / "HLS.S30.T32UNU.2017007.v1.4"
+    with rasterio.open(subdatasets / "QA.tif") as qa:
+        assert np.array_equal(hdf2tiff_conversion.read_stack(path, bands=["QA"])[0], qa.read(1))
+
+
+def test_write_vrt_catalog(tmp_path, fake_hdfs):
+    hdf_paths = [write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017011.v1.4", seed=2),
+                 write_fake_hdf(tmp_path, "HLS.L30.T32UNU.2017007.v1.4", seed=1),
+                 write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017009.v1.4", cloud_coverage=90)]
+    df = vrt.write_vrt_catalog(hdf_paths, tmp_path / "out", bands=["Red", "Red_Edge1"],
+                               max_cloud_coverage=50)
+    assert list(df["status"]) == ["written", "written", "skipped"]
+
+    dstdir_tile = tmp_path / "out" / "T32UNU"
+    with rasterio.open(dstdir_tile / "T32UNU__Red.vrt") as src:
+        assert src.descriptions == ("HLS.L30.T32UNU.2017007.v1.4", "HLS.S30.T32UNU.2017011.v1.4")
+        red = src.read()
+    with rasterio.open(tmp_path / "subdatasets" / "HLS.S30.T32UNU.2017011.v1.4" / "B04.tif") as src:
+        assert np.array_equal(red[1], src.read(1))
+    with rasterio.open(dstdir_tile / "T32UNU__Red_Edge1.vrt") as src:
+        assert src.descriptions == ("HLS.S30.T32UNU.2017011.v1.4", )
+    index = pd.read_csv(dstdir_tile / "T32UNU__timeseries.csv")
+    assert list(index["band"]) == ["Red", "Red", "Red_Edge1"]
+    assert list(index["band_index"]) == [1, 2, 1]
+
+
+def test_write_vrt_catalog_incrementally(tmp_path, fake_hdfs):
+    first = [write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017011.v1.4"),
+             write_fake_hdf(tmp_path, "HLS.L30.T32UNU.2017007.v1.4")]
+    second = [write_fake_hdf(tmp_path, "HLS.L30.T32UNU.2017009.v1.4"),
+              write_fake_hdf(tmp_path, "HLS.S30.T32UNU.2017011.v1.4")]
+    vrt.write_vrt_catalog(first, tmp_path / "out", bands=["Red"])
+    vrt.write_vrt_catalog(second, tmp_path / "out", bands=["Red"])
+
+    sceneids = ("HLS.L30.T32UNU.2017007.v1.4", "HLS.L30.T32UNU.2017009.v1.4",
+                "HLS.S30.T32UNU.2017011.v1.4")
+    dstdir_tile = tmp_path / "out" / "T32UNU"
+    with rasterio.open(dstdir_tile / "T32UNU__Red.vrt") as src:
+        assert src.descriptions == sceneids
+    index = pd.read_csv(dstdir_tile / "T32UNU__timeseries.csv")
+    assert tuple(index["sceneid"]) == sceneids
+    assert list(index["band_index"]) == [1, 2, 3]